@@ -23,7 +23,9 @@ For example
 void SetValue(Class *value);
 Class *GetValue();
 
-For JS bindings, the browser object holds a pointer to the C++ object.
+For JS bindings, the browser object holds a pointer to the C++ object. A C++
+object has at most one browser object per plugin instance at a time, which is
+returned each time the object is, so that JS sees the same object.
 """
 
 import string
@@ -301,10 +303,16 @@ class NPAPIObject : public NPObject {
   NPP npp() { return npp_; }
   ${Class} *value() { return value_; }
   ${Class} *value_mutable() { return value_; }
-  void set_value(${Class} *value) { value_ = value; }
+  void set_value(${Class} *value) { value_ = value; }${PropertyCache}
 };
 NPAPIObject *GetNPObject(NPP npp, ${Class} *object);""")
 
+# the cache of the values of the properties with the 'cached' attribute.
+_property_cache_string = """
+  glue::globals::PropertyCache *property_cache() { return &property_cache_; }
+ private:
+  glue::globals::PropertyCache property_cache_;"""
+
 
 def NpapiBindingGlueHeader(scope, type_defn):
   """Gets the NPAPI glue header for a given type.
@@ -317,7 +325,12 @@ def NpapiBindingGlueHeader(scope, type_defn):
     a string, the glue header.
   """
   class_name = cpp_utils.GetScopedName(scope, type_defn)
-  return _npapi_binding_glue_header_template.substitute(Class=class_name)
+  if npapi_utils.HasCachedProperties(type_defn):
+    property_cache = _property_cache_string
+  else:
+    property_cache = ''
+  return _npapi_binding_glue_header_template.substitute(
+      Class=class_name, PropertyCache=property_cache)
 
 
 _npapi_binding_glue_cpp_template = string.Template("""
@@ -325,21 +338,32 @@ void InitializeGlue(NPP npp) {
   InitializeIds(npp);
 }
 
+${Pool}
+// The existing wrappers of the native objects, so that GetNPObject returns the
+// same NPObject each time for a given object.
+static glue::globals::NPObjectMap wrappers;
+
 static NPObject *Allocate(NPP npp, NPClass *theClass) {
-  return new NPAPIObject(npp);
+  return ${New} NPAPIObject(npp);
 }
 
 static void Deallocate(NPObject *header) {
-  delete static_cast<NPAPIObject *>(header);
+  NPAPIObject *object = static_cast<NPAPIObject *>(header);
+  wrappers.Remove(object->npp(), object->value(), object);
+  ${Delete}
 }
 
 NPAPIObject *GetNPObject(NPP npp, ${Class} *object) {
   if (!object)
     return NULL;
 
+  NPObject *wrapper = wrappers.Find(npp, object);
+  if (wrapper)
+    return static_cast<NPAPIObject *>(NPN_RetainObject(wrapper));
   NPAPIObject *npobject = static_cast<NPAPIObject *>(
       NPN_CreateObject(npp, &npclass));
   npobject->set_value(object);
+  wrappers.Insert(npp, object, npobject);
   return npobject;
 }""")
 
@@ -355,7 +379,9 @@ def NpapiBindingGlueCpp(scope, type_defn):
     a string, the glue implementation.
   """
   class_name = cpp_utils.GetScopedName(scope, type_defn)
-  return _npapi_binding_glue_cpp_template.substitute(Class=class_name)
+  substitution_dict = npapi_utils.MakeAllocationDict(type_defn, class_name)
+  substitution_dict['Class'] = class_name
+  return _npapi_binding_glue_cpp_template.substitute(substitution_dict)
 
 
 _npapi_dispatch_function_header_template = string.Template("""
@@ -447,6 +473,27 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
   return (text, '%s->value()' % variable)
 
 
+def NpapiVariantTypes(scope, type_defn):
+  """Gets the NPVariant types a by_pointer object is converted from.
+
+  This function is used to resolve overloads on the types of the arguments,
+  without trying each conversion in turn.
+
+  Args:
+    scope: a Definition for the scope in which the glue will be written.
+    type_defn: a Definition, representing the type of the value.
+
+  Returns:
+    a (list, bool) pair, the list containing the NPVariant types (among 'void',
+    'null', 'bool', 'int32', 'double', 'string' and 'object') NpapiFromNPVariant
+    accepts, and the bool being True if the conversion of a NPVariant of one of
+    these types never fails.
+  """
+  scope, type_defn = scope, type_defn  # silence gpylint.
+  # the object may be of another class.
+  return ['object'], False
+
+
 _expr_to_npvariant_template = string.Template("""
 ${ClassGlueNS}::NPAPIObject *${variable} =
     ${ClassGlueNS}::GetNPObject(${npp}, ${expr});
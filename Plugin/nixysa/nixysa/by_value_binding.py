@@ -23,7 +23,9 @@ pointer if mutable), and returned by copy. For example:
 void SetValue(const Class &value);
 Class GetValue();
 
-For JS bindings, the browser object holds a copy of the C++ object.
+For JS bindings, the browser object holds a copy of the C++ object. The glue
+copy-constructs it from the returned value, and passes the value it holds by
+reference to the functions it is given to.
 """
 
 import string
@@ -300,14 +302,20 @@ class NPAPIObject: public NPObject {
   NPP npp_;
   ${Class} value_;
  public:
-  NPAPIObject(NPP npp): npp_(npp), value_() { }
+  NPAPIObject(NPP npp, const ${Class} &value): npp_(npp), value_(value) { }
   NPP npp() {return npp_;}
   const ${Class} &value() {return value_;}
   ${Class} *value_mutable() {return &value_;}
-  void set_value(const ${Class} &value) {value_ = value;}
+  void set_value(const ${Class} &value) {value_ = value;}${PropertyCache}
 };
 NPAPIObject *CreateNPObject(NPP npp, const ${Class} &object);""")
 
+# the cache of the values of the properties with the 'cached' attribute.
+_property_cache_string = """
+  glue::globals::PropertyCache *property_cache() {return &property_cache_;}
+ private:
+  glue::globals::PropertyCache property_cache_;"""
+
 
 def NpapiBindingGlueHeader(scope, type_defn):
   """Gets the NPAPI glue header for a given type.
@@ -320,7 +328,12 @@ def NpapiBindingGlueHeader(scope, type_defn):
     a string, the glue header.
   """
   class_name = cpp_utils.GetScopedName(scope, type_defn)
-  return _binding_glue_header_template.substitute(Class=class_name)
+  if npapi_utils.HasCachedProperties(type_defn):
+    property_cache = _property_cache_string
+  else:
+    property_cache = ''
+  return _binding_glue_header_template.substitute(Class=class_name,
+                                                  PropertyCache=property_cache)
 
 
 _binding_glue_cpp_template = string.Template("""
@@ -328,20 +341,30 @@ void InitializeGlue(NPP npp) {
   InitializeIds(npp);
 }
 
+// The value CreateNPObject constructs the new object from, since
+// NPN_CreateObject has no way to pass it to Allocate. The objects of this class
+// are only created by CreateNPObject, so it is always set in Allocate.
+static const ${Class} *initial_value = NULL;
+${Pool}
+
 static NPObject *Allocate(NPP npp, NPClass *theClass) {
-  return new NPAPIObject(npp);
+  return ${New} NPAPIObject(npp, *initial_value);
 }
 
 static void Deallocate(NPObject *header) {
-  delete static_cast<NPAPIObject *>(header);
+  ${Delete}
 }
 
 NPAPIObject *CreateNPObject(NPP npp, const ${Class} &object) {
+  // the copy constructor may create another object of this class, so the
+  // value of an enclosing call is restored afterwards.
+  const ${Class} *enclosing_value = initial_value;
+  initial_value = &object;
   GLUE_PROFILE_START(npp, "createobject");
   NPAPIObject *npobject = static_cast<NPAPIObject *>(
       NPN_CreateObject(npp, &npclass));
   GLUE_PROFILE_STOP(npp, "createobject");
-  npobject->set_value(object);
+  initial_value = enclosing_value;
   return npobject;
 }""")
 
@@ -357,7 +380,9 @@ def NpapiBindingGlueCpp(scope, type_defn):
     a string, the glue implementation.
   """
   class_name = cpp_utils.GetScopedName(scope, type_defn)
-  return _binding_glue_cpp_template.substitute(Class=class_name)
+  substitution_dict = npapi_utils.MakeAllocationDict(type_defn, class_name)
+  substitution_dict['Class'] = class_name
+  return _binding_glue_cpp_template.substitute(substitution_dict)
 
 
 _dispatch_function_header_template = string.Template("""
@@ -406,12 +431,15 @@ def GetMarshalingAttributes(type_defn):
   return {}
 
 
+# The value is not copied: the variable points to the value held by the
+# NPObject, which the NPVariant keeps alive.
 _from_npvariant_template = string.Template("""
-${Class} ${variable};
+const ${Class} *${variable} = NULL;
 if (NPVARIANT_IS_OBJECT(${input})) {
   NPObject *npobject = NPVARIANT_TO_OBJECT(${input});
   if (npobject->_class == ${ClassGlueNS}::GetNPClass()) {
-    ${variable} = static_cast<${ClassGlueNS}::NPAPIObject *>(npobject)->value();
+    ${variable} =
+        &static_cast<${ClassGlueNS}::NPAPIObject *>(npobject)->value();
     ${success} = true;
   } else {
     *error_handle = "Error in " ${context}
@@ -511,6 +539,7 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
   # If the value type has marshaling getter then the C++ type is never exposed
   # to JavaScript and we don't need to check. Otherwise, assume that we might
   # see a wrapped C++ type or an alternative JavaScript representation.
+  expression = variable
   if 'getter' in marshaling_attributes:
     template = _from_npvariant_template_marshaled
   else:
@@ -518,6 +547,7 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
       template = _from_npvariant_template_dual_interface
     else:
       template = _from_npvariant_template
+      expression = '(*%s)' % variable
 
   text = template.substitute(npp=npp,
                              Class=class_name,
@@ -526,7 +556,34 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
                              input=input_expr,
                              success=success,
                              context=exception_context)
-  return (text, variable)
+  return (text, expression)
+
+
+def NpapiVariantTypes(scope, type_defn):
+  """Gets the NPVariant types a by_value object is converted from.
+
+  This function is used to resolve overloads on the types of the arguments,
+  without trying each conversion in turn.
+
+  Args:
+    scope: a Definition for the scope in which the glue will be written.
+    type_defn: a Definition, representing the type of the value.
+
+  Returns:
+    a (list, bool) pair, the list containing the NPVariant types (among 'void',
+    'null', 'bool', 'int32', 'double', 'string' and 'object') NpapiFromNPVariant
+    accepts, and the bool being True if the conversion of a NPVariant of one of
+    these types never fails.
+  """
+  scope = scope  # silence gpylint.
+  if GetMarshalingAttributes(type_defn):
+    # the marshaled representation can be of any type, its conversion is done
+    # by the userglue setter.
+    return (['void', 'null', 'bool', 'int32', 'double', 'string', 'object'],
+            False)
+  else:
+    # the object may be of another class.
+    return ['object'], False
 
 
 _expr_to_npvariant_template = string.Template("""
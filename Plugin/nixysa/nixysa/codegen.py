@@ -29,7 +29,11 @@ try:
 except ImportError:
   import md5
 import os
+import re
+import shutil
+import subprocess
 import sys
+import tempfile
 
 import gflags
 
@@ -37,7 +41,9 @@ import gflags
 import idl_parser
 import locking
 import log
+import output_cache
 import syntax_tree
+import writer
 
 # default supported generators
 import header_generator
@@ -93,6 +99,44 @@ gflags.DEFINE_boolean('overloaded-function-docs', False,
                       'generate special overloaded function docs.')
 gflags.DEFINE_boolean('properties-equal-undefined', False,
                       'Emit class.prototype.property = undefined;')
+gflags.DEFINE_boolean('check-deterministic', False, 'generate the outputs twice'
+                      ' in a temporary directory, with different hash seeds,'
+                      ' and fail if they are not byte-identical. Nothing is'
+                      ' written to the output directory.')
+gflags.DEFINE_string('cache-dir', '', 'directory of a cache of generated files,'
+                     ' that can be shared across build trees. When the inputs'
+                     ' match a cache entry, its files are copied or linked'
+                     ' into the output directory instead of being generated.'
+                     ' No cache is used if empty.')
+gflags.DEFINE_integer('cache-max-size', 256 * 1024 * 1024, 'maximum size of'
+                      ' the cache, in bytes. Least recently used entries are'
+                      ' evicted beyond that size.')
+gflags.DEFINE_boolean('cache-stats', False, 'print the statistics of the cache'
+                      ' in --cache-dir and exit.')
+gflags.DEFINE_integer('shards', 1, 'split the NPAPI glue implementation of'
+                      ' each IDL file into that many translation units, that'
+                      ' can be compiled in parallel.')
+gflags.DEFINE_integer('max-tu-lines', 0, 'split the NPAPI glue implementation'
+                      ' of each IDL file into as many translation units as'
+                      ' needed to keep them under that many lines, if'
+                      ' possible. The generated translation units are listed'
+                      ' in a manifest file. No limit if 0.')
+gflags.DEFINE_string('include-report', '', 'when generating C++ headers, write'
+                     ' to that file the include fan-in of each header: the'
+                     ' number of generated headers that include it directly,'
+                     ' and directly or indirectly. The output cache is not'
+                     ' used when a report is written.')
+gflags.DEFINE_boolean('pch', False, 'emit a glue_pch.h header holding the'
+                      ' includes common to all the NPAPI glue files, and'
+                      ' include it first in each of them, so that it can be'
+                      ' compiled once as a precompiled header.')
+
+gflags.DEFINE_boolean('depfiles', False, 'write a Makefile-style dependency'
+                      ' file (also understood by ninja) next to each output,'
+                      ' named after it with a .d suffix, listing the input IDL'
+                      ' files, python modules and static glue it depends on.'
+                      ' The list of the outputs is written to an "outputs"'
+                      ' file in the output directory.')
 
 class NativeType(syntax_tree.Definition):
   defn_type = 'Native'
@@ -134,6 +178,8 @@ def GetNativeTypes():
           NativeType(source, pod_attributes, 'float', 'float'),
           NativeType(source, pod_attributes, 'double', 'float'),
           NativeType(source, pod_attributes, 'Variant', 'variant'),
+          NativeType(source, pod_attributes, 'StringView', 'string_view'),
+          NativeType(source, pod_attributes, 'StringBuffer', 'string_buffer'),
           GetStdNamespace()]
 
 
@@ -151,8 +197,248 @@ def AddModulesFromFlags(table, flag_values, md5_hash):
       raise
 
 
+def GetModuleFiles():
+  """Gets the python source files of the loaded nixysa modules.
+
+  This includes the generator and binding model modules loaded from the
+  command line flags.
+
+  Returns:
+    a set of absolute filenames.
+  """
+  nixysa_dir = os.path.dirname(os.path.abspath(__file__))
+  modules = generators.values() + binding_models.values()
+  for module in sys.modules.values():
+    module_file = getattr(module, '__file__', None)
+    if (module_file and
+        os.path.dirname(os.path.abspath(module_file)) == nixysa_dir):
+      modules.append(module)
+  module_files = set()
+  for module in modules:
+    module_file = os.path.abspath(module.__file__)
+    if module_file.endswith('.pyc') or module_file.endswith('.pyo'):
+      module_file = module_file[:-1]
+    module_files.add(module_file)
+  return module_files
+
+
+def EscapeDepfilePath(path):
+  """Escapes a path for use in a Makefile-style dependency file.
+
+  Args:
+    path: the path.
+
+  Returns:
+    the escaped path.
+  """
+  return path.replace('\\', '/').replace(' ', '\\ ').replace('$', '$$')
+
+
+def WriteDepfiles(output_dir, outputs, input_files):
+  """Writes a dependency file for each output, and the list of outputs.
+
+  Args:
+    output_dir: the output directory.
+    outputs: a list of (filename, dependencies) pairs, one for each output.
+      dependencies is the set of the input files the output depends on, or
+      None if it depends on all of them.
+    input_files: the input IDL files.
+  """
+  module_files = GetModuleFiles()
+  for filename, dependencies in outputs:
+    if dependencies is None:
+      dependencies = set(input_files)
+    lines = ['%s: \\\n' % EscapeDepfilePath(filename)]
+    lines += ['  %s \\\n' % EscapeDepfilePath(dependency) for dependency
+              in sorted(dependencies) + sorted(module_files)]
+    # the last line must not be continued.
+    lines[-1] = lines[-1][:-3] + '\n'
+    writer.WriteIfContentDifferent(filename + '.d', ''.join(lines))
+  writer.WriteIfContentDifferent(
+      '%s/outputs' % output_dir,
+      ''.join(['%s\n' % filename for filename, unused_deps in outputs]))
+
+
+def GetTreeDependencies(outputs, input_files):
+  """Converts the dependencies of the outputs to a form independent of the tree.
+
+  The input files are replaced by their index in input_files, and the nixysa
+  files (like the static glue headers) by their path relative to the nixysa
+  directory, so that the dependencies can be stored in the output cache, and
+  rebased on another build tree by RebaseDependencies.
+
+  Args:
+    outputs: a list of (filename, dependencies) pairs, as for WriteDepfiles.
+    input_files: the input IDL files.
+
+  Returns:
+    a string with one line for each output, or None if a dependency is neither
+    an input file nor a nixysa file.
+  """
+  nixysa_dir = os.path.dirname(os.path.abspath(__file__))
+  lines = []
+  for filename, dependencies in outputs:
+    fields = [filename]
+    if dependencies is None:
+      fields.append('*')
+    else:
+      for dependency in sorted(dependencies):
+        path = os.path.abspath(dependency)
+        if dependency in input_files:
+          fields.append('input:%d' % input_files.index(dependency))
+        elif path.startswith(nixysa_dir + os.sep):
+          fields.append('nixysa:' +
+                        path[len(nixysa_dir) + 1:].replace(os.sep, '/'))
+        else:
+          return None
+    lines.append('\t'.join(fields) + '\n')
+  return ''.join(lines)
+
+
+def RebaseDependencies(tree_dependencies, input_files):
+  """Rebases the dependencies returned by GetTreeDependencies on this tree.
+
+  Args:
+    tree_dependencies: the string returned by GetTreeDependencies.
+    input_files: the input IDL files.
+
+  Returns:
+    a list of (filename, dependencies) pairs, as for WriteDepfiles.
+  """
+  nixysa_dir = os.path.dirname(os.path.abspath(__file__))
+  outputs = []
+  for line in tree_dependencies.splitlines():
+    fields = line.split('\t')
+    if fields[1:] == ['*']:
+      outputs.append((fields[0], None))
+      continue
+    dependencies = set()
+    for field in fields[1:]:
+      kind, value = field.split(':', 1)
+      if kind == 'input':
+        dependencies.add(input_files[int(value)])
+      else:
+        dependencies.add(os.path.join(nixysa_dir, *value.split('/')))
+    outputs.append((fields[0], dependencies))
+  return outputs
+
+
+def GetOutputDigests(output_dir):
+  """Computes the digests of the generated files in a directory.
+
+  Args:
+    output_dir: the output directory.
+
+  Returns:
+    a dict mapping file names to their digests.
+  """
+  digests = {}
+  for name in os.listdir(output_dir):
+    # the hash file and the parser tables are not generated code.
+    if name == 'hash' or name.startswith('parsetab.'):
+      continue
+    digests[name] = writer.GetFileDigest(os.path.join(output_dir, name))
+  return digests
+
+
+def CheckDeterministic(flag_args, files):
+  """Checks that generating the outputs twice gives byte-identical files.
+
+  The code generator is run twice in separate processes, into the same
+  temporary directory, each time with a different hash seed so that any
+  dependency on set or dict ordering shows up as a difference. Errors are
+  logged for the files that differ.
+
+  Args:
+    flag_args: the command line flags passed to this run.
+    files: the input IDL files.
+  """
+  output_dir = tempfile.mkdtemp()
+  try:
+    flag_args = [arg for arg in flag_args
+                 if not re.match(r'--?(no)?check-deterministic\b', arg)]
+    flag_args += ['--output-dir=%s' % output_dir, '--force', '--cache-dir=']
+    all_digests = []
+    for seed in ['1', '2']:
+      env = dict(os.environ)
+      env['PYTHONHASHSEED'] = seed
+      if subprocess.call([sys.executable, sys.argv[0]] + flag_args + files,
+                         env=env):
+        log.Error('Code generation failed.')
+        return
+      all_digests.append(GetOutputDigests(output_dir))
+    first, second = all_digests
+    for name in sorted(set(first.keys() + second.keys())):
+      if first.get(name) != second.get(name):
+        log.Error('Output is not deterministic: %s' % name)
+  finally:
+    shutil.rmtree(output_dir)
+
+
+def GetCacheKey(hash_value, files):
+  """Computes the cache key of a code generator run.
+
+  Args:
+    hash_value: the hash of the input files, generator and binding model
+      sources, and generator flags.
+    files: the input IDL files.
+
+  Returns:
+    the cache key, as a string. It doesn't depend on the location of the build
+    tree, so that the entries can be shared across trees.
+  """
+  if globals().has_key('hashlib'):
+    md5_hash = hashlib.md5()
+  else:
+    md5_hash = md5.new();
+  md5_hash.update(hash_value)
+  # the output file names depend on the input file names.
+  for source_file in files:
+    md5_hash.update(os.path.basename(source_file))
+  for flag_name in ['force-docs', 'no-return-docs', 'overloaded-function-docs',
+                    'properties-equal-undefined', 'shards', 'max-tu-lines',
+                    'pch']:
+    md5_hash.update('%s=%s' % (flag_name, FLAGS[flag_name].value))
+  return md5_hash.hexdigest()
+
+
+def PrintCacheStats(cache):
+  """Prints the statistics of a cache.
+
+  Args:
+    cache: the output_cache.OutputCache.
+  """
+  stats = cache.GetStats()
+  lookups = stats['hits'] + stats['misses']
+  hit_rate = 0.
+  if lookups:
+    hit_rate = 100. * stats['hits'] / lookups
+  print 'Hits: %d' % stats['hits']
+  print 'Misses: %d' % stats['misses']
+  print 'Hit rate: %.1f%%' % hit_rate
+  print 'Bytes saved: %d' % stats['bytes_saved']
+  print 'Entries: %d' % stats['entries']
+  print 'Size: %d' % stats['size']
+
+
 def main(argv):
   files = argv[1:]
+  cache = None
+  if FLAGS['cache-dir'].value:
+    cache = output_cache.OutputCache(FLAGS['cache-dir'].value,
+                                     FLAGS['cache-max-size'].value)
+  if FLAGS['cache-stats'].value:
+    if cache:
+      PrintCacheStats(cache)
+    else:
+      print 'No cache directory given.'
+    return
+  if FLAGS['check-deterministic'].value:
+    # gflags stops parsing at the first non-flag argument, so the flags are
+    # everything before the input files.
+    CheckDeterministic(sys.argv[1:len(sys.argv) - len(files)], files)
+    log.FailIfHaveErrors()
+    return
   # generate a hash of all the inputs to figure out if we need to re-generate
   # the outputs.
   # Use hashlib if present (Python 2.5 and up), otherwise fall back to md5.
@@ -169,6 +455,20 @@ def main(argv):
   for s in (FLAGS['generator-module'].value + FLAGS['binding-module'].value +
             FLAGS.generate + [FLAGS['output-dir'].value]):
     md5_hash.update(s)
+  # the sharding and precompiled header options change the set of output
+  # files, and the include report is an output too.
+  include_report = ''
+  if 'header' in FLAGS.generate:
+    include_report = FLAGS['include-report'].value
+  md5_hash.update('shards=%d,max-tu-lines=%d,pch=%s,depfiles=%s,'
+                  'include-report=%s' % (FLAGS.shards,
+                                         FLAGS['max-tu-lines'].value,
+                                         FLAGS.pch, FLAGS.depfiles,
+                                         include_report))
+  if include_report:
+    # the report is written outside of the output directory, so it can't be
+    # cached: it gets regenerated with the headers.
+    cache = None
 
   # import generator and binding model modules, and hash them
   AddModulesFromFlags(generators, FLAGS['generator-module'].value, md5_hash)
@@ -193,7 +493,8 @@ def main(argv):
         locking.lockf(hash_file, locking.LOCK_UN)
       hash_file.close()
 
-      if hash_value == old_hash:
+      if (hash_value == old_hash and
+          (not include_report or os.path.exists(include_report))):
         print "Source files haven't changed: nothing to generate."
         return
     except IOError:
@@ -205,6 +506,25 @@ def main(argv):
   if FLAGS['exclusive-lock'].value:
     locking.lockf(hash_file, locking.LOCK_EX)
 
+  if cache:
+    cache_key = GetCacheKey(hash_value, files)
+    if cache.Lookup(cache_key, output_dir):
+      # the dependency files contain the paths of this tree, they are rebuilt
+      # from the dependencies stored with the entry.
+      tree_dependencies = None
+      if FLAGS.depfiles:
+        tree_dependencies = cache.GetMetadata(cache_key)
+      if tree_dependencies is not None:
+        WriteDepfiles(output_dir,
+                      RebaseDependencies(tree_dependencies, files), files)
+      if not FLAGS.depfiles or tree_dependencies is not None:
+        hash_file.write(hash_value)
+        if FLAGS['exclusive-lock'].value:
+          locking.lockf(hash_file, locking.LOCK_UN)
+        hash_file.close()
+        return
+      # the entry was evicted in the meantime, so generate the files.
+
   my_parser = idl_parser.Parser(output_dir)
   pairs = []
   for f in files:
@@ -216,15 +536,46 @@ def main(argv):
   syntax_tree.FinalizeObjects(global_namespace, binding_models)
 
   writer_list = []
+  written_files = []
+  outputs = []
   for generator_name in FLAGS.generate:
     try:
       generator = generators[generator_name]
-      writer_list += generator.ProcessFiles(output_dir, pairs, global_namespace)
     except KeyError:
       print 'Unknown generator %s.' % generator_name
       raise
+    if hasattr(generator, 'IterFiles'):
+      # Write the files as soon as they are final so that they can be released
+      # before the rest gets generated.
+      for writer in generator.IterFiles(output_dir, pairs, global_namespace):
+        writer.Write()
+        written_files.append(writer.GetFilename())
+        outputs.append((writer.GetFilename(),
+                        getattr(writer, 'dependencies', None)))
+    else:
+      writer_list += generator.ProcessFiles(output_dir, pairs, global_namespace)
   for writer in writer_list:
     writer.Write()
+    written_files.append(writer.GetFilename())
+    outputs.append((writer.GetFilename(),
+                    getattr(writer, 'dependencies', None)))
+
+  if FLAGS.depfiles:
+    WriteDepfiles(output_dir, outputs, files)
+
+  if cache and not log.HaveErrors():
+    # generators write their files as output_dir/name. Only files directly in
+    # the output directory can be cached. The dependency files are stored as
+    # metadata instead, since they contain the paths of this tree.
+    prefix = output_dir + '/'
+    names = [f[len(prefix):] for f in written_files if f.startswith(prefix)]
+    tree_dependencies = None
+    if FLAGS.depfiles:
+      tree_dependencies = GetTreeDependencies(outputs, files)
+    if (len(names) == len(written_files) and
+        not [name for name in names if os.path.dirname(name)] and
+        (not FLAGS.depfiles or tree_dependencies is not None)):
+      cache.Store(cache_key, output_dir, names, tree_dependencies)
 
   # Save hash for next time
   hash_file.write(hash_value)
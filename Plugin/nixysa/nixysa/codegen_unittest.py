@@ -0,0 +1,102 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2009 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test for codegen."""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+import output_cache
+
+_codegen = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                        'codegen.py')
+
+_idl = """
+namespace t {
+  [binding_model=by_pointer, include="t.h"] class Counter {
+    Counter();
+    int count(int step);
+  };
+}
+"""
+
+
+class CodegenUnitTest(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.cache_dir = os.path.join(self.temp_dir, 'cache')
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def MakeTree(self, name):
+    """Creates a build tree holding an IDL file.
+
+    Args:
+      name: the name of the tree directory.
+
+    Returns:
+      the path of the tree.
+    """
+    tree = os.path.join(self.temp_dir, name)
+    os.makedirs(tree)
+    idl_file = open(os.path.join(tree, 't.idl'), 'w')
+    idl_file.write(_idl)
+    idl_file.close()
+    return tree
+
+  def RunCodegen(self, tree):
+    """Generates the NPAPI glue of a tree with the cache and dependency files.
+
+    Args:
+      tree: the path of the tree.
+    """
+    # the tree is the working directory, so the module path has to be
+    # absolute.
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([os.path.abspath(path)
+                                         for path in sys.path if path])
+    process = subprocess.Popen(
+        [sys.executable, _codegen, '--output-dir=glue', '--generate=npapi',
+         '--depfiles', '--cache-dir=%s' % self.cache_dir,
+         os.path.join(tree, 't.idl')],
+        cwd=tree, env=env, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output = process.communicate()[0]
+    self.assertEquals(process.returncode, 0, output)
+
+  def testCacheHitAcrossTrees(self):
+    first = self.MakeTree('first')
+    second = self.MakeTree('second')
+    self.RunCodegen(first)
+    self.RunCodegen(second)
+    stats = output_cache.OutputCache(self.cache_dir, 0).GetStats()
+    self.assertEquals(stats['misses'], 1)
+    self.assertEquals(stats['hits'], 1)
+    for name in ['t_glue.cc', 't_glue.h', 'globals_glue.cc', 'outputs']:
+      self.assertEquals(open(os.path.join(first, 'glue', name)).read(),
+                        open(os.path.join(second, 'glue', name)).read())
+    # the dependency files refer to the files of their own tree.
+    depfile = open(os.path.join(second, 'glue', 't_glue.cc.d')).read()
+    self.assertNotEqual(depfile.find(os.path.join(second, 't.idl')), -1)
+    self.assertEqual(depfile.find(first), -1)
+    self.assertNotEqual(depfile.find('static_glue/npapi/common.h'), -1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -237,6 +237,14 @@ def GetFunctionPrototype(scope, obj, id_prefix):
   return prototype, check_types
 
 
+# this regexp matches lines opening or closing a namespace, which don't change
+# the indentation.
+_namespace_re = re.compile(r'\bnamespace\b')
+
+# maximum number of entries in the line cache of EmitCode, before it is reset.
+_MAX_LINE_CACHE_SIZE = 16384
+
+
 def MakeHeaderToken(filename):
   """Generates a header guard token.
 
@@ -281,6 +289,11 @@ class CppFileWriter(object):
         \s*$                                # skip whitespaces
         """, re.MULTILINE | re.VERBOSE)
 
+    # maps a raw code line to its indentation metadata (see _ParseLine). Most
+    # of the emitted code comes from a few constant templates, so the same
+    # lines are seen over and over.
+    _line_cache = {}
+
     def __init__(self, indent_string, indent):
       """Inits a CppFileWriter.Section.
 
@@ -397,6 +410,36 @@ class CppFileWriter(object):
         self._be_namespaces.append(name)
         self._code.append('namespace %s {' % name)
 
+    def _ParseLine(line):
+      """Computes the indentation metadata of a code line.
+
+      Args:
+        line: a single code line, not stripped.
+
+      Returns:
+        a (text, indent_adjust, indent_suffix, indent_delta) tuple. text is the
+        stripped line, indent_adjust is the number of indentations to remove
+        when emitting it, indent_suffix is extra text to add after the
+        indentation, and indent_delta is the change of indentation for the
+        following lines.
+      """
+      line = line.strip('\t\r ')
+      if not line:
+        return ('', 0, '', 0)
+      indent_adjust = 0
+      indent_suffix = ''
+      if line[0] == '}':
+        indent_adjust = 1
+      if line[-1] == ':':
+        indent_adjust += 1
+        indent_suffix = ' '
+      if _namespace_re.search(line):
+        indent_delta = 0
+      else:
+        indent_delta = line.count('{') - line.count('}')
+      return (line, indent_adjust, indent_suffix, indent_delta)
+    _ParseLine = staticmethod(_ParseLine)
+
     def EmitCode(self, code):
       """Emits code at the current position.
 
@@ -408,22 +451,26 @@ class CppFileWriter(object):
         code: a string containing the code to emit.
       """
       self._ValidateNamespace()
+      line_cache = self._line_cache
+      if len(line_cache) > _MAX_LINE_CACHE_SIZE:
+        line_cache.clear()
+      indent_string = self._indent_string
+      indent = self._indent
+      append = self._code.append
       for line in code.split('\n'):
-        line = line.strip('\t\r ')
-        if not line:
-          self._code.append('')
+        try:
+          text, indent_adjust, indent_suffix, indent_delta = line_cache[line]
+        except KeyError:
+          info = CppFileWriter.Section._ParseLine(line)
+          line_cache[line] = info
+          text, indent_adjust, indent_suffix, indent_delta = info
+        if text:
+          append(indent_string * (indent - indent_adjust) + indent_suffix +
+                 text)
         else:
-          adjust_indent = 0
-          adjust_chars = ''
-          if line[0] == '}':
-            adjust_indent -= 1
-          if line[-1] == ':':
-            adjust_indent -= 1
-            adjust_chars = ' '
-          self._code.append(self._indent_string * (self._indent + adjust_indent)
-                            + adjust_chars + line)
-        if not re.search(r'\bnamespace\b', line):
-          self._indent += line.count('{') - line.count('}')
+          append('')
+        indent += indent_delta
+      self._indent = indent
 
     def EmitTemplate(self, template):
       """Emits a template at the current position.
@@ -488,26 +535,36 @@ class CppFileWriter(object):
       """
       self._code = [code] + self._code
 
-    def GetLines(self):
-      """Retrieves the full contents of the section.
+    def IterLines(self):
+      """Iterates over the full contents of the section.
 
-      This function gathers all the code that was emitted, including in
-      children sections.
+      This function yields all the code that was emitted, including in
+      children sections, without building intermediate lists.
 
-      Returns:
-        a list of code lines.
+      Yields:
+        code lines.
       """
       # close open namespaces
       self._fe_namespaces = []
       self._need_validate = True
       self._ValidateNamespace()
-      lines = []
       for line in self._code:
         if isinstance(line, CppFileWriter.Section):
-          lines.extend(line.GetLines())
+          for child_line in line.IterLines():
+            yield child_line
         else:
-          lines.append(line)
-      return lines
+          yield line
+
+    def GetLines(self):
+      """Retrieves the full contents of the section.
+
+      This function gathers all the code that was emitted, including in
+      children sections.
+
+      Returns:
+        a list of code lines.
+      """
+      return list(self.IterLines())
 
   def __init__(self, filename, is_header, header_token=None,
                indent_string='  '):
@@ -532,6 +589,14 @@ class CppFileWriter(object):
     self._include_section = self.Section(indent_string, 0)
     self._main_section = self.Section(indent_string, 0)
 
+  def GetFilename(self):
+    """Gets the name of the file this writer writes to.
+
+    Returns:
+      the name of the file.
+    """
+    return self._filename
+
   def AddInclude(self, name, system=False):
     """Adds an include to the file.
 
@@ -599,6 +664,30 @@ class CppFileWriter(object):
     """
     self._main_section.EmitCode(code)
 
+  def IterLines(self):
+    """Iterates over the full contents of the file writer.
+
+    This function yields all the code that was emitted, including the
+    header guard (if this is a header file), and the includes.
+
+    Yields:
+      code lines.
+    """
+    if self._is_header:
+      yield '#ifndef %s' % self._header_token
+      yield '#define %s' % self._header_token
+    for section in [self._include_section, self._main_section]:
+      # sections are separated by an empty line, but only if they have code.
+      need_separator = True
+      for line in section.IterLines():
+        if need_separator:
+          need_separator = False
+          yield ''
+        yield line
+    if self._is_header:
+      yield ''
+      yield '#endif  // %s' % self._header_token
+
   def GetLines(self):
     """Retrieves the full contents of the file writer.
 
@@ -608,30 +697,17 @@ class CppFileWriter(object):
     Returns:
       a list of code lines.
     """
-    lines = []
-    if self._is_header:
-      lines.extend(['#ifndef %s' % self._header_token,
-                    '#define %s' % self._header_token])
-    include_lines = self._include_section.GetLines()
-    if include_lines:
-      lines.append('')
-      lines.extend(include_lines)
-    main_lines = self._main_section.GetLines()
-    if main_lines:
-      lines.append('')
-      lines.extend(main_lines)
-    if self._is_header:
-      lines.extend(['', '#endif  // %s' % self._header_token])
-    return lines
+    return list(self.IterLines())
 
   def Write(self):
     """Writes the full contents to the file.
 
-    This function writes the full contents to the file specified by the
-    'filename' parameter at creation time.
+    This function streams the full contents to the file specified by the
+    'filename' parameter at creation time, one line at a time.
     """
-    writer.WriteIfContentDifferent(self._filename,
-                                   '\n'.join(self.GetLines()) + '\n')
+    writer.StreamIfContentDifferent(self._filename,
+                                    ('%s\n' % line
+                                     for line in self.IterLines()))
 
 
 def main():
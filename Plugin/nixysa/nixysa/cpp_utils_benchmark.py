@@ -0,0 +1,133 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2009 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Benchmark for CppFileWriter.Section.EmitCode.
+
+Emits the code templates of npapi_generator over and over, and prints the
+number of emitted lines per second, with EmitCode and with a copy of EmitCode
+as it was before the line metadata cache was added.
+"""
+
+import re
+import string
+import sys
+import time
+import cpp_utils
+import npapi_generator
+
+_REPEAT_COUNT = 300
+
+
+def GetTemplates():
+  """Gets the code templates of npapi_generator.
+
+  Returns:
+    a list of strings, one for each multi-line template, with the template
+    parameters left in place.
+  """
+  templates = []
+  for name in dir(npapi_generator):
+    value = getattr(npapi_generator, name)
+    if isinstance(value, string.Template):
+      value = value.safe_substitute({})
+    # the templates with sections are emitted through EmitTemplate.
+    if isinstance(value, str) and '\n' in value and '${#' not in value:
+      templates.append(value)
+  return templates
+
+
+def BaselineEmitCode(section, code):
+  """Emits code in a section, like EmitCode did before the line cache.
+
+  Each line is stripped and searched for 'namespace' every time it is emitted.
+
+  Args:
+    section: the CppFileWriter.Section to emit the code in.
+    code: a string containing the code to emit.
+  """
+  section._ValidateNamespace()
+  for line in code.split('\n'):
+    line = line.strip('\t\r ')
+    if not line:
+      section._code.append('')
+    else:
+      adjust_indent = 0
+      adjust_chars = ''
+      if line[0] == '}':
+        adjust_indent -= 1
+      if line[-1] == ':':
+        adjust_indent -= 1
+        adjust_chars = ' '
+      section._code.append(section._indent_string *
+                           (section._indent + adjust_indent) +
+                           adjust_chars + line)
+    if not re.search(r'\bnamespace\b', line):
+      section._indent += line.count('{') - line.count('}')
+
+
+def EmitTemplates(emit_code, templates, repeat_count):
+  """Emits templates in a new section.
+
+  Args:
+    emit_code: the function emitting code in a section, called with the
+      section and the code.
+    templates: the list of code strings to emit.
+    repeat_count: the number of times the templates are emitted.
+
+  Returns:
+    the section.
+  """
+  section = cpp_utils.CppFileWriter('benchmark.cc', False).CreateSection('s')
+  for unused_i in range(repeat_count):
+    for template in templates:
+      emit_code(section, template)
+  return section
+
+
+def MeasureLinesPerSecond(emit_code, templates):
+  """Measures the throughput of a function emitting code.
+
+  Args:
+    emit_code: the function emitting code in a section, called with the
+      section and the code.
+    templates: the list of code strings to emit.
+
+  Returns:
+    the number of emitted lines per second.
+  """
+  line_count = sum([t.count('\n') + 1 for t in templates]) * _REPEAT_COUNT
+  start = time.time()
+  EmitTemplates(emit_code, templates, _REPEAT_COUNT)
+  return line_count / (time.time() - start)
+
+
+def main():
+  templates = GetTemplates()
+  emit_code = cpp_utils.CppFileWriter.Section.EmitCode
+  # both emit the same code.
+  if (EmitTemplates(BaselineEmitCode, templates, 1).GetLines() !=
+      EmitTemplates(emit_code, templates, 1).GetLines()):
+    print >> sys.stderr, 'EmitCode and the baseline emit different code.'
+    return 1
+  baseline = MeasureLinesPerSecond(BaselineEmitCode, templates)
+  cached = MeasureLinesPerSecond(emit_code, templates)
+  print 'baseline EmitCode: %.0f lines/s' % baseline
+  print 'EmitCode with line cache: %.0f lines/s' % cached
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -16,6 +16,9 @@
 
 """Test for cpp_utils."""
 
+import os
+import shutil
+import tempfile
 import unittest
 import cpp_utils
 
@@ -61,6 +64,61 @@ class CppFileWriterUnitTest(unittest.TestCase):
     self.assertTrue(lines[3] == 'test4')
     self.assertTrue(lines[4] == 'test3')
 
+  def testEmitCodeIndentation(self):
+    section = self.writer.CreateSection('test')
+    code = """namespace a {
+                 void F() {
+                   switch (x) {
+                     case 0:
+                       break;
+                   }
+                 }
+               }  // namespace a"""
+    # emitting twice goes through the cached line metadata.
+    section.EmitCode(code)
+    section.EmitCode(code)
+    expected = ['namespace a {',
+                'void F() {',
+                '  switch (x) {',
+                '   case 0:',
+                '    break;',
+                '  }',
+                '}',
+                '}  // namespace a']
+    self.assertEquals(section.GetLines(), expected + expected)
+
+
+class CppFileWriterWriteUnitTest(unittest.TestCase):
+  def setUp(self):
+    self.output_dir = tempfile.mkdtemp()
+    self.filename = os.path.join(self.output_dir, 'a.h')
+
+  def tearDown(self):
+    shutil.rmtree(self.output_dir)
+
+  def MakeWriter(self, code):
+    writer = cpp_utils.CppFileWriter(self.filename, True)
+    writer.AddInclude('b.h')
+    writer.PushNamespace('ns')
+    writer.CreateSection('decls').EmitCode(code)
+    return writer
+
+  def testWriteMatchesGetLines(self):
+    writer = self.MakeWriter('class A;')
+    writer.Write()
+    content = open(self.filename).read()
+    self.assertEquals(content, '\n'.join(writer.GetLines()) + '\n')
+    self.assertEquals(os.listdir(self.output_dir), ['a.h'])
+
+  def testWriteOnlyIfContentDifferent(self):
+    self.MakeWriter('class A;').Write()
+    old_stat = os.stat(self.filename)
+    self.MakeWriter('class A;').Write()
+    self.assertEquals(os.stat(self.filename).st_ino, old_stat.st_ino)
+    self.MakeWriter('class B;').Write()
+    self.assertTrue('class B;' in open(self.filename).read())
+    self.assertEquals(os.listdir(self.output_dir), ['a.h'])
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -439,6 +439,27 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
   return text, variable
 
 
+def NpapiVariantTypes(scope, type_defn):
+  """Gets the NPVariant types an enum value is converted from.
+
+  This function is used to resolve overloads on the types of the arguments,
+  without trying each conversion in turn.
+
+  Args:
+    scope: a Definition for the scope in which the glue will be written.
+    type_defn: a Definition, representing the type of the value.
+
+  Returns:
+    a (list, bool) pair, the list containing the NPVariant types (among 'void',
+    'null', 'bool', 'int32', 'double', 'string' and 'object') NpapiFromNPVariant
+    accepts, and the bool being True if the conversion of a NPVariant of one of
+    these types never fails.
+  """
+  scope, type_defn = scope, type_defn  # silence gpylint.
+  # the value may be out of range.
+  return ['int32', 'double'], False
+
+
 def NpapiExprToNPVariant(scope, type_defn, variable, expression, output,
                          success, npp):
   """Gets the string to store a value into a NPVariant.
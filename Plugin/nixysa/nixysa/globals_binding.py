@@ -416,6 +416,28 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
   raise InvalidUsage
 
 
+def NpapiVariantTypes(scope, type_defn):
+  """Gets the NPVariant types a namespace is converted from.
+
+  This function is used to resolve overloads on the types of the arguments,
+  without trying each conversion in turn.
+
+  Args:
+    scope: a Definition for the scope in which the glue will be written.
+    type_defn: a Definition, representing the type of the value.
+
+  Returns:
+    a (list, bool) pair, the list containing the NPVariant types (among 'void',
+    'null', 'bool', 'int32', 'double', 'string' and 'object') NpapiFromNPVariant
+    accepts, and the bool being True if the conversion of a NPVariant of one of
+    these types never fails.
+
+  Raises:
+    InvalidUsage: always. This function should not be called for a namespace.
+  """
+  raise InvalidUsage
+
+
 def NpapiExprToNPVariant(scope, type_defn, variable, expression, output,
                          success, npp):
   """Gets the string to store a value into a NPVariant.
@@ -20,8 +20,11 @@ This module generates C++ header files from the parsed syntax tree.
 """
 
 import cpp_utils
+import gflags
+import idl_parser
 import naming
 import syntax_tree
+import writer
 
 # TODO: have these exceptions derive from a common Error.
 
@@ -42,30 +45,137 @@ def ForwardDecl(section, type_defn):
   """Emits the forward declaration of a type, if possible.
 
   Inner types (declared inside a class) cannot be forward-declared.
-  Only classes can be forward-declared.
+  Only classes and typedefs can be forward-declared. A typedef is declared by
+  emitting it again, so the type it refers to has to be declared before.
 
   Args:
     section: the section to emit to.
     type_defn: the Definition for the type to forward-declare.
 
   Raises:
-    BadForwardDeclaration: an inner type or a non-class was passed as an
-      argument.
+    BadForwardDeclaration: an inner type or a type that is neither a class nor
+      a typedef was passed as an argument.
   """
   # inner types cannot be forward-declared
   if type_defn.parent.defn_type != 'Namespace':
     raise BadForwardDeclaration
-  stack = type_defn.GetParentScopeStack()
   if type_defn.defn_type == 'Class':
-    for scope in stack:
-      if scope.name:
-        section.PushNamespace(scope.name)
-    section.EmitCode('class %s;' % type_defn.name)
-    for scope in stack[::-1]:
-      if scope.name:
-        section.PopNamespace()
+    code = 'class %s;' % type_defn.name
+  elif type_defn.defn_type == 'Typedef':
+    bm = type_defn.type_defn.binding_model
+    type_string, unused_need_defn = bm.CppTypedefString(type_defn.parent,
+                                                        type_defn.type_defn)
+    code = 'typedef %s %s;' % (type_string, type_defn.name)
   else:
     raise BadForwardDeclaration
+  stack = type_defn.GetParentScopeStack()
+  for scope in stack:
+    if scope.name:
+      section.PushNamespace(scope.name)
+  section.EmitCode(code)
+  for scope in stack[::-1]:
+    if scope.name:
+      section.PopNamespace()
+
+
+def GetScopePath(type_defn):
+  """Gets the list of names leading to a definition from the global scope.
+
+  Args:
+    type_defn: the Definition.
+
+  Returns:
+    a list of names, the last one being the name of the definition.
+  """
+  return ([scope.name for scope in type_defn.GetParentScopeStack()] +
+          [type_defn.name])
+
+
+def SortDeclarations(needed_decl):
+  """Orders forward declarations so that they can be emitted.
+
+  Classes come first, then typedefs, each typedef after the typedef it refers
+  to, if any. Within those constraints, declarations are sorted by scope path,
+  which keeps the output stable and groups them by namespace.
+
+  Args:
+    needed_decl: a set of Class and Typedef definitions.
+
+  Returns:
+    the ordered list of definitions.
+  """
+  classes = [type_defn for type_defn in needed_decl
+             if type_defn.defn_type == 'Class']
+  typedefs = [type_defn for type_defn in needed_decl
+              if type_defn.defn_type == 'Typedef']
+  ordered = sorted(classes, key=GetScopePath)
+  done = set()
+
+  def _Visit(type_defn):
+    if type_defn in done:
+      return
+    done.add(type_defn)
+    target = type_defn.type_defn
+    if target.defn_type == 'Typedef' and target in needed_decl:
+      _Visit(target)
+    ordered.append(type_defn)
+
+  for type_defn in sorted(typedefs, key=GetScopePath):
+    _Visit(type_defn)
+  return ordered
+
+
+def GetIncludeFanIn(include_map):
+  """Computes the include fan-in of headers.
+
+  Args:
+    include_map: a dict mapping each generated header to the list of files it
+      includes.
+
+  Returns:
+    a dict mapping each included file to a pair. The first element is the set
+    of generated headers that include it directly, the second one the set of
+    generated headers that include it directly or indirectly.
+  """
+  direct = {}
+  for header, includes in include_map.items():
+    for include_file in includes:
+      direct.setdefault(include_file, set()).add(header)
+  fan_in = {}
+  for include_file in direct:
+    transitive = set()
+    pending = [include_file]
+    while pending:
+      for header in direct.get(pending.pop(), []):
+        if header not in transitive:
+          transitive.add(header)
+          pending.append(header)
+    fan_in[include_file] = (direct[include_file], transitive)
+  return fan_in
+
+
+def WriteIncludeReport(filename, include_map):
+  """Writes the include fan-in report.
+
+  Each line lists an included file, the number of generated headers including
+  it directly, the number of generated headers including it directly or
+  indirectly (that get rebuilt when it changes), and the latter headers.
+  Files with the largest fan-in come first.
+
+  Args:
+    filename: the name of the report file.
+    include_map: a dict mapping each generated header to the list of files it
+      includes.
+  """
+  fan_in = GetIncludeFanIn(include_map)
+  lines = ['# include direct_fan_in transitive_fan_in headers\n']
+  for include_file in sorted(fan_in,
+                             key=lambda f: (-len(fan_in[f][1]), f)):
+    direct, transitive = fan_in[include_file]
+    lines.append('%s %d %d %s\n' % (include_file, len(direct),
+                                    len(transitive),
+                                    ' '.join(sorted(transitive))))
+  writer.WriteIfContentDifferent(filename, ''.join(lines))
 
 
 class HeaderGenerator(object):
@@ -81,6 +191,8 @@ class HeaderGenerator(object):
 
   def __init__(self, output_dir):
     self._output_dir = output_dir
+    # maps each generated header to the list of files it includes.
+    self.include_map = {}
 
   def GetSectionFromAttributes(self, parent_section, defn):
     """Gets the code section appropriate for a given definition.
@@ -153,8 +265,8 @@ class HeaderGenerator(object):
     """
     section = self.GetSectionFromAttributes(parent_section, obj)
     bm = obj.type_defn.binding_model
-    type_string, unused_need_defn = bm.CppTypedefString(scope, obj.type_defn)
-    check_types = [(True, obj.type_defn)]
+    type_string, need_defn = bm.CppTypedefString(scope, obj.type_defn)
+    check_types = [(need_defn, obj.type_defn)]
     section.EmitCode('typedef %s %s;' % (type_string, obj.name))
     return check_types
 
@@ -469,16 +581,50 @@ class HeaderGenerator(object):
       if type_defn.parent and type_defn.parent.defn_type != 'Namespace':
         # inner type: need the definition of the parent.
         self.CheckType(True, type_defn.parent)
-      else:
-        # only forward-declare classes.
-        # typedefs could be forward-declared by emitting the definition again,
-        # but this necessitates the source type to be forward-declared before.
-        # TODO: see if it is possible to find a proper ordering that let us
-        # forward-declare typedefs instead of needing to include the definition.
-        if type_defn.defn_type == 'Class':
-          self.needed_decl.add(type_defn)
+      elif type_defn.defn_type == 'Class':
+        self.needed_decl.add(type_defn)
+      elif self.CanForwardDeclTypedef(type_defn):
+        # the typedef is declared by emitting it again, after the type it
+        # refers to.
+        self.needed_decl.add(type_defn)
+        target = type_defn.type_defn
+        if target.defn_type == 'Class':
+          # classes defined in this file are only defined after the
+          # declarations.
+          self.needed_decl.add(target)
         else:
-          self.needed_defn.add(type_defn)
+          self.CheckType(False, target)
+      else:
+        self.needed_defn.add(type_defn)
+
+  def CanForwardDeclTypedef(self, type_defn):
+    """Queries whether a typedef can be forward-declared.
+
+    A typedef can be emitted again before its definition if it is not an inner
+    type, and the type it refers to can itself be declared without being
+    defined.
+
+    Args:
+      type_defn: the Definition of the type to check.
+
+    Returns:
+      True if type_defn is a typedef that can be forward-declared.
+    """
+    while type_defn.defn_type == 'Typedef':
+      if type_defn.parent.defn_type != 'Namespace':
+        return False
+      target = type_defn.type_defn
+      unused_string, need_defn = target.binding_model.CppTypedefString(
+          type_defn.parent, target)
+      if need_defn:
+        return False
+      if target.defn_type == 'Class':
+        return target.parent.defn_type == 'Namespace'
+      if target in self.emitted_defn:
+        # a typedef defined in this file comes after the declarations.
+        return False
+      type_defn = target
+    return False
 
   def Generate(self, idl_file, namespace, defn_list):
     """Generates the header file.
@@ -508,9 +654,7 @@ class HeaderGenerator(object):
 
     self.needed_decl -= self.needed_defn
     if self.needed_decl:
-      for type_defn in self.needed_decl:
-        # TODO: sort by namespace so that we don't open and close them more
-        # than necessary.
+      for type_defn in SortDeclarations(self.needed_decl):
         ForwardDecl(decl_section, type_defn)
       decl_section.EmitCode('')
 
@@ -520,9 +664,15 @@ class HeaderGenerator(object):
     #     raise CircularDefinition(type_defn)
     includes = set(type_defn.GetDefinitionInclude()
                    for type_defn in self.needed_defn)
-    for include_file in includes:
-      if include_file is not None:
-        writer.AddInclude(include_file)
+    includes.discard(None)
+    includes.discard(idl_file.header)
+    self.include_map[idl_file.header] = sorted(includes)
+    for include_file in sorted(includes):
+      writer.AddInclude(include_file)
+
+    writer.dependencies = idl_parser.GetSourceFiles(self.needed_decl |
+                                                    self.needed_defn)
+    writer.dependencies.add(idl_file.source)
     return writer
 
 
@@ -542,6 +692,9 @@ def ProcessFiles(output_dir, pairs, namespace):
   writer_list = []
   for (f, defn) in pairs:
     writer_list.append(generator.Generate(f, namespace, defn))
+  if gflags.FLAGS['include-report'].value:
+    WriteIncludeReport(gflags.FLAGS['include-report'].value,
+                       generator.include_map)
   return writer_list
 
 
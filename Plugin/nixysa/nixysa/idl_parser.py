@@ -77,6 +77,27 @@ class SourceLocation(object):
     return '%s:%s' % (self.file, self.line)
 
 
+def GetSourceFiles(type_defns):
+  """Gets the IDL files defining a set of types.
+
+  For typedefs, both the file defining the typedef and the file defining the
+  final type are returned.
+
+  Args:
+    type_defns: an iterable of Definitions.
+
+  Returns:
+    a set of IDL filenames. Types that don't come from an IDL file (like native
+    types) are skipped.
+  """
+  source_files = set()
+  for type_defn in type_defns:
+    for defn in [type_defn, type_defn.GetFinalType()]:
+      if defn.source and defn.source.file.source != '<internal>':
+        source_files.add(defn.source.file.source)
+  return source_files
+
+
 class Parser(object):
   """IDL parser class.
 
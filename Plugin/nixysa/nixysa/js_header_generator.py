@@ -28,6 +28,7 @@ import java_utils
 import naming
 import log
 import syntax_tree
+import unsized_array_binding
 
 
 class UndocumentedError(Exception):
@@ -124,9 +125,18 @@ class JSHeaderGenerator(object):
       scope: the parent scope.
       obj: the Typedef definition.
     """
-    # typedefs do not get exported for JavaScript.
-    # silence lint
-    parent_section, scope, obj = parent_section, scope, obj
+    # typedefs do not get exported for JavaScript, but the packed arrays,
+    # which are strings rather than arrays.
+    if 'packed' in obj.attributes:
+      packed_format = unsized_array_binding.GetPackedFormat(obj)
+      section = self.GetSectionFromAttributes(parent_section, obj)
+      id_prefix = js_utils.GetFullyQualifiedScopePrefix(scope)
+      self.Documentation(section, obj,
+                         '\nThis is a packed array: the base64 encoding of the'
+                         ' little-endian\n%s values, as held by a %sArray.'
+                         '\n@type {string}' %
+                         (packed_format, naming.Capitalized([packed_format])))
+      section.EmitCode('%s%s = goog.typedef;' % (id_prefix, obj.name))
 
   def Variable(self, parent_section, scope, obj):
     """Generates the code for a Variable definition.
@@ -245,7 +255,7 @@ class JSHeaderGenerator(object):
         for option in param['params']:
           union_strings.add(js_utils.GetFunctionParamType(option['func'],
                                                           option['param'].name))
-        param_string = '|'.join(union_strings)
+        param_string = '|'.join(sorted(union_strings))
         if len(union_strings) > 1:
           param_string = '(' + param_string + ')'
       param_comments += ['@param {%s} %s %s' % (param_string, param['new_name'],
@@ -569,6 +569,14 @@ class JavascriptFileWriter(object):
     self._include_section = self.Section(indent_string, 0)
     self._main_section = self.Section(indent_string, 0)
 
+  def GetFilename(self):
+    """Gets the name of the file this writer writes to.
+
+    Returns:
+      the name of the file.
+    """
+    return self._filename
+
   def AddInclude(self, name, system=False):
     """Adds an include to the file.
 
@@ -55,6 +55,11 @@ def SourceWarning(source, msg):
   Warning ('%s:%d %s' % (source.file.source, source.line, msg))
 
 
+def HaveErrors():
+  """Returns whether errors were printed."""
+  return _num_errors > 0
+
+
 def FailIfHaveErrors():
   """Print status and exit if there were errors."""
   global _num_errors
@@ -54,14 +54,18 @@ all the data for the namespace generation. Then the second pass generates the
 code for the namespaces.
 """
 
+import os.path
 import string
 import cpp_utils
+import gflags
 import globals_binding
 import idl_parser
+import log
 import naming
 import npapi_utils
 import pod_binding
 import syntax_tree
+import writer
 
 
 # default includes to add to the generated glue files
@@ -75,6 +79,18 @@ _header_includes = [('string.h', True),
                     ('common.h', False),
                     ('static_object.h', False)]
 
+# the static glue headers included by the generated glue files.
+_static_glue_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'static_glue', 'npapi')
+_static_glue_dependencies = [os.path.join(_static_glue_dir, include)
+                             for (include, system)
+                             in _header_includes + _cpp_includes
+                             if not system]
+
+# the precompiled header gathering the includes common to all the glue files,
+# emitted with --pch.
+_pch_header = 'glue_pch.h'
+
 
 # glue templates and helper strings
 
@@ -97,23 +113,21 @@ _enumerate_namespace_entries = """
 """
 
 _enumerate_property_entries = """
-  memcpy(output, property_ids,
-     NUM_PROPERTY_IDS * sizeof(NPIdentifier));
-  output += NUM_PROPERTY_IDS;
+  memcpy(output, all_property_ids,
+     NUM_ALL_PROPERTY_IDS * sizeof(NPIdentifier));
+  output += NUM_ALL_PROPERTY_IDS;
 """
 
 _enumerate_method_entries = """
-  memcpy(output, method_ids,
-     NUM_METHOD_IDS * sizeof(NPIdentifier));
-  output += NUM_METHOD_IDS;
+  memcpy(output, all_method_ids,
+     NUM_ALL_METHOD_IDS * sizeof(NPIdentifier));
+  output += NUM_ALL_METHOD_IDS;
 """
 
 _class_glue_header_static = """
 void InitializeGlue(NPP npp);
 NPClass *GetStaticNPClass(void);
 glue::globals::NPAPIObject *CreateRawStaticNPObject(NPP npp);
-void RegisterObjectBases(glue::globals::NPAPIObject *namespace_object,
-                         glue::globals::NPAPIObject *root_object);
 glue::globals::NPAPIObject *GetStaticNPObject(
     glue::globals::NPAPIObject *root_object);
 void StaticEnumeratePropertyHelper(NPIdentifier *output);
@@ -156,6 +170,23 @@ bool SetProperty(${ClassMutableParamType} object,
                  NPIdentifier name,
                  const NPVariant *variant,
                  const char **error_handle);
+bool InvokeMember(${ClassMutableParamType} object,
+                  NPP npp,
+                  int member,
+                  const NPVariant *args,
+                  uint32_t argCount,
+                  NPVariant *result,
+                  const char **error_handle);
+bool GetPropertyMember(${ClassParamType} object,
+                       NPP npp,
+                       int member,
+                       NPVariant *variant,
+                       const char **error_handle);
+bool SetPropertyMember(${ClassMutableParamType} object,
+                       NPP npp,
+                       int member,
+                       const NPVariant *variant,
+                       const char **error_handle);
 bool EnumeratePropertyEntries(NPObject *header,
                               NPIdentifier **value,
                               uint32_t *count);
@@ -259,21 +290,17 @@ static void InitializeStaticIds(NPP npp) {
   ${#InitNamespaceGlues}
 }
 
+${NamespaceCreator}
 glue::globals::NPAPIObject *CreateRawStaticNPObject(NPP npp) {
   GLUE_PROFILE_START(npp, "createobject");
   glue::globals::NPAPIObject *object =
       static_cast<glue::globals::NPAPIObject *>(
           NPN_CreateObject(npp, &static_npclass));
   GLUE_PROFILE_STOP(npp, "createobject");
-  ${#CreateNamespaces}
+  ${NamespaceAllocate}
   return object;
 }
 
-void RegisterObjectBases(glue::globals::NPAPIObject *namespace_object,
-                         glue::globals::NPAPIObject *root_object) {
-  ${#RegisterBases}
-}
-
 ${#GetStaticObjects}
 
 bool StaticInvokeDefault(NPObject *header,
@@ -383,7 +410,6 @@ bool EnumeratePropertyEntries(NPObject *header,
                               uint32_t *count);
 void EnumeratePropertyEntriesHelper(NPIdentifier *output);
 uint32_t GetPropertyCount();
-static uint32_t GetLocalPropertyCount();
 
 
 
@@ -407,14 +433,12 @@ NPClass *GetNPClass(void)
   return &npclass;
 }
 
-${PropertyTable}
-${MethodTable}
+${PropertyEnum}
+${MethodEnum}
+${AllPropertyTable}
+${AllMethodTable}
 
 uint32_t GetPropertyCount() {
-  return GetLocalPropertyCount() + ${BaseGetPropertyCount};
-}
-
-static uint32_t GetLocalPropertyCount() {
   return ${PropertyCount} + ${MethodCount};
 }
 
@@ -435,24 +459,27 @@ bool EnumeratePropertyEntries(NPObject *header,
   return true;
 }
 
-// This is broken out into a separate function so that derived classes can
-// call it as well without extra memory allocation.
+// The member tables include the members inherited from the base classes, so
+// the entries are copied in one go.
 // The caller is responsible for making sure there's sufficient space in output.
 void EnumeratePropertyEntriesHelper(NPIdentifier *output) {
   ${EnumeratePropertyEntries}
   ${EnumerateMethodEntries}
-  ${EnumeratePropertyEntriesHelperBaseCall}
 }
 
 static void InitializeMemberIds(NPP npp) {
-  ${PropertyInit}
-  ${MethodInit}
+  ${AllPropertyInit}
+  ${AllMethodInit}
 }
 
 static void InitializeIds(NPP npp) {
+  static bool initialized = false;
+  if (initialized) return;
+  initialized = true;
   InitializeMemberIds(npp);
   InitializeStaticIds(npp);
 }
+${CachedPropertyCheck}
 
 static bool InvokeEntry(NPObject *header,
                         NPIdentifier name,
@@ -489,7 +516,9 @@ static bool GetPropertyEntry(NPObject *header,
   GLUE_SCOPED_PROFILE(npp, std::string("${Class}::GetPropertyEntry(") +
       (id.text() ? id.text() : "") + ")", prof);
   if (!success) return false;  // A rare error case.
+  ${GetCachedProperty}
   bool ret = GetProperty(${ObjectNonMutable}, npp, name, variant, error_handle);
+  ${CacheProperty}
   GLUE_SCOPED_PROFILE_STOP(prof);
   if (!ret && error) {
     glue::globals::SetLastError(npp, error);
@@ -511,6 +540,7 @@ static bool SetPropertyEntry(NPObject *header,
       (id.text() ? id.text() : "") + ")", prof);
   if (!success) return false;  // A rare error case.
   bool ret = SetProperty(${Object}, npp, name, variant, error_handle);
+  ${InvalidateCachedProperty}
   GLUE_SCOPED_PROFILE_STOP(prof);
   if (!ret && error) {
     glue::globals::SetLastError(npp, error);
@@ -522,7 +552,7 @@ static bool SetPropertyEntry(NPObject *header,
 ${BindingGlueCpp}
 """
 
-_class_glue_cpp_base_member = """
+_class_glue_cpp_member = """
 bool Invoke(${ClassMutableParamType} object,
             NPP npp,
             NPIdentifier name,
@@ -533,10 +563,12 @@ bool Invoke(${ClassMutableParamType} object,
   DebugScopedId id(name);  // debug helper
   GLUE_SCOPED_PROFILE(npp, std::string("${Class}::Invoke(") + (id.text() ?
       id.text() : "") + ")", prof);
-  bool success = true;
-  ${#InvokeCode}
-  return ${BaseClassNamespace}::Invoke(object, npp, name, args, argCount,
-      result, error_handle);
+  ${InvokeDispatch}
+  if (!*error_handle) {
+    *error_handle =
+        "Method not found; perhaps it doesn't take that number of arguments?";
+  }
+  return false;
 }
 
 bool GetProperty(${ClassParamType} object,
@@ -547,9 +579,11 @@ bool GetProperty(${ClassParamType} object,
   DebugScopedId id(name);  // debug helper
   GLUE_SCOPED_PROFILE(npp, std::string("${Class}::GetProperty(") + (id.text() ?
       id.text() : "") + ")", prof);
-  ${#GetPropertyCode}
-  return ${BaseClassNamespace}::GetProperty(object, npp, name, variant,
-      error_handle);
+  ${GetPropertyDispatch}
+  if (!*error_handle) {
+    *error_handle = "Property not found.";
+  }
+  return false;
 }
 
 bool SetProperty(${ClassMutableParamType} object,
@@ -560,9 +594,44 @@ bool SetProperty(${ClassMutableParamType} object,
   DebugScopedId id(name);  // debug helper
   GLUE_SCOPED_PROFILE(npp, std::string("${Class}::SetProperty(") + (id.text() ?
       id.text() : "") + ")", prof);
+  ${SetPropertyDispatch}
+  if (!*error_handle) {
+    *error_handle = "Property not found.";
+  }
+  return false;
+}
+
+// The *Member functions implement the members declared by this class. The
+// member is the index of its identifier in the tables of this class, which
+// derived classes compute at generation time to dispatch inherited members
+// directly.
+bool InvokeMember(${ClassMutableParamType} object,
+                  NPP npp,
+                  int member,
+                  const NPVariant *args,
+                  uint32_t argCount,
+                  NPVariant *result,
+                  const char **error_handle) {
+  ${#InvokeCode}
+  return false;
+}
+
+bool GetPropertyMember(${ClassParamType} object,
+                       NPP npp,
+                       int member,
+                       NPVariant *variant,
+                       const char **error_handle) {
+  ${#GetPropertyCode}
+  return false;
+}
+
+bool SetPropertyMember(${ClassMutableParamType} object,
+                       NPP npp,
+                       int member,
+                       const NPVariant *variant,
+                       const char **error_handle) {
   ${#SetPropertyCode}
-  return ${BaseClassNamespace}::SetProperty(object, npp, name, variant,
-      error_handle);
+  return false;
 }
 
 static bool HasMethod(NPObject *header, NPIdentifier name) {
@@ -572,8 +641,8 @@ static bool HasMethod(NPObject *header, NPIdentifier name) {
   NPP npp = object->npp();
   GLUE_SCOPED_PROFILE(npp, std::string("${Class}::HasMethod(") + (id.text() ?
       id.text() : "") + ")", prof);
-  ${MethodCheck}
-  return ${BaseClassNamespace}::GetNPClass()->hasMethod(header, name);
+  ${AllMethodCheck}
+  return false;
 }
 
 static bool HasProperty(NPObject *header, NPIdentifier name) {
@@ -583,8 +652,8 @@ static bool HasProperty(NPObject *header, NPIdentifier name) {
   NPP npp = object->npp();
   GLUE_SCOPED_PROFILE(npp, std::string("${Class}::HasProperty(") + (id.text() ?
       id.text() : "") + ")", prof);
-  ${PropertyCheck}
-  return ${BaseClassNamespace}::GetNPClass()->hasProperty(header, name);
+  ${AllPropertyCheck}
+  return false;
 }
 """
 
@@ -611,7 +680,7 @@ bool StaticGetProperty(glue::globals::NPAPIObject *object,
   GLUE_SCOPED_PROFILE(npp, "${Class}::StaticGetProperty", prof);
   bool success = true;
   ${#StaticGetPropertyCode}
-  if (glue::globals::GetProperty(object, name, variant)) return true;
+  ${NamespaceGetProperty}
   return ${BaseClassNamespace}::StaticGetProperty(
       object->base(), npp, name, variant, error_handle);
 }
@@ -649,88 +718,12 @@ static bool StaticHasProperty(NPObject *header, NPIdentifier name) {
   GLUE_SCOPED_PROFILE(npp, std::string("${Class}::StaticHasProperty(") +
       (id.text() ? id.text() : "") + ")", prof);
   ${StaticPropertyCheck}
-  bool success = glue::globals::HasProperty(header, name);
-  if (success) {
-    return success;
-  }
+  ${NamespaceCheck}
   GLUE_SCOPED_PROFILE(npp, "hasproperty", prof1);
   return NPN_HasProperty(npp, object->base(), name);
 }
 
 """
-_class_glue_cpp_no_base_member = """
-bool Invoke(${ClassMutableParamType} object,
-            NPP npp,
-            NPIdentifier name,
-            const NPVariant *args,
-            uint32_t argCount,
-            NPVariant *result,
-            const char **error_handle) {
-  DebugScopedId id(name);  // debug helper
-  GLUE_SCOPED_PROFILE(npp, std::string("${Class}::Invoke(") + (id.text() ?
-      id.text() : "") + ")", prof);
-  bool success = true;
-  ${#InvokeCode}
-  if (!*error_handle) {
-    *error_handle =
-        "Method not found; perhaps it doesn't take that number of arguments?";
-  }
-  return false;
-}
-
-bool GetProperty(${ClassParamType} object,
-                 NPP npp,
-                 NPIdentifier name,
-                 NPVariant *variant,
-                 const char **error_handle) {
-  DebugScopedId id(name);  // debug helper
-  GLUE_SCOPED_PROFILE(npp, std::string("${Class}::GetProperty(") + (id.text() ?
-      id.text() : "") + ")", prof);
-  ${#GetPropertyCode}
-  if (!*error_handle) {
-    *error_handle = "Property not found.";
-  }
-  return false;
-}
-
-bool SetProperty(${ClassMutableParamType} object,
-                 NPP npp,
-                 NPIdentifier name,
-                 const NPVariant *variant,
-                 const char **error_handle) {
-  DebugScopedId id(name);  // debug helper
-  GLUE_SCOPED_PROFILE(npp, std::string("${Class}::SetProperty(") + (id.text() ?
-      id.text() : "") + ")", prof);
-  ${#SetPropertyCode}
-  if (!*error_handle) {
-    *error_handle = "Property not found.";
-  }
-  return false;
-}
-
-static bool HasMethod(NPObject *header, NPIdentifier name) {
-  DebugScopedId id(name);  // debug helper
-  glue::globals::NPAPIObject *object =
-      static_cast<glue::globals::NPAPIObject *>(header);
-  NPP npp = object->npp();
-  GLUE_SCOPED_PROFILE(npp, std::string("${Class}::HasMethod(") + (id.text() ?
-      id.text() : "") + ")", prof);
-  ${MethodCheck}
-  return false;
-}
-
-static bool HasProperty(NPObject *header, NPIdentifier name) {
-  DebugScopedId id(name);  // debug helper
-  glue::globals::NPAPIObject *object =
-      static_cast<glue::globals::NPAPIObject *>(header);
-  NPP npp = object->npp();
-  GLUE_SCOPED_PROFILE(npp, std::string("${Class}::HasProperty(") + (id.text() ?
-      id.text() : "") + ")", prof);
-  ${PropertyCheck}
-  return false;
-}
-"""
-
 _class_glue_cpp_no_base_static = """
 bool StaticInvoke(glue::globals::NPAPIObject *object,
                   NPP npp,
@@ -753,8 +746,8 @@ bool StaticGetProperty(glue::globals::NPAPIObject *object,
   GLUE_SCOPED_PROFILE(npp, "${Class}::StaticGetProperty", prof);
   bool success = true;
   ${#StaticGetPropertyCode}
-  success = glue::globals::GetProperty(object, name, variant);
-  return success;
+  ${NamespaceGetProperty}
+  return false;
 }
 
 bool StaticSetProperty(glue::globals::NPAPIObject *object,
@@ -788,12 +781,16 @@ static bool StaticHasProperty(NPObject *header, NPIdentifier name) {
   GLUE_SCOPED_PROFILE(npp, std::string("${Class}::StaticHasProperty(") +
       (id.text() ? id.text() : "") + ")", prof);
   ${StaticPropertyCheck}
-  return glue::globals::HasProperty(header, name);
+  ${NamespaceCheck}
+  return false;
 }
 """
 
 _namespace_glue_cpp_tail = """
 void InitializeGlue(NPP npp) {
+  static bool initialized = false;
+  if (initialized) return;
+  initialized = true;
   InitializeStaticIds(npp);
 }
 """
@@ -802,13 +799,13 @@ _class_glue_cpp_base_template = string.Template(''.join([
     _class_glue_cpp_common_head_static,
     _class_glue_cpp_common_head_member,
     _class_glue_cpp_base_static,
-    _class_glue_cpp_base_member]))
+    _class_glue_cpp_member]))
 
 _class_glue_cpp_no_base_template = string.Template(''.join([
     _class_glue_cpp_common_head_static,
     _class_glue_cpp_common_head_member,
     _class_glue_cpp_no_base_static,
-    _class_glue_cpp_no_base_member]))
+    _class_glue_cpp_member]))
 
 _namespace_glue_header = _class_glue_header_static
 
@@ -820,12 +817,15 @@ _namespace_glue_cpp_template = string.Template(''.join([
 _callback_glue_cpp_template = string.Template("""
 ${RunCallback} {
 ${StartException}
+  typedef ${ReturnType} ReturnType;
   const char *error=NULL;
   const char **error_handle = &error;
   bool success = true;
   NPVariant args[${ArgCount}];
   NPVariant result;
   NULL_TO_NPVARIANT(result);
+  // released after the return value is built from it.
+  ScopedVariant release_result(&result);
   ${ParamsToVariantsPre}
   if (success) {
     ${ParamsToVariantsPost}
@@ -847,17 +847,16 @@ ${StartException}
                                   ${ArgCount},
                                   &result);
       GLUE_PROFILE_STOP(npp, "invokeDefault");
-      if (success) {
-        GLUE_PROFILE_START(npp, "NPN_ReleaseVariantValue");
-        NPN_ReleaseVariantValue(&result);
-        GLUE_PROFILE_STOP(npp, "NPN_ReleaseVariantValue");
-      }
     }
   }
   for (int i = 0; i != ${ArgCount}; ++i) {
     NPN_ReleaseVariantValue(&args[i]);
   }
   ${ReturnEval}
+  if (!success) {
+    // the value may not have been converted, so a default one is returned.
+    return ReturnType();
+  }
   return ${ReturnValue};
 ${EndException}
 }
@@ -866,11 +865,14 @@ ${EndException}
 _callback_no_param_glue_cpp_template = string.Template("""
 ${RunCallback} {
 ${StartException}
+  typedef ${ReturnType} ReturnType;
   const char *error=NULL;
   const char **error_handle = &error;
   bool success = true;
   NPVariant result;
   NULL_TO_NPVARIANT(result);
+  // released after the return value is built from it.
+  ScopedVariant release_result(&result);
   if (success) {
     if (async && NPCallback::SupportsAsync(npp)) {
       NPCallback* callback = NPCallback::Create(npp);
@@ -890,14 +892,13 @@ ${StartException}
                                   0,
                                   &result);
       GLUE_PROFILE_STOP(npp, "invokeDefault");
-      if (success) {
-        GLUE_PROFILE_START(npp, "NPN_ReleaseVariantValue");
-        NPN_ReleaseVariantValue(&result);
-        GLUE_PROFILE_STOP(npp, "NPN_ReleaseVariantValue");
-      }
     }
   }
   ${ReturnEval}
+  if (!success) {
+    // the value may not have been converted, so a default one is returned.
+    return ReturnType();
+  }
   return ${ReturnValue};
 ${EndException}
 }
@@ -907,24 +908,37 @@ ${EndException}
 _initialize_glue_template = string.Template(
     '${Namespace}::InitializeGlue(npp);')
 
-_create_namespace_template = string.Template("""
-object->SetNamespaceObject(${PROPERTY},
-    ${Namespace}::CreateRawStaticNPObject(npp));""")
+_namespace_creator_template = string.Template("""
+// Creates the static objects of the inner namespaces and classes, when they
+// are first accessed.
+static glue::globals::NPAPIObject *CreateNamespaceObject(
+    glue::globals::NPAPIObject *root_object, int index) {
+  NPP npp = root_object->npp();
+  ${Switch}
+  return NULL;
+}
+""")
 
-_register_base_template = string.Template("""
-{
-  glue::globals::NPAPIObject *object =
-      namespace_object->GetNamespaceObjectByIndex(${PROPERTY});
-  object->set_base(${BaseClassNamespace}::GetStaticNPObject(root_object));
-  ${Namespace}::RegisterObjectBases(object, root_object);
-}""")
+_namespace_allocate = """
+object->AllocateNamespaceObjects(NUM_NAMESPACE_IDS, CreateNamespaceObject);
+object->set_names(namespace_ids, namespace_index);"""
 
-_register_no_base_template = string.Template("""
-{
-  glue::globals::NPAPIObject *object =
-      namespace_object->GetNamespaceObjectByIndex(${PROPERTY});
-  ${Namespace}::RegisterObjectBases(object, root_object);
-}""")
+_namespace_get_property = """
+if (glue::globals::GetNamespaceProperty(
+        object, glue::globals::FindIdentifier(namespace_index,
+                                              NUM_NAMESPACE_IDS, name),
+        variant)) {
+  return true;
+}"""
+
+_create_namespace_template = string.Template(
+    'return ${Namespace}::CreateRawStaticNPObject(npp);')
+
+_create_derived_namespace_template = string.Template("""
+glue::globals::NPAPIObject *object =
+    ${Namespace}::CreateRawStaticNPObject(npp);
+object->set_base(${BaseClassNamespace}::GetStaticNPObject(root_object));
+return object;""")
 
 _get_ns_object_template = string.Template("""
 namespace ${Namespace} {
@@ -938,6 +952,8 @@ glue::globals::NPAPIObject *GetStaticNPObject(
 
 _globals_glue_header_tail = """
 glue::globals::NPAPIObject *CreateStaticNPObject(NPP npp);
+
+const char *GetStaticGlueVariant();
 """
 
 _globals_glue_cpp_tail = """
@@ -947,28 +963,73 @@ glue::globals::NPAPIObject *GetStaticNPObject(
 }
 
 glue::globals::NPAPIObject *CreateStaticNPObject(NPP npp) {
-  glue::globals::NPAPIObject *root_object = CreateRawStaticNPObject(npp);
-  RegisterObjectBases(root_object, root_object);
-  return root_object;
+  return CreateRawStaticNPObject(npp);
+}
+
+// Returns the name of the static glue variant this glue was built for. This
+// fails to link if the static glue was built with different settings.
+const char *GetStaticGlueVariant() {
+  return glue::globals::GLUE_VARIANT;
 }
 """
 
 # code pieces templates
 
 _method_invoke_template = string.Template("""
-  if (name == ${table}[${method_id}] && argCount == ${argCount}) do {
+  if (argCount == ${argCount}) do {
     bool success = true;
     ${code}
   } while(false);""")
 
-_method_default_invoke_template = string.Template("""
-  if (argCount == ${argCount}) do {
+_overloaded_invoke_template = string.Template("""
+  if (argCount == ${argCount}) {
+    unsigned int candidates = 0;
+    ${ResolveCode}
+    ${InvokeCode}
+  }""")
+
+_overload_invoke_template = string.Template("""
+  if (candidates & ${mask}) do {
     bool success = true;
     ${code}
   } while(false);""")
 
+# the glue of the properties with the 'cached' attribute: the converted value is
+# kept in the NPObject after the first read, until the property is set.
+
+_cached_property_check_template = string.Template("""
+// Whether name is a property with the 'cached' attribute, whose value is kept
+// in the NPObject after the first read.
+static bool IsCachedProperty(NPIdentifier name) {
+  return ${Tests};
+}""")
+
+_get_cached_property_string = """
+glue::globals::PropertyCache *cache = NULL;
+if (IsCachedProperty(name)) {
+  cache = static_cast<NPAPIObject *>(header)->property_cache();
+  if (cache->Get(name, variant)) return true;
+}"""
+
+_cache_property_string = """
+if (ret && cache) cache->Set(name, *variant);"""
+
+_invalidate_cached_property_string = """
+if (ret && IsCachedProperty(name)) {
+  static_cast<NPAPIObject *>(header)->property_cache()->Invalidate(name);
+}"""
+
+_get_cached_static_property_string = """
+if (object->property_cache()->Get(name, variant)) return true;"""
+
+_cache_static_property_string = """
+object->property_cache()->Set(name, *variant);"""
+
+_invalidate_cached_static_property_string = """
+object->property_cache()->Invalidate(name);"""
+
 _property_template = string.Template("""
-  if (name == ${table}[${property_id}]) do {
+  do {
     bool success = true;
     ${code}
   } while(false);""")
@@ -1044,6 +1105,126 @@ def GetGlueCpp(idl_file):
     return idl_file.basename + '_glue.cc'
 
 
+def GetGlueCppShard(idl_file, index):
+  """Gets the name of a glue implementation shard for an IDL file.
+
+  When the glue implementation is split across several translation units, the
+  first one is the usual glue implementation file, the others are named after
+  their index.
+
+  Args:
+    idl_file: an idl_parser.File, the source IDL file.
+    index: the index of the shard.
+
+  Returns:
+    the name of the shard file.
+  """
+  if index == 0:
+    return GetGlueCpp(idl_file)
+  return '%s_glue_%d.cc' % (idl_file.basename, index)
+
+
+def GetGlueInternalHeader(idl_file):
+  """Gets the name of the header shared by the glue implementation shards.
+
+  Args:
+    idl_file: an idl_parser.File, the source IDL file.
+
+  Returns:
+    the name of the internal header.
+  """
+  return idl_file.basename + '_glue_internal.h'
+
+
+def CountLines(section):
+  """Counts the lines of code in a section, including its children sections.
+
+  Args:
+    section: a CppFileWriter.Section.
+
+  Returns:
+    the number of lines.
+  """
+  count = 0
+  for unused_line in section.IterLines():
+    count += 1
+  return count
+
+
+def SplitBlocks(sizes, shard_count, max_lines=0):
+  """Splits a list of blocks into contiguous shards of similar sizes.
+
+  Blocks are never split, so a shard can be bigger than max_lines if a single
+  block is.
+
+  Args:
+    sizes: the list of the sizes of the blocks, in lines.
+    shard_count: the minimum number of shards.
+    max_lines: (optional) the maximum number of lines in a shard. More shards
+      are used if needed. No limit if 0.
+
+  Returns:
+    a list of shard indices, one for each block.
+  """
+  indices = []
+  index = 0
+  current = 0
+  remaining = sum(sizes)
+  # the target size of the current shard, to spread the remaining blocks evenly
+  # across the remaining shards.
+  target = remaining / float(shard_count)
+  for size in sizes:
+    if current and ((index < shard_count - 1 and current + size / 2. > target)
+                    or (max_lines and current + size > max_lines)):
+      index += 1
+      current = 0
+      target = remaining / float(max(1, shard_count - index))
+    indices.append(index)
+    current += size
+    remaining -= size
+  return indices
+
+
+class ManifestWriter(object):
+  """Writer for the list of generated glue implementation files.
+
+  When the glue is sharded, the set of output files depends on the size of the
+  generated code. The manifest lists them so that build systems can learn the
+  actual translation units to compile.
+  """
+
+  def __init__(self, filename):
+    """Inits a ManifestWriter.
+
+    Args:
+      filename: the name of the manifest file.
+    """
+    self._filename = filename
+    self._names = []
+
+  def AddFile(self, name):
+    """Adds a file to the manifest.
+
+    Args:
+      name: the name of the file, relative to the output directory.
+    """
+    self._names.append(name)
+
+  def GetFilename(self):
+    """Gets the name of the file this writer writes to.
+
+    Returns:
+      the name of the file.
+    """
+    return self._filename
+
+  def Write(self):
+    """Writes the manifest, one file name per line."""
+    writer.WriteIfContentDifferent(self._filename,
+                                   ''.join(['%s\n' % name
+                                            for name in sorted(self._names)]))
+
+
 class MethodWithoutReturnType(Exception):
   """Raised when finding a function without return type."""
 
@@ -1056,50 +1237,402 @@ def GenNamespaceCode(context):
   """Generates the code for namespace glue.
 
   This function generates the necessary code to initialize the
-  globals::NPAPIObject instance with the inner namespace objects.
+  globals::NPAPIObject instance with the inner namespace objects. These are
+  only created when first accessed, and the bases of the classes get
+  registered then.
 
   Args:
     context: the NpapiGenerator.CodeGenContext for generating the glue.
 
   Returns:
     a dict is generated by npapi_utils.MakeIdTableDict, and contains the
-    substitution strings for the namespace ids.
+    substitution strings for the namespace ids, as well as the
+    NamespaceCreator and NamespaceAllocate strings creating the namespace
+    objects, and the NamespaceGetProperty string getting them by index.
   """
   namespace_ids = []
-  if context.namespace_list:
-    context.namespace_create_section.EmitCode(
-        'object->AllocateNamespaceObjects(NUM_NAMESPACE_IDS);')
-    context.namespace_create_section.EmitCode(
-        'object->set_names(namespace_ids);')
-    for ns_obj in context.namespace_list:
-      id_enum = 'SCOPE_%s' % naming.Normalize(ns_obj.name, naming.Upper)
-      namespace_ids.append((id_enum, '"%s"' % ns_obj.name))
-      full_namespace = npapi_utils.GetGlueFullNamespace(ns_obj)
-      context.namespace_init_section.EmitCode(
-          _initialize_glue_template.substitute(Namespace=full_namespace))
-      context.namespace_create_section.EmitCode(
-          _create_namespace_template.substitute(PROPERTY=id_enum,
-                                                Namespace=full_namespace))
-      if ns_obj.defn_type == 'Class' and ns_obj.base_type:
-        base_class_namespace = npapi_utils.GetGlueFullNamespace(
-            ns_obj.base_type.GetFinalType())
-        context.namespace_register_base_section.EmitCode(
-            _register_base_template.substitute(
-                PROPERTY=id_enum,
-                BaseClassNamespace=base_class_namespace,
-                Namespace=full_namespace))
+  create_cases = []
+  for ns_obj in context.namespace_list:
+    id_enum = 'SCOPE_%s' % naming.Normalize(ns_obj.name, naming.Upper)
+    namespace_ids.append((id_enum, '"%s"' % ns_obj.name))
+    full_namespace = npapi_utils.GetGlueFullNamespace(ns_obj)
+    context.namespace_init_section.EmitCode(
+        _initialize_glue_template.substitute(Namespace=full_namespace))
+    if ns_obj.defn_type == 'Class' and ns_obj.base_type:
+      base_class_namespace = npapi_utils.GetGlueFullNamespace(
+          ns_obj.base_type.GetFinalType())
+      create_code = _create_derived_namespace_template.substitute(
+          BaseClassNamespace=base_class_namespace,
+          Namespace=full_namespace)
+    else:
+      create_code = _create_namespace_template.substitute(
+          Namespace=full_namespace)
+    create_cases.append((id_enum, create_code))
+
+    context.namespace_get_static_object_section.EmitCode(
+        _get_ns_object_template.substitute(
+            Namespace=npapi_utils.GetGlueNamespace(ns_obj.GetFinalType()),
+            ParentNamespace=npapi_utils.GetGlueFullNamespace(
+                ns_obj.parent.GetFinalType()),
+            PROPERTY=id_enum))
+  substitution_dict = npapi_utils.MakeIdTableDict(namespace_ids, 'namespace')
+  if create_cases:
+    substitution_dict['NamespaceCreator'] = (
+        _namespace_creator_template.substitute(
+            Switch=npapi_utils.MakeIdSwitch('namespace', create_cases,
+                                            'index')))
+    substitution_dict['NamespaceAllocate'] = _namespace_allocate
+    substitution_dict['NamespaceGetProperty'] = _namespace_get_property
+  else:
+    substitution_dict['NamespaceCreator'] = ''
+    substitution_dict['NamespaceAllocate'] = ''
+    substitution_dict['NamespaceGetProperty'] = ''
+  return substitution_dict
+
+
+def GetMethodId(func):
+  """Gets the identifier of a non-static method.
+
+  Args:
+    func: the Function definition.
+
+  Returns:
+    a (enum name, quoted JS name) pair, as stored in the method table.
+  """
+  return ('METHOD_%s' % naming.Normalize(func.name, naming.Upper),
+          '"%s"' % naming.Normalize(func.name, naming.Java))
+
+
+def GetPropertyId(field):
+  """Gets the identifier of a non-static field.
+
+  Args:
+    field: the Variable definition.
+
+  Returns:
+    a (enum name, quoted JS name) pair, as stored in the property table.
+  """
+  return ('PROPERTY_%s' % naming.Normalize(field.name, naming.Upper),
+          '"%s"' % naming.Normalize(field.name, naming.Java))
+
+
+def GetMemberIds(class_defn):
+  """Gets the identifier tables of the instance members of a class.
+
+  This follows the rules NpapiGenerator uses to generate the glue of the
+  members, so that the glue of a derived class can index the tables of its base
+  classes.
+
+  Args:
+    class_defn: the Class definition.
+
+  Returns:
+    a (method_ids, property_ids, settable_ids, cached_ids) tuple. method_ids
+    and property_ids are the sorted lists of (enum name, quoted JS name) pairs
+    in the method and property tables. settable_ids and cached_ids are the sets
+    of the enum names of the properties that have a setter, and of those whose
+    value is cached.
+  """
+  method_ids = set()
+  property_ids = set()
+  settable_ids = set()
+  cached_ids = set()
+  for obj in class_defn.defn_list:
+    if ('nojs' in obj.attributes or 'private' in obj.attributes or
+        'protected' in obj.attributes or 'static' in obj.attributes):
+      continue
+    if obj.defn_type == 'Function' and obj.type_defn:
+      method_ids.add(GetMethodId(obj))
+    elif obj.defn_type == 'Variable':
+      property_id = GetPropertyId(obj)
+      property_ids.add(property_id)
+      if 'setter' in obj.attributes:
+        settable_ids.add(property_id[0])
+      if 'cached' in obj.attributes and 'getter' in obj.attributes:
+        cached_ids.add(property_id[0])
+  return sorted(method_ids), sorted(property_ids), settable_ids, cached_ids
+
+
+def GenMemberDispatchCode(class_defn):
+  """Generates the dispatch code for the instance members of a class.
+
+  The members of a class include the members inherited from its base classes,
+  so the dispatch functions look identifiers up in tables merging the members
+  of the whole hierarchy. Each entry calls the *Member functions of the classes
+  declaring that member, most derived first, with the index of the member in
+  the tables of that class. Inherited members are therefore dispatched without
+  going through the dispatch functions of each base class in turn.
+
+  The values of the properties with the 'cached' attribute in the most derived
+  class declaring them are kept in the NPObject, by the GetPropertyEntry and
+  SetPropertyEntry functions that have access to it.
+
+  Args:
+    class_defn: the Class definition.
+
+  Returns:
+    a (all_method_ids, all_property_ids, dict) tuple. all_method_ids and
+    all_property_ids are the lists of (enum name, quoted JS name) pairs in the
+    merged tables. The dict contains the substitution strings for the merged
+    tables and the dispatch code.
+  """
+  levels = []
+  level = class_defn
+  while level:
+    levels.append(level)
+    level = level.base_type and level.base_type.GetFinalType()
+  invoke_calls = {}
+  get_calls = {}
+  set_calls = {}
+  cached = {}
+  for depth in range(len(levels)):
+    method_ids, property_ids, settable_ids, cached_ids = GetMemberIds(
+        levels[depth])
+    # the class itself uses its enums, the base classes are given the indices.
+    if depth:
+      prefix = npapi_utils.GetGlueFullNamespace(levels[depth]) + '::'
+      method_members = map(str, range(len(method_ids)))
+      property_members = map(str, range(len(property_ids)))
+    else:
+      prefix = ''
+      method_members = [id_enum for (id_enum, name) in method_ids]
+      property_members = [id_enum for (id_enum, name) in property_ids]
+    for (id_enum, name), member in zip(method_ids, method_members):
+      invoke_calls.setdefault(('ALL_' + id_enum, name), []).append(
+          'if (%sInvokeMember(object, npp, %s, args, argCount, result,\n'
+          '                   error_handle)) return true;' % (prefix, member))
+    for (id_enum, name), member in zip(property_ids, property_members):
+      cached.setdefault(('ALL_' + id_enum, name), id_enum in cached_ids)
+      get_calls.setdefault(('ALL_' + id_enum, name), []).append(
+          'if (%sGetPropertyMember(object, npp, %s, variant,\n'
+          '                        error_handle)) return true;' %
+          (prefix, member))
+      if id_enum in settable_ids:
+        set_calls.setdefault(('ALL_' + id_enum, name), []).append(
+            'if (%sSetPropertyMember(object, npp, %s, variant,\n'
+            '                        error_handle)) return true;' %
+            (prefix, member))
+  all_method_ids = sorted(invoke_calls.keys())
+  all_property_ids = sorted(get_calls.keys())
+  substitution_dict = {}
+  substitution_dict.update(npapi_utils.MakeIdTableDict(all_method_ids,
+                                                       'all_method'))
+  substitution_dict.update(npapi_utils.MakeIdTableDict(all_property_ids,
+                                                       'all_property'))
+  for key, table, calls in [('InvokeDispatch', 'all_method', invoke_calls),
+                            ('GetPropertyDispatch', 'all_property', get_calls),
+                            ('SetPropertyDispatch', 'all_property', set_calls)]:
+    if calls:
+      cases = [(id_enum, '\n'.join(calls[(id_enum, name)]))
+               for (id_enum, name) in sorted(calls.keys())]
+      substitution_dict[key] = npapi_utils.MakeIdSwitch(table, cases)
+    else:
+      substitution_dict[key] = ''
+  cached_ids = [id_enum for (id_enum, name) in all_property_ids
+                if cached[(id_enum, name)]]
+  if cached_ids:
+    tests = ' ||\n      '.join(['name == all_property_ids[%s]' % id_enum
+                               for id_enum in cached_ids])
+    substitution_dict.update({
+        'CachedPropertyCheck':
+            _cached_property_check_template.substitute(Tests=tests),
+        'GetCachedProperty': _get_cached_property_string,
+        'CacheProperty': _cache_property_string,
+        'InvalidateCachedProperty': _invalidate_cached_property_string})
+  else:
+    substitution_dict.update({'CachedPropertyCheck': '',
+                              'GetCachedProperty': '',
+                              'CacheProperty': '',
+                              'InvalidateCachedProperty': ''})
+  return all_method_ids, all_property_ids, substitution_dict
+
+
+class Overload(object):
+  """An overload of a function, called from an Invoke dispatch function.
+
+  Attributes:
+    func: the Function definition.
+    variant_types: for each parameter, the (types, exact) pair returned by the
+      NpapiVariantTypes function of its binding model: the NPVariant types
+      (among 'void', 'null', 'bool', 'int32', 'double', 'string' and 'object')
+      its conversion accepts, and whether that conversion never fails.
+    exact: whether the conversions of the arguments never fail once their types
+      are accepted.
+    code: the glue code converting the arguments and calling the function.
+  """
+
+  def __init__(self, scope, func, code):
+    """Inits an Overload.
+
+    Args:
+      scope: the scope in which the glue is written.
+      func: the Function definition.
+      code: the glue code converting the arguments and calling the function.
+    """
+    self.func = func
+    self.variant_types = [
+        param.type_defn.binding_model.NpapiVariantTypes(scope, param.type_defn)
+        for param in func.params]
+    self.exact = False not in [exact for types, exact in self.variant_types]
+    self.code = code
+
+
+_variant_type_tests = [('void', 'NPVARIANT_IS_VOID'),
+                       ('null', 'NPVARIANT_IS_NULL'),
+                       ('bool', 'NPVARIANT_IS_BOOLEAN'),
+                       ('int32', 'NPVARIANT_IS_INT32'),
+                       ('double', 'NPVARIANT_IS_DOUBLE'),
+                       ('string', 'NPVARIANT_IS_STRING'),
+                       ('object', 'NPVARIANT_IS_OBJECT')]
+
+
+def GenVariantTypeTest(tests, input_expr):
+  """Generates the test of the type of a NPVariant.
+
+  Args:
+    tests: the names of the macros testing for the accepted types.
+    input_expr: an expression representing the NPVariant.
+
+  Returns:
+    the C++ expression.
+  """
+  if 'NPVARIANT_IS_INT32' in tests and 'NPVARIANT_IS_DOUBLE' in tests:
+    tests = [test for test in tests if test != 'NPVARIANT_IS_DOUBLE']
+    tests[tests.index('NPVARIANT_IS_INT32')] = 'NPVARIANT_IS_NUMBER'
+  return ' || '.join(['%s(%s)' % (test, input_expr) for test in tests])
+
+
+def GenOverloadResolution(overloads, position, candidates, leaves):
+  """Generates the decision tree selecting the overloads to try.
+
+  The tree tests the type of one argument at each level, and stops as soon as
+  only one overload is left: the conversion of the arguments reports the
+  errors. The overloads to try are the ones accepting the types of all the
+  arguments, up to the first one for which the conversions can't fail. When no
+  overload accepts the type of an argument, the first one that accepted the
+  previous arguments is tried, to report the error.
+
+  Args:
+    overloads: the list of Overload taking the same number of arguments.
+    position: the index of the argument tested at this level.
+    candidates: the indices of the overloads accepting the previous arguments.
+    leaves: a list, to which the list of overloads to try is added for each
+      combination of argument types that some overloads accept.
+
+  Returns:
+    the C++ code setting 'candidates' to the mask of the overloads to try.
+  """
+  branches = []
+  if len(candidates) > 1 and position < len(overloads[0].variant_types):
+    for variant_type, test in _variant_type_tests:
+      accepting = [i for i in candidates
+                   if variant_type in overloads[i].variant_types[position][0]]
+      for branch_candidates, tests in branches:
+        if branch_candidates == accepting:
+          tests.append(test)
+          break
       else:
-        context.namespace_register_base_section.EmitCode(
-            _register_no_base_template.substitute(PROPERTY=id_enum,
-                                                  Namespace=full_namespace))
+        branches.append((accepting, [test]))
+  if len(branches) < 2:
+    tried = []
+    for i in candidates:
+      tried.append(i)
+      if overloads[i].exact:
+        break
+    leaves.append(tried)
+    return 'candidates = %d;' % sum([1 << i for i in tried])
+  # branches leading to the same overloads get merged, and the one testing for
+  # the most types goes last, in the 'else' branch.
+  subtrees = []
+  for accepting, tests in branches:
+    if accepting:
+      subtree = GenOverloadResolution(overloads, position + 1, accepting,
+                                      leaves)
+    else:
+      subtree = 'candidates = %d;' % (1 << candidates[0])
+    for merged_subtree, merged_tests in subtrees:
+      if merged_subtree == subtree:
+        merged_tests.extend(tests)
+        break
+    else:
+      subtrees.append((subtree, tests))
+  if len(subtrees) == 1:
+    return subtrees[0][0]
+  subtrees.sort(key=lambda subtree: len(subtree[1]))
+  code = []
+  for index, (subtree, tests) in enumerate(subtrees):
+    tests = [name for unused_type, name in _variant_type_tests
+             if name in tests]
+    test = GenVariantTypeTest(tests, 'args[%d]' % position)
+    if index == 0:
+      code.append('if (%s) {' % test)
+    elif index < len(subtrees) - 1:
+      code.append('} else if (%s) {' % test)
+    else:
+      code.append('} else {')
+    code.append(subtree)
+  code.append('}')
+  return '\n'.join(code)
+
+
+def GenOverloadsCode(overloads):
+  """Generates the glue code calling one of the overloads of a function.
 
-      context.namespace_get_static_object_section.EmitCode(
-          _get_ns_object_template.substitute(
-              Namespace=npapi_utils.GetGlueNamespace(ns_obj.GetFinalType()),
-              ParentNamespace=npapi_utils.GetGlueFullNamespace(
-                  ns_obj.parent.GetFinalType()),
-              PROPERTY=id_enum))
-  return npapi_utils.MakeIdTableDict(namespace_ids, 'namespace')
+  The overloads are selected by the number of arguments, then by the types of
+  the arguments, so that usually only one overload gets its arguments
+  converted. Overloads that can never be selected, and overloads that can't be
+  told apart by the types of the arguments, are reported.
+
+  Args:
+    overloads: the list of Overload, in declaration order.
+
+  Returns:
+    the C++ code.
+  """
+  arg_counts = []
+  for overload in overloads:
+    if len(overload.func.params) not in arg_counts:
+      arg_counts.append(len(overload.func.params))
+  code = []
+  for arg_count in arg_counts:
+    group = [overload for overload in overloads
+             if len(overload.func.params) == arg_count]
+    if len(group) == 1:
+      code.append(_method_invoke_template.substitute(argCount=arg_count,
+                                                     code=group[0].code))
+      continue
+    leaves = []
+    resolve_code = GenOverloadResolution(group, 0, range(len(group)), leaves)
+    tried = set()
+    ambiguous = set()
+    for leaf in leaves:
+      tried.update(leaf)
+      if len(leaf) > 1:
+        ambiguous.update(leaf)
+    for i, overload in enumerate(group):
+      if i not in tried:
+        log.SourceWarning(overload.func.source,
+                          'overload of "%s" is never called: the types of '
+                          'its arguments are accepted by a previous overload.'
+                          % overload.func.name)
+    if ambiguous:
+      overload = group[min(ambiguous)]
+      log.SourceWarning(overload.func.source,
+                        'overloads of "%s" taking %d arguments can\'t be told '
+                        'apart by the types of their arguments, they are '
+                        'tried in turn.' % (overload.func.name, arg_count))
+    if len(tried) == 1:
+      # the types of the arguments don't matter.
+      code.append(_method_invoke_template.substitute(
+          argCount=arg_count, code=group[min(tried)].code))
+      continue
+    invoke_code = [_overload_invoke_template.substitute(mask=1 << i,
+                                                        code=group[i].code)
+                   for i in sorted(tried)]
+    code.append(_overloaded_invoke_template.substitute(
+        argCount=arg_count, ResolveCode=resolve_code,
+        InvokeCode=''.join(invoke_code)))
+  return '\n'.join(code)
 
 
 def MakePodType(name):
@@ -1136,6 +1669,9 @@ class NpapiGenerator(object):
       output_dir: the output directory for generated files.
     """
     self._output_dir = output_dir
+    self._shards = max(1, gflags.FLAGS['shards'].value)
+    self._max_tu_lines = gflags.FLAGS['max-tu-lines'].value
+    self._pch = gflags.FLAGS['pch'].value
     self._namespace_map = {}
     self._finalize_functions = []
     # TODO: instead of passing a raw void *, it would be better to define a
@@ -1170,10 +1706,6 @@ class NpapiGenerator(object):
         instance object for the container type.
       namespace_init_section: a section where the initialization code for the
         namespaces in the static object will go.
-      namespace_create_section: a section where the globals::NPAPIObject
-        creation code will go.
-      namespace_register_base_section: a section where the class bases get
-        registered into their corresponding globals::NPAPIObject.
       namespace_get_static_object_section: a section where the
         GetStaticNPObject functions get defined.
       static_invoke_section: a section where the Invoke implementation for the
@@ -1194,8 +1726,6 @@ class NpapiGenerator(object):
     """
 
     _sections = [('namespace_init_section', 'InitNamespaceGlues'),
-                 ('namespace_create_section', 'CreateNamespaces'),
-                 ('namespace_register_base_section', 'RegisterBases'),
                  ('namespace_get_static_object_section', 'GetStaticObjects'),
                  ('static_invoke_section', 'StaticInvokeCode'),
                  ('static_invoke_default_section', 'StaticInvokeDefaultCode'),
@@ -1230,6 +1760,7 @@ class NpapiGenerator(object):
         all_sections = self._sections
       else:
         all_sections = self._sections + self._class_sections
+      self.all_sections = all_sections
       if share_context:
         self.static_prop_ids = share_context.static_prop_ids
         self.static_method_ids = share_context.static_method_ids
@@ -1252,6 +1783,50 @@ class NpapiGenerator(object):
           setattr(self, field_name,
                   cpp_section.CreateUnlinkedSection(section_name))
           getattr(self, field_name).needed_glue = cpp_section.needed_glue
+          getattr(self, field_name).glue_blocks = cpp_section.glue_blocks
+          getattr(self, field_name).dispatch_cases = []
+          getattr(self, field_name).dispatch_table = None
+          getattr(self, field_name).dispatch_key = None
+        if not self.is_namespace:
+          # the instance members are dispatched by their index, in the
+          # *Member functions.
+          for field_name, section_name in self._class_sections:
+            getattr(self, field_name).dispatch_key = 'member'
+
+  def IsSharded(self):
+    """Queries whether the glue implementation gets split into several files.
+
+    Returns:
+      True if the glue implementation of each IDL file is sharded.
+    """
+    return self._shards > 1 or self._max_tu_lines > 0
+
+  def CreateGlueCppSection(self, parent_section, obj, namespace_name):
+    """Creates the glue implementation section for a definition.
+
+    When the glue is not sharded, the section is emitted into the parent
+    section, inside the glue namespace. Otherwise it is kept as a separate glue
+    block, that gets assigned to a shard when the file is finished.
+
+    Args:
+      parent_section: the glue implementation section of the parent scope.
+      obj: the Class, Callback or Namespace definition.
+      namespace_name: the name of the glue namespace for obj.
+
+    Returns:
+      the created section.
+    """
+    if parent_section.glue_blocks is None:
+      parent_section.PushNamespace(namespace_name)
+      cpp_section = parent_section.CreateSection(namespace_name)
+      parent_section.PopNamespace()
+    else:
+      cpp_section = parent_section.CreateUnlinkedSection(namespace_name)
+      parent_section.glue_blocks.append(
+          (npapi_utils.GetGlueFullNamespace(obj).split('::'), cpp_section))
+    cpp_section.needed_glue = parent_section.needed_glue
+    cpp_section.glue_blocks = parent_section.glue_blocks
+    return cpp_section
 
   def GetParamInputStrings(self, scope, param_list):
     """Gets the code to retrieve parameters from an array of NPVariants.
@@ -1302,6 +1877,8 @@ class NpapiGenerator(object):
       whose glue header is needed.
     """
     binding_model = type_defn.binding_model
+    # raises for the types that can't be returned.
+    binding_model.CppReturnValueString(scope, type_defn)
     pre, post = binding_model.NpapiExprToNPVariant(scope, type_defn, 'retval',
                                                    expression, result,
                                                    'success', 'npp')
@@ -1475,8 +2052,7 @@ class NpapiGenerator(object):
     type_defn = context.type_defn
     binding_model = context.binding_model
     section = context.invoke_section
-    id_enum = 'METHOD_%s' % naming.Normalize(func.name, naming.Upper)
-    name = '"%s"' % naming.Normalize(func.name, naming.Java)
+    id_enum, name = GetMethodId(func)
     context.method_ids.append((id_enum, name))
     strings, param_exprs, needed_glue = self.GetParamInputStrings(scope,
                                                                   func.params)
@@ -1496,8 +2072,8 @@ class NpapiGenerator(object):
                                                    expression, 'result')
     section.needed_glue.update(needed_glue)
     strings += [pre, _failure_test_string, post, 'return true;']
-    self.EmitInvokeCode(section, 'method_ids', id_enum, len(func.params),
-                        '\n'.join(strings))
+    self.EmitInvokeCode(section, 'method', id_enum,
+                        Overload(scope, func, '\n'.join(strings)))
 
   def EmitStaticCall(self, context, func):
     """Emits the glue for a static function call.
@@ -1531,8 +2107,8 @@ class NpapiGenerator(object):
                                                    expression, 'result')
     section.needed_glue.update(needed_glue)
     strings += [pre, _failure_test_string, post, 'return true;']
-    self.EmitInvokeCode(section, 'static_method_ids', id_enum,
-                        len(func.params), '\n'.join(strings))
+    self.EmitInvokeCode(section, 'static_method', id_enum,
+                        Overload(scope, func, '\n'.join(strings)))
 
   def EmitConstructorCall(self, context, func):
     """Emits the glue for a constructor call.
@@ -1562,7 +2138,8 @@ class NpapiGenerator(object):
                                                    'result')
     section.needed_glue.update(needed_glue)
     strings += [pre, _failure_test_string, post, 'return true;']
-    self.EmitInvokeDefaultCode(section, len(func.params), '\n'.join(strings))
+    self.EmitInvokeDefaultCode(section,
+                               Overload(scope, func, '\n'.join(strings)))
 
   def EmitMemberProp(self, context, field):
     """Emits the glue for a non-static member field access.
@@ -1574,8 +2151,7 @@ class NpapiGenerator(object):
     scope = context.scope
     type_defn = context.type_defn
     binding_model = context.binding_model
-    id_enum = 'PROPERTY_%s' % naming.Normalize(field.name, naming.Upper)
-    prop_name = '"%s"' % naming.Normalize(field.name, naming.Java)
+    id_enum, prop_name = GetPropertyId(field)
     context.prop_ids.append((id_enum, prop_name))
     if 'getter' in field.attributes:
       if 'userglue_getter' in field.attributes:
@@ -1599,7 +2175,7 @@ class NpapiGenerator(object):
     section = context.get_prop_section
     section.needed_glue.update(needed_glue)
     get_string = '\n'.join([pre, _failure_test_string, post, 'return true;'])
-    self.EmitPropertyCode(section, 'property_ids', id_enum, get_string)
+    self.EmitPropertyCode(section, 'property', id_enum, get_string)
 
     if 'setter' in field.attributes:
       # TODO: Add a specific error for trying to set a read-only prop.
@@ -1625,7 +2201,7 @@ class NpapiGenerator(object):
                                                field, param_expr)
       strings = [start_exception, code, _failure_test_string,
           '%s;' % expression, 'return true;', end_exception]
-      self.EmitPropertyCode(section, 'property_ids', id_enum,
+      self.EmitPropertyCode(section, 'property', id_enum,
                             '\n'.join(strings))
 
   def EmitStaticMemberProp(self, context, field):
@@ -1641,6 +2217,8 @@ class NpapiGenerator(object):
     id_enum = 'STATIC_PROPERTY_%s' % naming.Normalize(field.name, naming.Upper)
     prop_name = '"%s"' % naming.Normalize(field.name, naming.Java)
     context.static_prop_ids.append((id_enum, prop_name))
+    # the value of a cached property is kept in the static object.
+    cached = 'cached' in field.attributes and 'getter' in field.attributes
     if 'getter' in field.attributes:
       expression = binding_model.CppGetStatic(scope, type_defn, field)
       pre, post, needed_glue = self.GetReturnStrings(scope, field.type_defn,
@@ -1651,8 +2229,14 @@ class NpapiGenerator(object):
                                                          'variant')
     section = context.static_get_prop_section
     section.needed_glue.update(needed_glue)
-    get_string = '\n'.join([pre, _failure_test_string, post, 'return true;'])
-    self.EmitPropertyCode(section, 'static_property_ids', id_enum,
+    if cached:
+      get_string = '\n'.join([_get_cached_static_property_string, pre,
+                              _failure_test_string, post,
+                              _cache_static_property_string, 'return true;'])
+    else:
+      get_string = '\n'.join([pre, _failure_test_string, post,
+                              'return true;'])
+    self.EmitPropertyCode(section, 'static_property', id_enum,
                           get_string)
 
     if 'setter' in field.attributes:
@@ -1669,8 +2253,11 @@ class NpapiGenerator(object):
       expression = binding_model.CppSetStatic(scope, type_defn, field,
                                               param_expr)
       strings = [start_exception, code, _failure_test_string,
-          '%s;' % expression, 'return true;', end_exception]
-      self.EmitPropertyCode(section, 'static_property_ids', id_enum,
+          '%s;' % expression]
+      if cached:
+        strings.append(_invalidate_cached_static_property_string)
+      strings += ['return true;', end_exception]
+      self.EmitPropertyCode(section, 'static_property', id_enum,
                             '\n'.join(strings))
 
   def EmitEnumValue(self, context, enum, enum_value):
@@ -1692,34 +2279,72 @@ class NpapiGenerator(object):
     strings = ['INT32_TO_NPVARIANT(%s::%s, *variant);' %
                (cpp_utils.GetScopedName(scope, type_defn), enum_value.name),
                'return true;']
-    self.EmitPropertyCode(section, 'static_property_ids', id_enum,
+    self.EmitPropertyCode(section, 'static_property', id_enum,
                           '\n'.join(strings))
 
-  def EmitInvokeCode(self, section, table, id_enum, arg_count, code):
+  def AddDispatchCase(self, section, table, id_enum, code):
+    """Adds glue code to the case of an identifier in a dispatch function.
+
+    The code isn't emitted right away: the dispatch function switches on the
+    index of the identifier in its table, so the code for all the overloads of
+    a method has to be gathered into the same case first. EmitDispatchCode
+    emits the switch once all the members of the scope have been processed.
+
+    Args:
+      section: the code section of the dispatch function.
+      table: the table in which the identifier is defined, or None if the
+        dispatch function doesn't take an identifier (InvokeDefault).
+      id_enum: the identifier enum.
+      code: the glue code, or an Overload for the Invoke dispatch functions.
+    """
+    section.dispatch_table = table
+    for case_id, case_code in section.dispatch_cases:
+      if case_id == id_enum:
+        case_code.append(code)
+        return
+    section.dispatch_cases.append((id_enum, [code]))
+
+  def EmitDispatchCode(self, context):
+    """Emits the switches of the dispatch functions of a scope.
+
+    Args:
+      context: the code generation context.
+    """
+    for field_name, unused_section_name in context.all_sections:
+      section = getattr(context, field_name)
+      cases = []
+      for id_enum, code in section.dispatch_cases:
+        if isinstance(code[0], Overload):
+          cases.append((id_enum, GenOverloadsCode(code)))
+        else:
+          cases.append((id_enum, '\n'.join(code)))
+      if section.dispatch_table is None:
+        for id_enum, code in cases:
+          section.EmitCode(code)
+      elif cases:
+        section.EmitCode(npapi_utils.MakeIdSwitch(section.dispatch_table,
+                                                  cases,
+                                                  section.dispatch_key))
+
+  def EmitInvokeCode(self, section, table, id_enum, overload):
     """Emits glue code in an 'Invoke' dispatch function.
 
     Args:
       section: the code section of the dispatch function.
       table: the table in which the method identifier is defined.
       id_enum: the method identifier enum.
-      arg_count: the number of arguments for the function.
-      code: the glue code.
+      overload: the Overload for the function.
     """
-    section.EmitCode(_method_invoke_template.substitute(table=table,
-                                                        method_id=id_enum,
-                                                        argCount=arg_count,
-                                                        code=code))
+    self.AddDispatchCase(section, table, id_enum, overload)
 
-  def EmitInvokeDefaultCode(self, section, arg_count, code):
+  def EmitInvokeDefaultCode(self, section, overload):
     """Emits glue code in an 'InvokeDefault' dispatch function.
 
     Args:
       section: the code section of the dispatch function.
-      arg_count: the number of arguments for the function.
-      code: the glue code.
+      overload: the Overload for the function.
     """
-    section.EmitCode(_method_default_invoke_template.substitute(
-        argCount=arg_count, code=code))
+    self.AddDispatchCase(section, None, None, overload)
 
   def EmitPropertyCode(self, section, table, id_enum, code):
     """Emits glue code in a 'GetProperty' or 'SetProperty' dispatch function.
@@ -1730,9 +2355,8 @@ class NpapiGenerator(object):
       id_enum: the property identifier enum.
       code: the glue code.
     """
-    section.EmitCode(_property_template.substitute(table=table,
-                                                   property_id=id_enum,
-                                                   code=code))
+    self.AddDispatchCase(section, table, id_enum,
+                         _property_template.substitute(code=code))
 
   def Variable(self, context, obj):
     """Emits the glue code for a Variable definition.
@@ -1810,10 +2434,8 @@ class NpapiGenerator(object):
     header_section.needed_defn = context.header_section.needed_defn
     context.header_section.PopNamespace()
 
-    context.cpp_section.PushNamespace(namespace_name)
-    cpp_section = context.cpp_section.CreateSection(namespace_name)
-    cpp_section.needed_glue = context.cpp_section.needed_glue
-    context.cpp_section.PopNamespace()
+    cpp_section = self.CreateGlueCppSection(context.cpp_section, obj,
+                                            namespace_name)
 
     param_to_variant_pre = []
     param_to_variant_post = []
@@ -1851,6 +2473,7 @@ class NpapiGenerator(object):
     start_exception, end_exception = GenExceptionContext(
         _exception_macro_name, "callback return value", "<no name>")
     subst_dict = {'RunCallback': run_callback,
+                  'ReturnType': return_type_string,
                   'ArgCount': str(len(obj.params)),
                   'ParamsToVariantsPre': '\n'.join(param_to_variant_pre),
                   'ParamsToVariantsPost': '\n'.join(param_to_variant_post),
@@ -1866,25 +2489,22 @@ class NpapiGenerator(object):
     cpp_section.EmitCode(binding_model.NpapiBindingGlueCpp(scope, obj))
     header_section.EmitCode(binding_model.NpapiBindingGlueHeader(scope, obj))
 
-  def GetDictForEnumerations(self, context, has_base):
+  def GetDictForEnumerations(self, context):
     """Creates a dictionary used to fill in the gaps in the property
-    enumeration functions.  Note that this dictionary will in some cases cause
-    the insertion of the string ${BaseClassNamespace}, so it must be used
-    *before* the dictionary that fills in that macro.  This only happens when
-    the context is a derived class.
+    enumeration functions.  For a class, the instance members are enumerated
+    from the merged tables, which include the inherited members.
 
     Args:
       context: the code generation context
-      has_base: whether this is a class that has a base class
 
     Returns:
       a dictionary containing definitions for the code generation templates
     """
     dict = {}
     if not context.is_namespace:
-      if context.prop_ids:
+      if context.all_prop_ids:
         dict.update({
-          'PropertyCount': 'NUM_PROPERTY_IDS',
+          'PropertyCount': 'NUM_ALL_PROPERTY_IDS',
           'EnumeratePropertyEntries': _enumerate_property_entries,
         })
       else:
@@ -1892,9 +2512,9 @@ class NpapiGenerator(object):
           'PropertyCount': '0',
           'EnumeratePropertyEntries': '',
         })
-      if context.method_ids:
+      if context.all_method_ids:
         dict.update({
-          'MethodCount': 'NUM_METHOD_IDS',
+          'MethodCount': 'NUM_ALL_METHOD_IDS',
           'EnumerateMethodEntries': _enumerate_method_entries,
         })
       else:
@@ -1902,18 +2522,6 @@ class NpapiGenerator(object):
           'MethodCount': '0',
           'EnumerateMethodEntries': '',
         })
-      if has_base:
-        dict.update({
-          'BaseGetPropertyCount': '${BaseClassNamespace}::GetPropertyCount()',
-          'EnumeratePropertyEntriesHelperBaseCall':
-              """${BaseClassNamespace}::EnumeratePropertyEntriesHelper(
-                      output);\n""",
-        })
-      else:
-        dict.update({
-          'BaseGetPropertyCount': '0',
-          'EnumeratePropertyEntriesHelperBaseCall': '',
-        })
 
     if context.static_prop_ids:
       dict.update({
@@ -1976,16 +2584,17 @@ class NpapiGenerator(object):
     header_section.needed_defn = parent_context.header_section.needed_defn
     parent_context.header_section.PopNamespace()
 
-    parent_context.cpp_section.PushNamespace(namespace_name)
-    cpp_section = parent_context.cpp_section.CreateSection(namespace_name)
-    cpp_section.needed_glue = parent_context.cpp_section.needed_glue
-    parent_context.cpp_section.PopNamespace()
+    cpp_section = self.CreateGlueCppSection(parent_context.cpp_section, obj,
+                                            namespace_name)
 
     context = self.CodeGenContext(obj, scope, header_section, cpp_section, None)
     header_section.needed_defn.add(obj)
     cpp_section.needed_glue.add(obj)
 
     self.GenerateList(context, obj.defn_list)
+    self.EmitDispatchCode(context)
+    context.all_method_ids, context.all_prop_ids, member_dispatch_dict = (
+        GenMemberDispatchCode(obj))
 
     class_name_list = naming.SplitWords(obj.name)
     class_capitalized = naming.Capitalized(class_name_list)
@@ -2008,7 +2617,7 @@ class NpapiGenerator(object):
                    'BindingGlueHeader': binding_glue_header,
                    'DispatchFunctionHeader': function_header}
 
-    enum_dict = self.GetDictForEnumerations(context, obj.base_type)
+    enum_dict = self.GetDictForEnumerations(context)
     if obj.base_type:
       parent_context.cpp_section.needed_glue.add(obj.base_type)
       static_dict['BaseClassNamespace'] = npapi_utils.GetGlueFullNamespace(
@@ -2034,6 +2643,7 @@ class NpapiGenerator(object):
     substitution_dict.update(npapi_utils.MakeIdTableDict(
         context.static_prop_ids, 'static_property'))
     substitution_dict.update(namespace_id_dict)
+    substitution_dict.update(member_dispatch_dict)
 
     cpp_section.EmitTemplate(string.Template(cpp_template).safe_substitute(
         substitution_dict))
@@ -2079,10 +2689,8 @@ class NpapiGenerator(object):
       header_section.needed_defn = parent_context.header_section.needed_defn
       parent_context.header_section.PopNamespace()
 
-      parent_context.cpp_section.PushNamespace(namespace_name)
-      cpp_section = parent_context.cpp_section.CreateSection(namespace_name)
-      cpp_section.needed_glue = parent_context.cpp_section.needed_glue
-      parent_context.cpp_section.PopNamespace()
+      cpp_section = self.CreateGlueCppSection(parent_context.cpp_section, obj,
+                                              namespace_name)
 
       context = self.CodeGenContext(old_context.type_defn, old_context.scope,
                                     header_section, cpp_section, old_context)
@@ -2098,10 +2706,8 @@ class NpapiGenerator(object):
       header_section.needed_defn = parent_context.header_section.needed_defn
       parent_context.header_section.PopNamespace()
 
-      parent_context.cpp_section.PushNamespace(namespace_name)
-      cpp_section = parent_context.cpp_section.CreateSection(namespace_name)
-      cpp_section.needed_glue = parent_context.cpp_section.needed_glue
-      parent_context.cpp_section.PopNamespace()
+      cpp_section = self.CreateGlueCppSection(parent_context.cpp_section, obj,
+                                              namespace_name)
 
       context = self.CodeGenContext(obj, scope, header_section,
                                     cpp_section, None)
@@ -2111,6 +2717,7 @@ class NpapiGenerator(object):
         # This part can only be finalized after all files have been processed,
         # because later files can still add definitions to the namespace.
         # So do this work in a function that will get called at the end.
+        self.EmitDispatchCode(context)
         namespace_id_dict = GenNamespaceCode(context)
         parent_context.cpp_section.needed_glue.update(context.namespace_list)
 
@@ -2123,14 +2730,14 @@ class NpapiGenerator(object):
 
         header_section.EmitCode(_namespace_glue_header)
 
-        enum_dict = self.GetDictForEnumerations(context, False)
+        enum_dict = self.GetDictForEnumerations(context)
         temp_string = _namespace_glue_cpp_template.safe_substitute(enum_dict)
         temp_template = string.Template(temp_string)
 
         cpp_section.EmitTemplate(temp_template.safe_substitute(
             substitution_dict))
 
-      self._finalize_functions.append(_Finalize)
+      self._finalize_functions.append((obj.scope, _Finalize))
 
     context.cpp_section.needed_glue.add(obj)
     self.GenerateList(context, obj.defn_list)
@@ -2171,11 +2778,14 @@ class NpapiGenerator(object):
       func = getattr(self, obj.defn_type)
       func(context, obj)
 
-  def CreateGlueWriters(self, idl_file):
+  def CreateGlueWriters(self, idl_file, sharded=False):
     """Creates CppFileWriter instances for glue header and implementation.
 
     Args:
       idl_file: an idl_parser.File for the source file.
+      sharded: (optional) True if the glue implementation will be split into
+        several files. In that case, the implementation only includes the
+        internal header shared by the shards. Defaults to False.
 
     Returns:
       a pair of CppFileWriter, the first being the glue header writer, the
@@ -2183,16 +2793,43 @@ class NpapiGenerator(object):
     """
     cpp_writer = cpp_utils.CppFileWriter(
         '%s/%s' % (self._output_dir, GetGlueCpp(idl_file)), False)
-    for include, system in _cpp_includes:
-      cpp_writer.AddInclude(include, system)
-    cpp_writer.AddInclude(GetGlueHeader(idl_file), False)
+    if self._pch:
+      # the precompiled header has to come first.
+      cpp_writer.AddInclude(_pch_header, False)
+    if sharded:
+      cpp_writer.AddInclude(GetGlueInternalHeader(idl_file), False)
+    else:
+      if not self._pch:
+        for include, system in _cpp_includes:
+          cpp_writer.AddInclude(include, system)
+      cpp_writer.AddInclude(GetGlueHeader(idl_file), False)
 
     header_writer = cpp_utils.CppFileWriter(
         '%s/%s' % (self._output_dir, GetGlueHeader(idl_file)), True)
-    for include, system in _header_includes:
-      header_writer.AddInclude(include, system)
+    if self._pch:
+      header_writer.AddInclude(_pch_header, False)
+    else:
+      for include, system in _header_includes:
+        header_writer.AddInclude(include, system)
     return header_writer, cpp_writer
 
+  def CreatePchWriter(self):
+    """Creates the CppFileWriter for the precompiled header, if needed.
+
+    The precompiled header includes the system and static glue headers that
+    all the glue files need, so that they get compiled only once.
+
+    Returns:
+      a CppFileWriter for the precompiled header, or None if --pch is not set.
+    """
+    if not self._pch:
+      return None
+    pch_writer = cpp_utils.CppFileWriter(
+        '%s/%s' % (self._output_dir, _pch_header), True)
+    for include, system in _header_includes + _cpp_includes:
+      pch_writer.AddInclude(include, system)
+    return pch_writer
+
   def CreateGlueSection(self, writer):
     """Utility function to create a 'glue' section in a writer.
 
@@ -2222,13 +2859,18 @@ class NpapiGenerator(object):
       The second element is the glue header writer. The third element is the
       glue implementation writer.
     """
-    header_writer, cpp_writer = self.CreateGlueWriters(idl_file)
+    header_writer, cpp_writer = self.CreateGlueWriters(idl_file,
+                                                       self.IsSharded())
     header_writer.needed_defn = set()
     cpp_writer.needed_glue = set()
+    cpp_writer.glue_blocks = None
+    if self.IsSharded():
+      cpp_writer.glue_blocks = []
     header_section = self.CreateGlueSection(header_writer)
     cpp_section = self.CreateGlueSection(cpp_writer)
     header_section.needed_defn = header_writer.needed_defn
     cpp_section.needed_glue = cpp_writer.needed_glue
+    cpp_section.glue_blocks = cpp_writer.glue_blocks
 
     context = self.CodeGenContext(parent_context.type_defn,
                                   parent_context.scope, header_section,
@@ -2257,16 +2899,74 @@ class NpapiGenerator(object):
                                    in source_files)
     cpp_needed_glue_includes.add(GetGlueHeader(idl_file))
 
-    for include_file in cpp_needed_glue_includes:
+    for include_file in sorted(set(type_defn.GetDefinitionInclude() for
+                                   type_defn in header_writer.needed_defn)):
       if include_file:
-        cpp_writer.AddInclude(include_file)
+        header_writer.AddInclude(include_file)
 
-    for include_file in set(type_defn.GetDefinitionInclude() for type_defn
-                            in header_writer.needed_defn):
+    if cpp_writer.glue_blocks is None:
+      for include_file in sorted(cpp_needed_glue_includes):
+        if include_file:
+          cpp_writer.AddInclude(include_file)
+      return [header_writer, cpp_writer]
+
+    # all the shards include the same internal header.
+    internal_writer = cpp_utils.CppFileWriter(
+        '%s/%s' % (self._output_dir, GetGlueInternalHeader(idl_file)), True)
+    for include, system in _cpp_includes:
+      internal_writer.AddInclude(include, system)
+    for include_file in sorted(cpp_needed_glue_includes):
       if include_file:
-        header_writer.AddInclude(include_file)
+        internal_writer.AddInclude(include_file)
+
+    sizes = [CountLines(section) for unused_path, section
+             in cpp_writer.glue_blocks]
+    shard_indices = SplitBlocks(sizes, self._shards, self._max_tu_lines)
+    shard_count = max([self._shards] + [index + 1 for index in shard_indices])
+    shard_writers = [cpp_writer]
+    for index in range(1, shard_count):
+      shard_writer = cpp_utils.CppFileWriter(
+          '%s/%s' % (self._output_dir, GetGlueCppShard(idl_file, index)), False)
+      if self._pch:
+        shard_writer.AddInclude(_pch_header, False)
+      shard_writer.AddInclude(GetGlueInternalHeader(idl_file), False)
+      shard_writers.append(shard_writer)
+
+    for index in range(len(sizes)):
+      path, section = cpp_writer.glue_blocks[index]
+      shard_writer = shard_writers[shard_indices[index]]
+      for name in path:
+        shard_writer.PushNamespace(name)
+      shard_writer.CreateSection(path[-1]).EmitSection(section)
+      for name in path:
+        shard_writer.PopNamespace()
+    cpp_writer.glue_blocks = None
+
+    return [header_writer, internal_writer] + shard_writers
+
+  def TakeFinalizeFunctions(self):
+    """Takes the namespace finalizers registered since the last call.
+
+    A finalizer is registered by the pass 1 generation of the first definition
+    of a namespace, and only emits code into the glue of the file containing
+    that definition.
 
-    return [header_writer, cpp_writer]
+    Returns:
+      a list of (scope, function) pairs, where scope is the LookUpScope shared
+      by all the definitions of the namespace, and function runs the pass 2
+      generation for the namespace.
+    """
+    finalize_functions = self._finalize_functions
+    self._finalize_functions = []
+    return finalize_functions
+
+  def ReleaseNamespace(self, scope):
+    """Releases the code generation context of a finalized namespace.
+
+    Args:
+      scope: the LookUpScope shared by all the definitions of the namespace.
+    """
+    del self._namespace_map[scope]
 
   def BeginGlobals(self, idl_file, namespace):
     """Runs the pass 1 generation for the global namespace.
@@ -2292,6 +2992,8 @@ class NpapiGenerator(object):
     cpp_section = self.CreateGlueSection(cpp_writer)
     header_section.needed_defn = header_writer.needed_defn
     cpp_section.needed_glue = cpp_writer.needed_glue
+    # the global namespace glue is small, it is never sharded.
+    cpp_section.glue_blocks = None
 
     context = self.CodeGenContext(namespace, scope, header_section,
                                   cpp_section, None)
@@ -2309,8 +3011,9 @@ class NpapiGenerator(object):
     Returns:
       a list of CppFileWriter instances that contain the generated files.
     """
-    for f in self._finalize_functions:
+    for unused_scope, f in self.TakeFinalizeFunctions():
       f()
+    self.EmitDispatchCode(context)
     namespace_id_dict = GenNamespaceCode(context)
 
     substitution_dict = {}
@@ -2322,7 +3025,7 @@ class NpapiGenerator(object):
 
     context.header_section.EmitCode(_namespace_glue_header)
 
-    enum_dict = self.GetDictForEnumerations(context, False)
+    enum_dict = self.GetDictForEnumerations(context)
     temp_string = _namespace_glue_cpp_template.safe_substitute(enum_dict)
     temp_template = string.Template(temp_string)
 
@@ -2335,15 +3038,71 @@ class NpapiGenerator(object):
     includes = set(GetGlueHeader(ns_obj.source.file) for ns_obj in
                    context.namespace_list)
 
-    for include_file in includes:
+    for include_file in sorted(includes):
       if include_file is not None:
         cpp_writer.AddInclude(include_file)
 
     return [header_writer, cpp_writer]
 
 
-def ProcessFiles(output_dir, pairs, namespace):
-  """Generates the NPAPI glue for all input files.
+def GetNamespaceLastUse(pairs):
+  """Finds the last input file defining a part of each namespace.
+
+  Args:
+    pairs: a list of (idl_parser.File, syntax_tree.Definition list) describing
+      the list of top-level definitions in each source file.
+
+  Returns:
+    a dict mapping the LookUpScope of each namespace to the index in pairs of
+    the last file that contains a definition for that namespace.
+  """
+  last_use = {}
+
+  def _Visit(index, defn_list):
+    for obj in defn_list:
+      if obj.defn_type == 'Namespace':
+        last_use[obj.scope] = index
+        _Visit(index, obj.defn_list)
+
+  for index in range(len(pairs)):
+    _Visit(index, pairs[index][1])
+  return last_use
+
+
+def GetNamespaceFiles(pairs):
+  """Finds the input files defining a part of each namespace.
+
+  Args:
+    pairs: a list of (idl_parser.File, syntax_tree.Definition list) describing
+      the list of top-level definitions in each source file.
+
+  Returns:
+    a dict mapping the LookUpScope of each namespace to the set of the names of
+    the files that contain a definition for that namespace.
+  """
+  namespace_files = {}
+
+  def _Visit(idl_file, defn_list):
+    for obj in defn_list:
+      if obj.defn_type == 'Namespace':
+        namespace_files.setdefault(obj.scope, set()).add(idl_file.source)
+        _Visit(idl_file, obj.defn_list)
+
+  for idl_file, defn_list in pairs:
+    _Visit(idl_file, defn_list)
+  return namespace_files
+
+
+def IterFiles(output_dir, pairs, namespace):
+  """Generates the NPAPI glue for all input files, yielding it incrementally.
+
+  The glue for an IDL file is final once every file that adds definitions to
+  the namespaces first defined in it went through pass 1. At that point the
+  namespaces get finalized, and the glue writers for the file are yielded and
+  released, so that only the files still waiting on later ones are kept in
+  memory. The precompiled header, if any, is yielded first. The glue for the
+  global namespace needs all the files, and is yielded last, followed by the
+  manifest of the glue implementation files if the glue is sharded.
 
   Args:
     output_dir: the output directory.
@@ -2351,32 +3110,94 @@ def ProcessFiles(output_dir, pairs, namespace):
       the list of top-level definitions in each source file.
     namespace: a syntax_tree.Namespace for the global namespace.
 
-  Returns:
-    a list of cpp_utils.CppFileWriter, one for each output glue header or
-    implementation file.
+  Yields:
+    cpp_utils.CppFileWriter instances, one for each output glue header or
+    implementation file, and a ManifestWriter if the glue is sharded. Each of
+    them has a 'dependencies' attribute, the set of the input IDL files and
+    static glue headers its contents depend on.
   """
   globals_file = idl_parser.File('<internal>')
   globals_file.header = None
   globals_file.basename = 'globals'
   generator = NpapiGenerator(output_dir)
+  last_use = GetNamespaceLastUse(pairs)
+  namespace_files = GetNamespaceFiles(pairs)
+  all_dependencies = set(_static_glue_dependencies)
+  all_dependencies.update([idl_file.source for idl_file, defn in pairs])
+  manifest = None
+  if generator.IsSharded():
+    manifest = ManifestWriter('%s/manifest' % output_dir)
+    manifest.dependencies = all_dependencies
+  pch_writer = generator.CreatePchWriter()
+  if pch_writer:
+    pch_writer.dependencies = set(_static_glue_dependencies)
+    yield pch_writer
 
-  # pass 1
   global_context, global_header_writer, global_cpp_writer = (
       generator.BeginGlobals(globals_file, namespace))
-  file_map = {}
-  for (idl_file, defn) in pairs:
+  pending = []
+  for index in range(len(pairs)):
+    # pass 1
+    idl_file, defn = pairs[index]
     context, header_writer, cpp_writer = generator.BeginFile(
         idl_file, global_context, defn)
-    file_map[idl_file] = (context, header_writer, cpp_writer)
-
-  # pass 2
-  writer_list = generator.FinishGlobals(global_context, global_header_writer,
-                                        global_cpp_writer)
-  for (idl_file, defn) in pairs:
-    context, header_writer, cpp_writer = file_map[idl_file]
-    writer_list += generator.FinishFile(idl_file, context, header_writer,
-                                        cpp_writer)
-  return writer_list
+    finalize_functions = generator.TakeFinalizeFunctions()
+    ready_index = index
+    for scope, unused_function in finalize_functions:
+      ready_index = max(ready_index, last_use.get(scope, index))
+    pending.append((ready_index, idl_file, context, header_writer, cpp_writer,
+                    finalize_functions))
+
+    # pass 2 for the files that no later file depends on.
+    still_pending = []
+    for entry in pending:
+      if entry[0] > index:
+        still_pending.append(entry)
+        continue
+      (unused_index, idl_file, context, header_writer, cpp_writer,
+       finalize_functions) = entry
+      # the glue depends on the types it uses, and on all the parts of the
+      # namespaces it finalizes.
+      dependencies = set(_static_glue_dependencies)
+      dependencies.add(idl_file.source)
+      for scope, function in finalize_functions:
+        function()
+        generator.ReleaseNamespace(scope)
+        dependencies.update(namespace_files.get(scope, []))
+      dependencies.update(idl_parser.GetSourceFiles(cpp_writer.needed_glue |
+                                                    header_writer.needed_defn))
+      for writer in generator.FinishFile(idl_file, context, header_writer,
+                                         cpp_writer):
+        writer.dependencies = dependencies
+        if manifest and writer.GetFilename().endswith('.cc'):
+          manifest.AddFile(os.path.basename(writer.GetFilename()))
+        yield writer
+    pending = still_pending
+
+  for writer in generator.FinishGlobals(global_context, global_header_writer,
+                                        global_cpp_writer):
+    writer.dependencies = all_dependencies
+    if manifest and writer.GetFilename().endswith('.cc'):
+      manifest.AddFile(os.path.basename(writer.GetFilename()))
+    yield writer
+  if manifest:
+    yield manifest
+
+
+def ProcessFiles(output_dir, pairs, namespace):
+  """Generates the NPAPI glue for all input files.
+
+  Args:
+    output_dir: the output directory.
+    pairs: a list of (idl_parser.File, syntax_tree.Definition list) describing
+      the list of top-level definitions in each source file.
+    namespace: a syntax_tree.Namespace for the global namespace.
+
+  Returns:
+    a list of cpp_utils.CppFileWriter, one for each output glue header or
+    implementation file, and a ManifestWriter if the glue is sharded.
+  """
+  return list(IterFiles(output_dir, pairs, namespace))
 
 
 def main():
@@ -0,0 +1,517 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2009 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test for npapi_generator."""
+
+import os
+import shutil
+import StringIO
+import sys
+import tempfile
+import unittest
+import codegen
+import idl_parser
+import npapi_generator
+import npapi_utils
+import pod_binding
+import syntax_tree
+import unsized_array_binding
+
+# a by_value class whose instances are transient when they come from the
+# browser: array elements and callback results are released by the glue as
+# soon as they have been converted.
+_transient_idl = """
+namespace t {
+  [binding_model=by_value, include="t.h"] class Pt {
+    Pt(int v);
+    [getter] int v;
+  };
+  [include="t.h"] callback Pt PtMaker(int v);
+  [binding_model=by_pointer, include="t.h"] class Ops {
+    Ops();
+    [static] int sumPts(Pt[] pts);
+    [static] int norm(Pt pt);
+    int make(PtMaker maker, int v);
+  };
+}
+"""
+
+# a class with static methods overloaded on their argument count or types.
+_overloads_idl = """
+namespace o {
+  [binding_model=by_pointer, include="o.h"] class A { A(); };
+  [binding_model=by_pointer, include="o.h"] class B { B(); };
+  [binding_model=by_pointer, include="o.h"] class C {
+    C();
+    [static] int arity(int a);
+    [static] int arity(int a, int b);
+    [static] int typed(int a);
+    [static] int typed(std::string a);
+    [static] int ambiguous(A a);
+    [static] int ambiguous(B b);
+    [static] int dead(float a);
+    [static] int dead(int a);
+  };
+}
+"""
+
+# a namespace with an inner namespace, and classes one of which derives from
+# the other.
+_scopes_idl = """
+namespace n {
+  namespace inner {
+    [binding_model=by_pointer, include="n.h"] class W { W(); };
+  }
+  [binding_model=by_pointer, include="n.h"] class Base { Base(); };
+  [binding_model=by_pointer, include="n.h"] class Derived : Base {
+    Derived();
+  };
+}
+"""
+
+
+class NpapiGeneratorUnitTest(unittest.TestCase):
+  def setUp(self):
+    # the generator reads its options from the codegen flags.
+    codegen.FLAGS(['codegen'])
+    self.output_dir = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.output_dir)
+
+  def GenerateFiles(self, source):
+    """Generates the NPAPI glue for an IDL source.
+
+    Args:
+      source: the IDL source.
+
+    Returns:
+      a dict mapping the names of the generated files to their content.
+    """
+    idl_filename = os.path.join(self.output_dir, 'test.idl')
+    idl_file = open(idl_filename, 'w')
+    idl_file.write(source)
+    idl_file.close()
+    idl_file = idl_parser.File(idl_filename)
+    defn = idl_parser.Parser(self.output_dir).Parse(idl_file)
+    namespace = syntax_tree.Namespace(None, [], '',
+                                      defn + codegen.GetNativeTypes())
+    syntax_tree.FinalizeObjects(namespace, codegen.binding_models)
+    files = {}
+    for writer in npapi_generator.ProcessFiles(self.output_dir,
+                                               [(idl_file, defn)], namespace):
+      writer.Write()
+      files[os.path.basename(writer.GetFilename())] = open(
+          writer.GetFilename()).read()
+    return files
+
+  def Generate(self, source):
+    """Generates the NPAPI glue for an IDL source.
+
+    Args:
+      source: the IDL source.
+
+    Returns:
+      the content of the generated glue source files.
+    """
+    files = self.GenerateFiles(source)
+    return ''.join([files[name] for name in sorted(files)
+                    if name.endswith('_glue.cc')])
+
+  def GetFunction(self, content, start):
+    """Gets the code of a generated function.
+
+    Args:
+      content: the generated code.
+      start: the beginning of the function definition.
+
+    Returns:
+      the code from start to the closing brace of the function.
+    """
+    index = content.find(start)
+    self.assertNotEqual(index, -1)
+    return content[index:content.find('\n}\n', index) + 3]
+
+  def GenerateWithWarnings(self, source):
+    """Generates the NPAPI glue for an IDL source, capturing the warnings.
+
+    Args:
+      source: the IDL source.
+
+    Returns:
+      a (content, warnings) pair: the content of the generated glue source
+      files, and the text printed to stderr while generating them.
+    """
+    stderr = sys.stderr
+    sys.stderr = StringIO.StringIO()
+    try:
+      content = self.Generate(source)
+      warnings = sys.stderr.getvalue()
+    finally:
+      sys.stderr = stderr
+    return content, warnings
+
+  def GetMethodCase(self, content, name):
+    """Gets the dispatch code of a static method of the class C.
+
+    Args:
+      content: the generated code.
+      name: the upper-case name of the method.
+
+    Returns:
+      the code of the switch case of the method.
+    """
+    start = content.find('case STATIC_METHOD_%s: {' % name)
+    self.assertNotEqual(start, -1)
+    end = content.find('case STATIC_METHOD_', start + 1)
+    if end == -1:
+      # the last case ends with the function.
+      end = content.find('\n}\n', start)
+    return content[start:end]
+
+  def testOverloadsWithDistinctArity(self):
+    content = self.GenerateWithWarnings(_overloads_idl)[0]
+    code = self.GetMethodCase(content, 'ARITY')
+    # the argument count is enough to pick the overload.
+    self.assertEqual(code.count('if (argCount == 1) do {'), 1)
+    self.assertEqual(code.count('if (argCount == 2) do {'), 1)
+    self.assertEqual(code.find('candidates'), -1)
+    self.assertNotEqual(code.find('o::C::arity(param_a)'), -1)
+    self.assertNotEqual(code.find('o::C::arity(param_a, param_b)'), -1)
+
+  def testOverloadsWithDistinctTypes(self):
+    content = self.GenerateWithWarnings(_overloads_idl)[0]
+    code = ' '.join(self.GetMethodCase(content, 'TYPED').split())
+    # the type of the argument selects the overload, the others fall back to
+    # the first one, which reports the conversion error.
+    self.assertNotEqual(code.find('if (argCount == 1) { '
+                                  'unsigned int candidates = 0; '
+                                  'if (NPVARIANT_IS_STRING(args[0])) { '
+                                  'candidates = 2; '
+                                  '} else { '
+                                  'candidates = 1; '
+                                  '}'), -1)
+    first = code.find('if (candidates & 1) do {')
+    second = code.find('if (candidates & 2) do {')
+    self.assertTrue(-1 < first < code.find('o::C::typed(param_a)') < second)
+    self.assertNotEqual(code.find('o::C::typed(param_a)', second), -1)
+
+  def testAmbiguousOverloadsWarning(self):
+    content, warnings = self.GenerateWithWarnings(_overloads_idl)
+    self.assertNotEqual(warnings.find(
+        'overloads of "ambiguous" taking 1 arguments can\'t be told apart'),
+                        -1)
+    self.assertEqual(warnings.find('"typed"'), -1)
+    self.assertEqual(warnings.find('"arity"'), -1)
+    # both overloads accept any object, so both are tried in turn.
+    code = ' '.join(self.GetMethodCase(content, 'AMBIGUOUS').split())
+    self.assertNotEqual(code.find('if (NPVARIANT_IS_OBJECT(args[0])) { '
+                                  'candidates = 3; '), -1)
+    self.assertNotEqual(code.find('if (candidates & 1) do {'), -1)
+    self.assertNotEqual(code.find('if (candidates & 2) do {'), -1)
+
+  def testDeadOverloadWarning(self):
+    content, warnings = self.GenerateWithWarnings(_overloads_idl)
+    self.assertNotEqual(warnings.find(
+        'overload of "dead" is never called'), -1)
+    # the first overload accepts every number, the second one is dropped.
+    code = self.GetMethodCase(content, 'DEAD')
+    self.assertEqual(code.count('if (argCount == 1) do {'), 1)
+    self.assertEqual(code.find('candidates'), -1)
+    self.assertEqual(code.count('o::C::dead('), 1)
+
+  def testArrayElementCopiedBeforeRelease(self):
+    content = self.Generate(_transient_idl)
+    assign = content.find('[i] = ')
+    self.assertNotEqual(assign, -1)
+    release = content.find('NPN_ReleaseVariantValue(&value);', assign)
+    self.assertNotEqual(release, -1)
+    # no release of the element between its conversion and its assignment.
+    get_value = content.rfind('NPN_GetProperty', 0, assign)
+    self.assertEqual(
+        content.find('NPN_ReleaseVariantValue(&value);', get_value, assign),
+        -1)
+
+  def testArrayReleasedWhenElementNotSet(self):
+    content = self.Generate("""
+        [binding_model=by_pointer, include="t.h"] class Text {
+          std::string[] words();
+        };
+        """)
+    code = self.GetFunction(content, 'bool InvokeMember(')
+    set_value = code.find('success = SetNPArrayProperty(npp, retval_npobject, ')
+    self.assertNotEqual(set_value, -1)
+    # the array is released, and not returned, if an element couldn't be set.
+    release = code.find('if (!success && retval_npobject) {', set_value)
+    self.assertNotEqual(release, -1)
+    self.assertTrue(release <
+                    code.find('NPN_ReleaseObject(retval_npobject);', release) <
+                    code.find('OBJECT_TO_NPVARIANT(retval_npobject', release))
+
+  def testCallbackResultReleasedAfterReturnValue(self):
+    content = self.Generate(_transient_idl)
+    self.assertNotEqual(content.find('ScopedVariant release_result(&result);'),
+                        -1)
+    self.assertEqual(content.find('NPN_ReleaseVariantValue(&result);'), -1)
+
+  def testByValueAllocateCopiesOnce(self):
+    content = self.Generate(_transient_idl)
+    content = content[content.find('namespace class_Pt {'):]
+    allocate = self.GetFunction(
+        content, 'static NPObject *Allocate(NPP npp, NPClass *theClass) {')
+    # the wrapper is copy-constructed from the value, never default
+    # constructed then assigned.
+    self.assertEqual(allocate.count('NPAPIObject('), 1)
+    self.assertNotEqual(allocate.find('NPAPIObject(npp, *initial_value)'), -1)
+    create = self.GetFunction(content, 'NPAPIObject *CreateNPObject(')
+    self.assertEqual(create.find('set_value'), -1)
+    header = self.GenerateFiles(_transient_idl)['test_glue.h']
+    header = header[header.find('namespace class_Pt {'):
+                    header.find('}  // namespace class_Pt')]
+    self.assertEqual(header.find('NPAPIObject(NPP npp):'), -1)
+
+  def testByValuePropertyCacheOnlyWithCachedGetters(self):
+    header = self.GenerateFiles(_transient_idl)['test_glue.h']
+    self.assertEqual(header.find('PropertyCache'), -1)
+    files = self.GenerateFiles("""
+        [binding_model=by_value, include="t.h"] class Pt {
+          Pt(int v);
+          [getter, cached] int v;
+        };
+        [binding_model=by_value, include="t.h"] class Pt3 : Pt {
+          Pt3(int v);
+        };
+        """)
+    # the cache of the base class is kept by the derived class too.
+    header = files['test_glue.h']
+    for name in ['Pt', 'Pt3']:
+      start = header.find('namespace class_%s {' % name)
+      self.assertNotEqual(start, -1)
+      self.assertNotEqual(header.find(
+          'glue::globals::PropertyCache property_cache_;', start,
+          header.find('}  // namespace class_%s' % name)), -1)
+    self.assertNotEqual(files['test_glue.cc'].find(
+        'static_cast<NPAPIObject *>(header)->property_cache()'), -1)
+
+  def testByValueCreationRestoresEnclosingValue(self):
+    content = self.Generate(_transient_idl)
+    content = content[content.find('namespace class_Pt {'):]
+    create = self.GetFunction(content, 'NPAPIObject *CreateNPObject(')
+    save = create.find('enclosing_value = initial_value;')
+    call = create.find('NPN_CreateObject')
+    restore = create.find('initial_value = enclosing_value;')
+    self.assertTrue(-1 < save < call < restore)
+    self.assertEqual(create.find('initial_value = NULL;'), -1)
+
+  def testByValueParameterPointerUsedOnSuccess(self):
+    content = self.Generate(_transient_idl)
+    # the parameter points to the value of the argument's NPObject, and is
+    # only dereferenced once the conversion succeeded.
+    declare = content.find('const t::Pt *param_pt = NULL;')
+    self.assertNotEqual(declare, -1)
+    call = content.find('t::Ops::norm((*param_pt))', declare)
+    self.assertNotEqual(call, -1)
+    self.assertNotEqual(content.find('if (!success) break;', declare, call), -1)
+    # a callback result that is not a Pt is not dereferenced either.
+    callback = self.GetFunction(content, 't::Pt RunCallback(')
+    failure = callback.find('return ReturnType();')
+    self.assertTrue(-1 < failure < callback.find('return (*retval);'))
+
+  def testStringViewReturnRejected(self):
+    # the view would point into the result of the call, released by the glue.
+    self.assertRaises(pod_binding.BadStringUsage, self.Generate, """
+        [include="t.h"] callback StringView Namer(int v);
+        """)
+    self.assertRaises(pod_binding.BadStringUsage, self.Generate, """
+        [binding_model=by_pointer, include="t.h"] class Text {
+          StringView name();
+        };
+        """)
+    self.Generate("""
+        [binding_model=by_pointer, include="t.h"] class Text {
+          int count(StringView text);
+        };
+        """)
+
+  def testInheritedMembersInMergedTables(self):
+    content = self.GenerateFiles("""
+        [binding_model=by_pointer, include="t.h"] class Base {
+          Base();
+          int zeta();
+          int alpha();
+          [getter] int size;
+        };
+        [binding_model=by_pointer, include="t.h"] class Derived : Base {
+          Derived();
+          int beta();
+        };
+        """)['test_glue.cc']
+    content = content[content.find('namespace class_Derived {'):
+                      content.find('}  // namespace class_Derived')]
+    # the tables of the derived class merge the members of the hierarchy,
+    # sorted by name, and are looked up in their sorted identifier index.
+    self.assertNotEqual(content.find('static const NPUTF8 *all_method_names'
+                                     '[NUM_ALL_METHOD_IDS] = {\n'
+                                     '  "alpha",\n'
+                                     '  "beta",\n'
+                                     '  "zeta"\n'
+                                     '};'), -1)
+    self.assertNotEqual(content.find('glue::globals::SortIdentifiers('
+                                     'all_method_ids, NUM_ALL_METHOD_IDS,'), -1)
+    invoke = ' '.join(self.GetFunction(content, 'bool Invoke(').split())
+    self.assertNotEqual(invoke.find(
+        'switch (glue::globals::FindIdentifier(all_method_index, '
+        'NUM_ALL_METHOD_IDS, name)) {'), -1)
+    # inherited members are dispatched to the base class with their index in
+    # its own sorted table: alpha, then zeta.
+    self.assertNotEqual(invoke.find(
+        'case ALL_METHOD_ALPHA: { '
+        'if (glue::class_Base::InvokeMember(object, npp, 0, args,'), -1)
+    self.assertNotEqual(invoke.find(
+        'case ALL_METHOD_BETA: { '
+        'if (InvokeMember(object, npp, METHOD_BETA, args,'), -1)
+    self.assertNotEqual(invoke.find(
+        'case ALL_METHOD_ZETA: { '
+        'if (glue::class_Base::InvokeMember(object, npp, 1, args,'), -1)
+    get = ' '.join(self.GetFunction(content, 'bool GetProperty(').split())
+    self.assertNotEqual(get.find(
+        'case ALL_PROPERTY_SIZE: { if (glue::class_Base::GetPropertyMember('
+        'object, npp, 0, variant,'), -1)
+
+  def testNamespaceObjectsCreatedLazily(self):
+    content = self.GenerateFiles(_scopes_idl)['test_glue.cc']
+    # the glue of the namespace n comes after the glue of its inner scopes.
+    content = content[content.find('}  // namespace class_Derived'):]
+    create = self.GetFunction(
+        content, 'glue::globals::NPAPIObject *CreateRawStaticNPObject(')
+    # the inner objects are not created along with the namespace object.
+    self.assertEqual(create.count('CreateRawStaticNPObject('), 1)
+    self.assertNotEqual(create.find(
+        'AllocateNamespaceObjects(NUM_NAMESPACE_IDS, CreateNamespaceObject);'),
+                        -1)
+    code = self.GetFunction(
+        content, 'static glue::globals::NPAPIObject *CreateNamespaceObject(')
+    code = ' '.join(code.split())
+    self.assertNotEqual(code.find(
+        'case SCOPE_INNER: { return '
+        'glue::namespace_n::namespace_inner::CreateRawStaticNPObject(npp);'),
+                        -1)
+    # the base class object is only looked up when the derived one is created.
+    self.assertNotEqual(code.find(
+        'case SCOPE_DERIVED: { glue::globals::NPAPIObject *object = '
+        'glue::namespace_n::class_Derived::CreateRawStaticNPObject(npp); '
+        'object->set_base(glue::namespace_n::class_Base::GetStaticNPObject('
+        'root_object)); return object;'), -1)
+    code = ' '.join(content[content.find('namespace class_Derived {'):].split())
+    self.assertNotEqual(code.find(
+        'return parent->GetNamespaceObjectByIndex(SCOPE_DERIVED);'), -1)
+  def testNamespaceLookupInSortedIndex(self):
+    content = self.GenerateFiles(_scopes_idl)['test_glue.cc']
+    namespace = content[content.find('}  // namespace class_Derived'):]
+    self.assertNotEqual(namespace.find(
+        'object->set_names(namespace_ids, namespace_index);'), -1)
+    # the inner object is found through the index, without going through the
+    # generic property lookup.
+    code = ' '.join(self.GetFunction(namespace,
+                                     'bool StaticGetProperty(').split())
+    self.assertNotEqual(code.find(
+        'if (glue::globals::GetNamespaceProperty( object, '
+        'glue::globals::FindIdentifier(namespace_index, NUM_NAMESPACE_IDS, '
+        'name), variant)) {'), -1)
+    code = self.GetFunction(
+        namespace, 'static bool StaticHasProperty(NPObject *header, '
+        'NPIdentifier name) {')
+    code = ' '.join(code.split())
+    self.assertNotEqual(code.find(
+        'if (glue::globals::FindIdentifier(namespace_index, NUM_NAMESPACE_IDS, '
+        'name) >= 0) return true;'), -1)
+    # a class without inner scopes has no lookup at all.
+    base = content[content.find('namespace class_Base {'):
+                   content.find('}  // namespace class_Base')]
+    code = self.GetFunction(base, 'bool StaticGetProperty(')
+    self.assertEqual(code.find('namespace_index'), -1)
+    self.assertEqual(code.find('GetNamespaceProperty'), -1)
+
+  def testPackedArrayPassedAsString(self):
+    content = self.Generate("""
+        [packed] typedef float[] Samples;
+        [binding_model=by_pointer, include="t.h"] class Sound {
+          Samples filter(Samples samples);
+        };
+        """)
+    code = ' '.join(self.GetFunction(content, 'bool InvokeMember(').split())
+    # the array is decoded from, and encoded to, a single string.
+    self.assertNotEqual(code.find(
+        'if (!NPVariantToPackedArray(args[0], &param_samples)) { '
+        'success = false; *error_handle = "Error in " '
+        'NPAPI_GLUE_EXCEPTION_CONTEXT ": was expecting a base64 string of '
+        'float32 values.";'), -1)
+    self.assertNotEqual(code.find(
+        'success = PackedArrayToNPVariant(object->filter(param_samples), '
+        'result);'), -1)
+    self.assertEqual(code.find('CreateArray'), -1)
+    self.assertEqual(code.find('NPN_GetProperty'), -1)
+    # only arrays of numbers or booleans can be packed.
+    self.assertRaises(unsized_array_binding.InvalidPackedArrayType,
+                      self.Generate, """
+        [packed] typedef std::string[] Names;
+        [binding_model=by_pointer, include="t.h"] class Text {
+          int count(Names names);
+        };
+        """)
+
+  def testPooledAllocation(self):
+    content = self.GenerateFiles("""
+        [binding_model=by_pointer, include="t.h", pooled] class Node {
+          Node();
+        };
+        [binding_model=by_value, include="t.h", pooled="16"] class Pt {
+          Pt(int v);
+        };
+        [binding_model=by_pointer, include="t.h"] class Plain { Plain(); };
+        """)['test_glue.cc']
+    for name, capacity, new in [
+        ('Node', npapi_utils.DEFAULT_POOL_CAPACITY, 'NPAPIObject(npp)'),
+        ('Pt', 16, 'NPAPIObject(npp, *initial_value)')]:
+      code = content[content.find('namespace class_%s {' % name):
+                     content.find('}  // namespace class_%s' % name)]
+      code = ' '.join(code.split())
+      self.assertNotEqual(code.find(
+          'static glue::globals::NPObjectPool pool(sizeof(NPAPIObject), %d, '
+          '"%s");' % (capacity, name)), -1)
+      self.assertNotEqual(code.find(
+          'return new(pool.Allocate(npp)) %s;' % new), -1)
+      self.assertNotEqual(code.find(
+          'pool.Delete(static_cast<NPAPIObject *>(header));'), -1)
+    # the other classes still allocate from the heap.
+    code = content[content.find('namespace class_Plain {'):
+                   content.find('}  // namespace class_Plain')]
+    self.assertEqual(code.find('pool'), -1)
+    self.assertNotEqual(code.find('return new NPAPIObject(npp);'), -1)
+    self.assertNotEqual(code.find('delete static_cast<NPAPIObject *>(header);'),
+                        -1)
+
+  def testInvalidPoolCapacity(self):
+    for capacity in ['0', 'many', '-1']:
+      self.assertRaises(npapi_utils.InvalidPoolCapacity, self.Generate, """
+          [binding_model=by_pointer, include="t.h", pooled="%s"] class Node {
+            Node();
+          };
+          """ % capacity)
+
+
+if __name__ == '__main__':
+  unittest.main()
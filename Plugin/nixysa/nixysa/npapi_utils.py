@@ -23,24 +23,42 @@ import string
 import naming
 
 
-_id_table_template = string.Template("""
+_id_enum = """
 enum {
   ${IDS}NUM_${TABLE}_IDS
-};
+};"""
+
+_id_enum_template = string.Template(_id_enum)
+
+_id_table_template = string.Template(_id_enum + """
 
 static NPIdentifier ${table}_ids[NUM_${TABLE}_IDS];
+static glue::globals::IdentifierEntry ${table}_index[NUM_${TABLE}_IDS];
 static const NPUTF8 *${table}_names[NUM_${TABLE}_IDS] = {
   ${NAMES}
 };""")
 
 _id_init_template = string.Template("""
 NPN_GetStringIdentifiers(${table}_names, NUM_${TABLE}_IDS,
-                                ${table}_ids);""")
+                                ${table}_ids);
+glue::globals::SortIdentifiers(${table}_ids, NUM_${TABLE}_IDS,
+                               ${table}_index);""")
 
 _id_check_template = string.Template("""
-for (int i = 0; i < NUM_${TABLE}_IDS; i++)
-    if (name == ${table}_ids[i])
-        return true;""")
+if (glue::globals::FindIdentifier(${table}_index, NUM_${TABLE}_IDS,
+                                  name) >= 0)
+    return true;""")
+
+_id_switch_template = string.Template("""
+switch (${KEY}) {
+${CASES}
+}""")
+
+_id_case_template = string.Template("""
+  case ${id}: {
+    ${CODE}
+    break;
+  }""")
 
 def MakeIdTableDict(id_list, table_name):
   """Generate a substitution dictionary for NPAPI identifiers management.
@@ -49,10 +67,12 @@ def MakeIdTableDict(id_list, table_name):
   management, and puts them into a dictionary that can be used for template
   substitution during glue generation.
 
-  The substitution dictionary contains 3 keys that are generated based on the
+  The substitution dictionary contains 4 keys that are generated based on the
   given table name, one for the declaration of the table, one for the
-  initialization of the table, and one to check whether an identifier is in the
-  table or not.
+  declaration of the identifier enum alone, one for the initialization of the
+  table, and one to check whether an identifier is in the table or not. Along
+  with the identifiers, the table holds an index sorted by identifier, so that
+  lookups are a binary search rather than a linear scan.
 
   Args:
     id_list: a list of pairs of string. Each element is composed of the name of
@@ -63,26 +83,133 @@ def MakeIdTableDict(id_list, table_name):
   Returns:
     the substitution dictionary.
   """
-  id_set = set(id_list)
+  # sort the identifiers so that the generated code doesn't depend on the set
+  # ordering.
+  id_list = sorted(set(id_list))
   words = naming.SplitWords(table_name)
   name_cap = naming.Capitalized(words)
-  if id_set:
-    ids = ''.join(id + ',\n' for (id, id_name) in id_set)
-    names = ',\n  '.join(id_name for (id, id_name) in id_set)
+  if id_list:
+    ids = ''.join(id + ',\n' for (id, id_name) in id_list)
+    names = ',\n  '.join(id_name for (id, id_name) in id_list)
     table_dict = {'TABLE': naming.Upper(words),
                   'table': naming.Lower(words),
                   'Table': name_cap,
                   'IDS': ids,
                   'NAMES': names}
     return {'%sTable' % name_cap: _id_table_template.substitute(table_dict),
+            '%sEnum' % name_cap: _id_enum_template.substitute(table_dict),
             '%sInit' % name_cap: _id_init_template.substitute(table_dict),
             '%sCheck' % name_cap: _id_check_template.substitute(table_dict)}
   else:
     return {'%sTable' % name_cap: '',
+            '%sEnum' % name_cap: '',
             '%sInit' % name_cap: '',
             '%sCheck' % name_cap: ''}
 
 
+def MakeIdSwitch(table_name, cases, key=None):
+  """Generates a switch dispatching on the identifiers of a table.
+
+  The switch runs the code for the case matching the index of an identifier in
+  the table. The code for each case gets to the end of the switch if it doesn't
+  return.
+
+  Args:
+    table_name: the name of the identifier table.
+    cases: a list of pairs of string. Each element is composed of the name of
+      the C++ enum value representing the identifier, and of the code for that
+      case.
+    key: the C++ expression of the index to switch on. If None, the identifier
+      'name' is looked up in the table index.
+
+  Returns:
+    the C++ code for the switch.
+  """
+  words = naming.SplitWords(table_name)
+  if key is None:
+    key = ('glue::globals::FindIdentifier(%s_index, NUM_%s_IDS,\n'
+           '                              name)' %
+           (naming.Lower(words), naming.Upper(words)))
+  case_strings = [_id_case_template.substitute(id=id, CODE=code)
+                  for (id, code) in cases]
+  return _id_switch_template.substitute(KEY=key, CASES=''.join(case_strings))
+
+
+# The number of released objects whose memory a class with the 'pooled'
+# attribute keeps for the next allocations, unless the attribute sets another
+# bound, as in [pooled="1024"].
+DEFAULT_POOL_CAPACITY = 256
+
+_pool_template = string.Template("""
+static glue::globals::NPObjectPool pool(sizeof(NPAPIObject), ${Capacity},
+                                        "${Class}");""")
+
+
+class InvalidPoolCapacity(Exception):
+  """Raised when the 'pooled' attribute of a class is not a positive number."""
+
+  def __init__(self, type_defn):
+    Exception.__init__(self)
+    self.type_defn = type_defn
+
+
+def MakeAllocationDict(type_defn, class_name):
+  """Generates the code allocating and freeing the NPObjects of a class.
+
+  The NPAPIObjects of a class with the 'pooled' attribute are allocated from a
+  bounded free list of the memory of the released ones, instead of the heap.
+
+  Args:
+    type_defn: the Definition for the class.
+    class_name: the C++ name of the class, used to report the use of the pool
+      to the profiler.
+
+  Returns:
+    a dict containing the 'Pool' key, the declaration of the pool (or ''), the
+    'New' key, the beginning of the new expression allocating a NPAPIObject (to
+    be followed by the type and the constructor arguments), and the 'Delete'
+    key, the statement deleting the NPAPIObject 'header'.
+
+  Raises:
+    InvalidPoolCapacity: the 'pooled' attribute is not a positive number.
+  """
+  if 'pooled' not in type_defn.attributes:
+    return {'Pool': '',
+            'New': 'new',
+            'Delete': 'delete static_cast<NPAPIObject *>(header);'}
+  capacity = type_defn.attributes['pooled'] or str(DEFAULT_POOL_CAPACITY)
+  if not capacity.isdigit() or not int(capacity):
+    raise InvalidPoolCapacity(type_defn)
+  return {'Pool': _pool_template.substitute(Capacity=capacity,
+                                            Class=class_name),
+          'New': 'new(pool.Allocate(npp))',
+          'Delete': 'pool.Delete(static_cast<NPAPIObject *>(header));'}
+
+
+def HasCachedProperties(class_defn):
+  """Checks whether the NPObjects of a class keep a cache of property values.
+
+  Only the classes with a JavaScript property with the 'cached' attribute,
+  declared or inherited, need a PropertyCache in their NPAPIObject.
+
+  Args:
+    class_defn: the Class definition.
+
+  Returns:
+    True if the class or one of its base classes has a cached property.
+  """
+  while class_defn:
+    for obj in class_defn.defn_list:
+      if (obj.defn_type == 'Variable' and 'cached' in obj.attributes and
+          'getter' in obj.attributes and 'nojs' not in obj.attributes and
+          'private' not in obj.attributes and
+          'protected' not in obj.attributes and
+          'static' not in obj.attributes):
+        return True
+    class_defn = class_defn.base_type and class_defn.base_type.GetFinalType()
+  return False
+
+
 class InvalidScopeType(Exception):
   """Raised when a scope was expected but the Definition is not a scope."""
 
@@ -456,6 +456,29 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
   return (nullable_text, variable)
 
 
+def NpapiVariantTypes(scope, type_defn):
+  """Gets the NPVariant types of the data type, and 'null'.
+
+  This function is used to resolve overloads on the types of the arguments,
+  without trying each conversion in turn.
+
+  Args:
+    scope: a Definition for the scope in which the glue will be written.
+    type_defn: a Definition, representing the type of the value.
+
+  Returns:
+    a (list, bool) pair, the list containing the NPVariant types (among 'void',
+    'null', 'bool', 'int32', 'double', 'string' and 'object') NpapiFromNPVariant
+    accepts, and the bool being True if the conversion of a NPVariant of one of
+    these types never fails.
+  """
+  data_type = type_defn.GetFinalType().data_type
+  types, exact = data_type.binding_model.NpapiVariantTypes(scope, data_type)
+  if 'null' not in types:
+    types = ['null'] + types
+  return types, exact
+
+
 _to_npvariant_pre_template = string.Template("""
 ${pre_text}
 if (!${variable}) {
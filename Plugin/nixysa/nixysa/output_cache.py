@@ -0,0 +1,238 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2009 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Content-addressed cache of generated files.
+
+This module implements a local cache of code generator outputs, shared across
+build trees. Each entry is a directory named after a key computed from all the
+inputs of a code generator run (IDL contents, generator and binding model
+sources, flags), containing the files generated by that run. On a hit the files
+are materialized into the output directory without running the generator.
+An entry can also hold metadata, that the code generator uses to restore the
+files that depend on the build tree.
+
+The cache is bounded in size: least recently used entries are evicted when a
+new entry is stored.
+"""
+
+import os
+import os.path
+import shutil
+import tempfile
+import locking
+import log
+import writer
+
+_STATS_FILENAME = 'stats'
+_ENTRY_PREFIX = 'entry-'
+# generated files never start with a dot, so this can't clash with them.
+_METADATA_FILENAME = '.metadata'
+
+
+class OutputCache(object):
+  """Output cache class."""
+
+  def __init__(self, cache_dir, max_size):
+    """Inits an OutputCache.
+
+    Args:
+      cache_dir: the directory containing the cache entries. It is created if
+        it doesn't exist.
+      max_size: the maximum size of the cache, in bytes.
+    """
+    self._cache_dir = cache_dir
+    self._max_size = max_size
+    if not os.path.isdir(cache_dir):
+      os.makedirs(cache_dir)
+
+  def _GetEntryDir(self, key):
+    """Gets the directory of the cache entry for a key."""
+    return os.path.join(self._cache_dir, _ENTRY_PREFIX + key)
+
+  def _UpdateStats(self, hits=0, misses=0, bytes_saved=0):
+    """Adds to the statistics stored in the cache directory.
+
+    Args:
+      hits: the number of hits to add.
+      misses: the number of misses to add.
+      bytes_saved: the number of materialized bytes to add.
+    """
+    stats_filename = os.path.join(self._cache_dir, _STATS_FILENAME)
+    # open in append mode so that the file gets created without truncating it
+    # before the lock is acquired.
+    stats_file = open(stats_filename, 'a+')
+    try:
+      locking.lockf(stats_file, locking.LOCK_EX)
+      stats_file.seek(0)
+      values = [int(v) for v in stats_file.read().split()] or [0, 0, 0]
+      values[0] += hits
+      values[1] += misses
+      values[2] += bytes_saved
+      stats_file.seek(0)
+      stats_file.truncate()
+      stats_file.write('%d %d %d\n' % tuple(values))
+      stats_file.flush()
+      locking.lockf(stats_file, locking.LOCK_UN)
+    finally:
+      stats_file.close()
+
+  def Lookup(self, key, output_dir):
+    """Materializes the files of a cache entry into the output directory.
+
+    Files whose content is already up to date in the output directory are left
+    untouched, so that they don't trigger rebuilds. The other files are copied,
+    and get the current time as their modification time.
+
+    Args:
+      key: the cache key.
+      output_dir: the output directory.
+
+    Returns:
+      True if the entry was found and materialized, False otherwise.
+    """
+    entry_dir = self._GetEntryDir(key)
+    bytes_saved = 0
+    try:
+      names = os.listdir(entry_dir)
+      for name in names:
+        if name == _METADATA_FILENAME:
+          continue
+        source = os.path.join(entry_dir, name)
+        target = os.path.join(output_dir, name)
+        size = os.path.getsize(source)
+        bytes_saved += size
+        if (os.path.exists(target) and os.path.getsize(target) == size and
+            writer.GetFileDigest(target) == writer.GetFileDigest(source)):
+          continue
+        if os.path.exists(target):
+          os.remove(target)
+        # copy rather than hard link, so that editing the output in place
+        # doesn't change the cache entry. The copy gets the current time as
+        # its modification time, like a freshly generated file.
+        shutil.copy2(source, target)
+        os.utime(target, None)
+        log.Info('Writing %s (cached)' % target)
+      # mark the entry as recently used.
+      os.utime(entry_dir, None)
+    except (IOError, OSError):
+      # missing entry, or evicted by another process while reading it.
+      self._UpdateStats(misses=1)
+      return False
+    self._UpdateStats(hits=1, bytes_saved=bytes_saved)
+    return True
+
+  def GetMetadata(self, key):
+    """Gets the metadata of a cache entry.
+
+    Args:
+      key: the cache key.
+
+    Returns:
+      the metadata string given to Store, or None if the entry has no metadata
+      or is missing.
+    """
+    try:
+      return open(os.path.join(self._GetEntryDir(key),
+                               _METADATA_FILENAME)).read()
+    except IOError:
+      return None
+
+  def Store(self, key, output_dir, names, metadata=None):
+    """Stores generated files into a cache entry, then evicts old entries.
+
+    Args:
+      key: the cache key.
+      output_dir: the output directory.
+      names: the names of the generated files, relative to output_dir.
+      metadata: a string to store with the files, or None.
+    """
+    entry_dir = self._GetEntryDir(key)
+    if os.path.isdir(entry_dir):
+      return
+    # fill a temporary directory, then rename it so that other processes never
+    # see a partial entry.
+    temp_dir = tempfile.mkdtemp(dir=self._cache_dir, prefix='.tmp-')
+    try:
+      for name in names:
+        shutil.copyfile(os.path.join(output_dir, name),
+                        os.path.join(temp_dir, name))
+      if metadata is not None:
+        metadata_file = open(os.path.join(temp_dir, _METADATA_FILENAME), 'w')
+        metadata_file.write(metadata)
+        metadata_file.close()
+      os.rename(temp_dir, entry_dir)
+    except (IOError, OSError):
+      # most likely another process stored the same entry concurrently.
+      shutil.rmtree(temp_dir, True)
+    self.Evict()
+
+  def GetEntries(self):
+    """Gets the entries in the cache.
+
+    Returns:
+      a list of (last use time, size in bytes, entry directory) tuples, least
+      recently used first.
+    """
+    entries = []
+    for name in os.listdir(self._cache_dir):
+      if not name.startswith(_ENTRY_PREFIX):
+        continue
+      entry_dir = os.path.join(self._cache_dir, name)
+      try:
+        size = 0
+        for file_name in os.listdir(entry_dir):
+          size += os.path.getsize(os.path.join(entry_dir, file_name))
+        entries.append((os.path.getmtime(entry_dir), size, entry_dir))
+      except OSError:
+        # evicted by another process.
+        pass
+    entries.sort()
+    return entries
+
+  def Evict(self):
+    """Removes least recently used entries until the cache fits its size."""
+    entries = self.GetEntries()
+    total_size = sum([size for (unused_time, size, unused_dir) in entries])
+    for unused_time, size, entry_dir in entries:
+      if total_size <= self._max_size:
+        break
+      shutil.rmtree(entry_dir, True)
+      total_size -= size
+
+  def GetStats(self):
+    """Gets the cache statistics.
+
+    Returns:
+      a dict with 'hits', 'misses', 'bytes_saved', 'entries' and 'size' keys.
+    """
+    values = [0, 0, 0]
+    stats_filename = os.path.join(self._cache_dir, _STATS_FILENAME)
+    if os.path.exists(stats_filename):
+      values = [int(v) for v in open(stats_filename).read().split()] or values
+    entries = self.GetEntries()
+    return {'hits': values[0],
+            'misses': values[1],
+            'bytes_saved': values[2],
+            'entries': len(entries),
+            'size': sum([size for (unused_time, size, unused_dir) in entries])}
+
+
+def main():
+  pass
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,108 @@
+#!/usr/bin/python2.4
+#
+# Copyright 2009 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test for output_cache."""
+
+import os
+import shutil
+import tempfile
+import unittest
+import output_cache
+
+
+class OutputCacheUnitTest(unittest.TestCase):
+  def setUp(self):
+    self.temp_dir = tempfile.mkdtemp()
+    self.cache_dir = os.path.join(self.temp_dir, 'cache')
+    self.output_dir = os.path.join(self.temp_dir, 'output')
+    os.makedirs(self.output_dir)
+    self.cache = output_cache.OutputCache(self.cache_dir, 1000)
+
+  def tearDown(self):
+    shutil.rmtree(self.temp_dir)
+
+  def WriteOutput(self, name, content):
+    f = open(os.path.join(self.output_dir, name), 'w')
+    f.write(content)
+    f.close()
+
+  def ReadOutput(self, name):
+    return open(os.path.join(self.output_dir, name)).read()
+
+  def testLookupMiss(self):
+    self.assertFalse(self.cache.Lookup('key', self.output_dir))
+    stats = self.cache.GetStats()
+    self.assertEquals(stats['hits'], 0)
+    self.assertEquals(stats['misses'], 1)
+
+  def testStoreAndLookup(self):
+    self.WriteOutput('a.cc', 'a')
+    self.WriteOutput('a.h', 'aa')
+    self.cache.Store('key', self.output_dir, ['a.cc', 'a.h'])
+    os.remove(os.path.join(self.output_dir, 'a.cc'))
+    self.WriteOutput('a.h', 'stale')
+    self.assertTrue(self.cache.Lookup('key', self.output_dir))
+    self.assertEquals(self.ReadOutput('a.cc'), 'a')
+    self.assertEquals(self.ReadOutput('a.h'), 'aa')
+    stats = self.cache.GetStats()
+    self.assertEquals(stats['hits'], 1)
+    self.assertEquals(stats['bytes_saved'], 3)
+    self.assertEquals(stats['entries'], 1)
+    self.assertEquals(stats['size'], 3)
+
+  def testLookupCopiesFiles(self):
+    self.WriteOutput('a.cc', 'a')
+    self.cache.Store('key', self.output_dir, ['a.cc'])
+    entry_file = os.path.join(self.cache_dir, 'entry-key', 'a.cc')
+    os.utime(entry_file, (1000, 1000))
+    os.remove(os.path.join(self.output_dir, 'a.cc'))
+    self.assertTrue(self.cache.Lookup('key', self.output_dir))
+    # the output is newer than its inputs, even though the entry is old.
+    self.assertTrue(
+        os.path.getmtime(os.path.join(self.output_dir, 'a.cc')) > 1000)
+    # editing the output in place leaves the entry intact.
+    self.WriteOutput('a.cc', 'edited')
+    self.assertEquals(open(entry_file).read(), 'a')
+
+  def testMetadata(self):
+    self.WriteOutput('a.cc', 'a')
+    self.cache.Store('plain', self.output_dir, ['a.cc'])
+    self.cache.Store('key', self.output_dir, ['a.cc'], 'deps')
+    self.assertEquals(self.cache.GetMetadata('plain'), None)
+    self.assertEquals(self.cache.GetMetadata('missing'), None)
+    self.assertEquals(self.cache.GetMetadata('key'), 'deps')
+    # the metadata is not materialized.
+    self.assertTrue(self.cache.Lookup('key', self.output_dir))
+    self.assertEquals(os.listdir(self.output_dir), ['a.cc'])
+    self.assertEquals(self.cache.GetStats()['bytes_saved'], 1)
+
+  def testEvictLeastRecentlyUsed(self):
+    self.WriteOutput('a.cc', 'x' * 400)
+    self.cache.Store('first', self.output_dir, ['a.cc'])
+    self.cache.Store('second', self.output_dir, ['a.cc'])
+    # make sure the entries get distinct use times.
+    os.utime(os.path.join(self.cache_dir, 'entry-first'), (1000, 1000))
+    os.utime(os.path.join(self.cache_dir, 'entry-second'), (2000, 2000))
+    self.assertTrue(self.cache.Lookup('first', self.output_dir))
+    self.cache.Store('third', self.output_dir, ['a.cc'])
+    self.assertEquals(self.cache.GetStats()['entries'], 2)
+    self.assertTrue(self.cache.Lookup('first', self.output_dir))
+    self.assertTrue(self.cache.Lookup('third', self.output_dir))
+    self.assertFalse(self.cache.Lookup('second', self.output_dir))
+
+
+if __name__ == '__main__':
+  unittest.main()
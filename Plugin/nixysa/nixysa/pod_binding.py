@@ -29,6 +29,16 @@ void SetValues(int value, const string &name);
 float GetValue();
 string GetString();
 
+Two string types avoid the copies of the characters for large strings: a
+'StringView' parameter is passed as a view over the characters of the
+NPVariant argument, valid for the duration of the call, and a 'StringBuffer'
+return value hands the memory it allocated with NPN_MemAlloc over to the
+browser. A 'StringView' can't be returned (from a function or a callback) nor
+stored (in an array or a field), and a 'StringBuffer' can only be returned.
+For example:
+int CountLines(StringView text);
+StringBuffer GetLinks();
+
 For JS bindings, they are directly represented by variants.
 """
 
@@ -41,6 +51,8 @@ import java_utils
 CPP_POD_TO_JSDOC_TYPES = {
   'int': 'number',
   'std.string' : 'string',
+  'StringView' : 'string',
+  'StringBuffer' : 'string',
   'bool' : 'boolean',
   'float' : 'number',
   'double' : 'number',
@@ -59,6 +71,15 @@ class BadVoidUsage(Exception):
   pass
 
 
+class BadStringUsage(Exception):
+  """Raised when 'StringView' or 'StringBuffer' is used where it can't be.
+
+  A 'StringView' can't be returned nor stored in an array or a field, and a
+  'StringBuffer' can only be a return value.
+  """
+  pass
+
+
 class UnknownPODType(Exception):
   """Raised when an unknown POD type is used."""
 
@@ -118,9 +139,13 @@ def CppMemberString(scope, type_defn):
 
   Raises:
     BadVoidUsage: type_defn is a 'void' POD type.
+    BadStringUsage: type_defn is a 'StringView' or 'StringBuffer' POD type.
   """
-  if type_defn.GetFinalType().podtype == 'void':
+  podtype = type_defn.GetFinalType().podtype
+  if podtype == 'void':
     raise BadVoidUsage
+  elif podtype in ['string_view', 'string_buffer']:
+    raise BadStringUsage
   return cpp_utils.GetScopedName(scope, type_defn), True
 
 
@@ -135,7 +160,15 @@ def CppReturnValueString(scope, type_defn):
     a (string, boolean) pair, the first element being the representation of
     the type, the second element indicating whether or not the definition of
     the type is needed for the expression to be valid.
+
+  Raises:
+    BadStringUsage: type_defn is a 'StringView' POD type.
   """
+  if type_defn.GetFinalType().podtype == 'string_view':
+    # the characters would point into a NPVariant released by the glue, or
+    # into a temporary of the native function.
+    raise BadStringUsage('a StringView can\'t be returned, use std::string or'
+                         ' StringBuffer instead')
   return cpp_utils.GetScopedName(scope, type_defn), True
 
 
@@ -153,10 +186,13 @@ def CppParameterString(scope, type_defn):
 
   Raises:
     BadVoidUsage: type_defn is a 'void' POD type.
+    BadStringUsage: type_defn is a 'StringBuffer' POD type.
   """
   final_type = type_defn.GetFinalType()
   if final_type.podtype == 'void':
     raise BadVoidUsage
+  elif final_type.podtype == 'string_buffer':
+    raise BadStringUsage
   elif final_type.podtype == 'string' or final_type.podtype == 'wstring':
     return 'const %s&' % cpp_utils.GetScopedName(scope, type_defn), True
   else:
@@ -523,6 +559,7 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
 
   Raises:
     BadVoidUsage: type_defn is a 'void' POD type.
+    BadStringUsage: type_defn is a 'StringBuffer' POD type.
     UnknownPODType: type_defn is not a known POD type.
   """
   npp = npp  # silence gpylint.
@@ -553,13 +590,16 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
     return text, variable
   elif final_type.podtype == 'variant':
     return '%s %s(npp, %s);' % (type_name, variable, input_expr), variable
-  elif final_type.podtype == 'string':
+  elif final_type.podtype in ['string', 'string_view']:
+    # a StringView points into the NPVariant, which outlives the call.
     text = _string_from_npvariant_template.substitute(type=type_name,
                                                       input=input_expr,
                                                       variable=variable,
                                                       success=success,
                                                       context=exception_context)
     return text, variable
+  elif final_type.podtype == 'string_buffer':
+    raise BadStringUsage
   elif final_type.podtype == 'wstring':
     text = _wstring_from_npvariant_template.substitute(type=type_name,
                                                        input=input_expr,
@@ -571,6 +611,48 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
     raise UnknownPODType(final_type.podtype)
 
 
+def NpapiVariantTypes(scope, type_defn):
+  """Gets the NPVariant types a POD value is converted from.
+
+  This function is used to resolve overloads on the types of the arguments,
+  without trying each conversion in turn.
+
+  Args:
+    scope: a Definition for the scope in which the glue will be written.
+    type_defn: a Definition, representing the type of the value.
+
+  Returns:
+    a (list, bool) pair, the list containing the NPVariant types (among 'void',
+    'null', 'bool', 'int32', 'double', 'string' and 'object') NpapiFromNPVariant
+    accepts, and the bool being True if the conversion of a NPVariant of one of
+    these types never fails.
+
+  Raises:
+    BadVoidUsage: type_defn is a 'void' POD type.
+    BadStringUsage: type_defn is a 'StringBuffer' POD type.
+    UnknownPODType: type_defn is not a known POD type.
+  """
+  scope = scope  # silence gpylint.
+  final_type = type_defn.GetFinalType()
+  if final_type.podtype == 'void':
+    raise BadVoidUsage
+  elif final_type.podtype == 'string_buffer':
+    raise BadStringUsage
+  elif final_type.podtype in ['int', 'float']:
+    return ['int32', 'double'], True
+  elif final_type.podtype == 'bool':
+    return ['bool'], True
+  elif final_type.podtype == 'variant':
+    return ['void', 'null', 'bool', 'int32', 'double', 'string', 'object'], True
+  elif final_type.podtype in ['string', 'string_view']:
+    return ['string'], True
+  elif final_type.podtype == 'wstring':
+    # the unicode conversion can fail.
+    return ['string'], False
+  else:
+    raise UnknownPODType(final_type.podtype)
+
+
 def NpapiExprToNPVariant(scope, type_defn, variable, expression, output,
                          success, npp):
   """Gets the string to store a value into a NPVariant.
@@ -626,6 +708,17 @@ def NpapiExprToNPVariant(scope, type_defn, variable, expression, output,
             'GLUE_PROFILE_STOP(npp, "StringToNPVariant");'
             % (success, expression, output),
             '')
+  elif final_type.podtype == 'string_view':
+    return ('GLUE_PROFILE_START(npp, "StringViewToNPVariant");\n'
+            '%s = StringViewToNPVariant(%s, %s);\n'
+            'GLUE_PROFILE_STOP(npp, "StringViewToNPVariant");'
+            % (success, expression, output),
+            '')
+  elif final_type.podtype == 'string_buffer':
+    # hands the characters over, without a copy.
+    return ('%s = StringBufferToNPVariant(%s, %s);' %
+            (success, expression, output),
+            '')
   elif final_type.podtype == 'wstring':
     return ('GLUE_PROFILE_START(npp, "String16ToNPVariant");\n'
             '%s = String16ToNPVariant(%s, %s);\n'
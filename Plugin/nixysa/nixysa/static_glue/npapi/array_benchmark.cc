@@ -0,0 +1,250 @@
+// Copyright 2009 Google Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Compares the ways the glue can return an array of 10000 ints to JavaScript:
+// one NPN_Invoke of 'push' per element (what the glue used to do), one
+// NPN_SetProperty per element with the cached index identifiers
+// (SetNPArrayProperty, used for arrays of objects and strings), and a single
+// NPN_Evaluate of an array literal (used for arrays of numbers and booleans).
+//
+// A minimal fake browser stands for the real one: it counts the browser calls,
+// which are the expensive part in a real browser, especially when the plugin
+// runs out of process.
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <map>
+#include <string>
+#include <vector>
+#include "common.h"
+#include "npn_api.h"
+
+namespace {
+
+const int kElementCount = 10000;
+const int kRunCount = 100;
+
+int g_browser_calls = 0;
+std::map<std::string, std::string *> g_identifiers;
+
+NPIdentifier GetStringIdentifier(const NPUTF8 *name) {
+  ++g_browser_calls;
+  std::string *&identifier = g_identifiers[name];
+  if (!identifier)
+    identifier = new std::string(name);
+  return identifier;
+}
+
+void GetStringIdentifiers(const NPUTF8 **names, int32_t count,
+                          NPIdentifier *identifiers) {
+  ++g_browser_calls;
+  for (int32_t i = 0; i < count; ++i) {
+    std::string *&identifier = g_identifiers[names[i]];
+    if (!identifier)
+      identifier = new std::string(names[i]);
+    identifiers[i] = identifier;
+  }
+}
+
+// A JavaScript array, which only holds int32 values.
+struct FakeArray : public NPObject {
+  std::vector<NPVariant> values;
+};
+
+NPObject *AllocateArray(NPP npp, NPClass *np_class) {
+  return new FakeArray;
+}
+
+void DeallocateArray(NPObject *object) {
+  delete static_cast<FakeArray *>(object);
+}
+
+bool InvokeArray(NPObject *object, NPIdentifier name, const NPVariant *args,
+                 uint32_t arg_count, NPVariant *result) {
+  if (*static_cast<std::string *>(name) != "push") return false;
+  FakeArray *array = static_cast<FakeArray *>(object);
+  array->values.insert(array->values.end(), args, args + arg_count);
+  INT32_TO_NPVARIANT(static_cast<int32_t>(array->values.size()), *result);
+  return true;
+}
+
+bool SetArrayProperty(NPObject *object, NPIdentifier name,
+                      const NPVariant *value) {
+  FakeArray *array = static_cast<FakeArray *>(object);
+  size_t index = atoi(static_cast<std::string *>(name)->c_str());
+  if (index >= array->values.size())
+    array->values.resize(index + 1);
+  array->values[index] = *value;
+  return true;
+}
+
+NPClass array_class = {
+  NP_CLASS_STRUCT_VERSION,
+  AllocateArray,
+  DeallocateArray,
+  0,
+  0,
+  InvokeArray,
+  0,
+  0,
+  0,
+  SetArrayProperty,
+  0,
+  0,
+};
+
+FakeArray window;
+
+NPError GetValue(NPP npp, NPNVariable variable, void *value) {
+  ++g_browser_calls;
+  if (variable != NPNVWindowNPObject) return NPERR_GENERIC_ERROR;
+  *static_cast<NPObject **>(value) = &window;
+  return NPERR_NO_ERROR;
+}
+
+bool Evaluate(NPP npp, NPObject *object, NPString *script, NPVariant *result) {
+  ++g_browser_calls;
+  FakeArray *array = static_cast<FakeArray *>(AllocateArray(npp,
+                                                            &array_class));
+  array->_class = &array_class;
+  array->referenceCount = 1;
+  std::string text(script->UTF8Characters, script->UTF8Length);
+  const char *position = text.c_str() + 1;
+  while (*position && *position != ']') {
+    char *end;
+    NPVariant value;
+    INT32_TO_NPVARIANT(static_cast<int32_t>(strtol(position, &end, 10)),
+                       value);
+    array->values.push_back(value);
+    position = *end == ',' ? end + 1 : end;
+  }
+  OBJECT_TO_NPVARIANT(array, *result);
+  return true;
+}
+
+bool Invoke(NPP npp, NPObject *object, NPIdentifier name,
+            const NPVariant *args, uint32_t arg_count, NPVariant *result) {
+  ++g_browser_calls;
+  return object->_class->invoke(object, name, args, arg_count, result);
+}
+
+bool SetProperty(NPP npp, NPObject *object, NPIdentifier name,
+                 const NPVariant *value) {
+  ++g_browser_calls;
+  return object->_class->setProperty(object, name, value);
+}
+
+NPObject *RetainObject(NPObject *object) {
+  ++object->referenceCount;
+  return object;
+}
+
+void ReleaseObject(NPObject *object) {
+  if (object != &window && --object->referenceCount == 0)
+    object->_class->deallocate(object);
+}
+
+void ReleaseVariantValue(NPVariant *variant) {
+  if (NPVARIANT_IS_OBJECT(*variant))
+    ReleaseObject(NPVARIANT_TO_OBJECT(*variant));
+  VOID_TO_NPVARIANT(*variant);
+}
+
+// What the glue used to do.
+NPObject *PushElements(NPP npp, const std::vector<int> &values) {
+  NPObject *array = CreateArray(npp);
+  NPIdentifier identifier = NPN_GetStringIdentifier("push");
+  for (size_t i = 0; i < values.size(); ++i) {
+    NPVariant value;
+    INT32_TO_NPVARIANT(values[i], value);
+    NPVariant result;
+    NPN_Invoke(npp, array, identifier, &value, 1, &result);
+    NPN_ReleaseVariantValue(&value);
+    NPN_ReleaseVariantValue(&result);
+  }
+  return array;
+}
+
+NPObject *SetElements(NPP npp, const std::vector<int> &values) {
+  NPObject *array = CreateArray(npp);
+  for (size_t i = 0; i < values.size(); ++i) {
+    NPVariant value;
+    INT32_TO_NPVARIANT(values[i], value);
+    SetNPArrayProperty(npp, array, static_cast<int>(i), &value);
+    NPN_ReleaseVariantValue(&value);
+  }
+  return array;
+}
+
+NPObject *EvaluateLiteral(NPP npp, const std::vector<int> &values) {
+  std::string literal("[");
+  for (size_t i = 0; i < values.size(); ++i) {
+    if (i) literal += ',';
+    AppendArrayLiteralValue(static_cast<int32_t>(values[i]), &literal);
+  }
+  literal += ']';
+  return EvaluateArrayLiteral(npp, literal);
+}
+
+void RunBenchmark(const char *name,
+                  NPObject *(*create)(NPP npp, const std::vector<int> &values),
+                  NPP npp, const std::vector<int> &values) {
+  g_browser_calls = 0;
+  clock_t start = clock();
+  for (int i = 0; i < kRunCount; ++i) {
+    NPObject *array = create(npp, values);
+    if (static_cast<FakeArray *>(array)->values.size() != values.size())
+      fprintf(stderr, "%s: wrong array size\n", name);
+    NPN_ReleaseObject(array);
+  }
+  double microseconds = (clock() - start) * 1e6 / CLOCKS_PER_SEC / kRunCount;
+  printf("%-20s %10.1f us %10.1f browser calls per array\n", name,
+         microseconds, static_cast<double>(g_browser_calls) / kRunCount);
+}
+
+}  // anonymous namespace
+
+int main(int argc, char **argv) {
+  NPNetscapeFuncs browser_functions;
+  memset(&browser_functions, 0, sizeof(browser_functions));
+  browser_functions.size = sizeof(browser_functions);
+  browser_functions.version =
+      (NP_VERSION_MAJOR << 8) | NPVERS_HAS_NPRUNTIME_SCRIPTING;
+  browser_functions.getvalue = GetValue;
+  browser_functions.evaluate = Evaluate;
+  browser_functions.getstringidentifier = GetStringIdentifier;
+  browser_functions.getstringidentifiers = GetStringIdentifiers;
+  browser_functions.invoke = Invoke;
+  browser_functions.setproperty = SetProperty;
+  browser_functions.retainobject = RetainObject;
+  browser_functions.releaseobject = ReleaseObject;
+  browser_functions.releasevariantvalue = ReleaseVariantValue;
+  if (InitializeNPNApi(&browser_functions) != NPERR_NO_ERROR) {
+    fprintf(stderr, "InitializeNPNApi failed\n");
+    return 1;
+  }
+  window._class = &array_class;
+  window.referenceCount = 1;
+
+  std::vector<int> values(kElementCount);
+  for (int i = 0; i < kElementCount; ++i)
+    values[i] = i * 37 - kElementCount;
+  NPP_t instance;
+  RunBenchmark("push", PushElements, &instance, values);
+  RunBenchmark("set property", SetElements, &instance, values);
+  RunBenchmark("array literal", EvaluateLiteral, &instance, values);
+  return 0;
+}
@@ -13,6 +13,9 @@
 // limitations under the License.
 
 #include <assert.h>
+#include <ctype.h>
+#include <float.h>
+#include <limits.h>
 #include <string.h>
 
 #ifdef OS_WINDOWS
@@ -21,160 +24,95 @@
 #define snprintf _snprintf
 #endif
 
-#ifdef OS_MACOSX
-#include <Carbon/Carbon.h>
-#endif
-
 #ifdef OS_LINUX
 #include <stdio.h>
 #endif
 
 #include <npapi.h>
 #include <npruntime.h>
+#include <algorithm>
+#include <functional>
 #include <string>
 #include "common.h"
 #include "npn_api.h"
 
-//------------------------------------------------------------------------------
-// UTF8ToString16
-//------------------------------------------------------------------------------
-bool UTF8ToString16(const char *in, int len, std::wstring *out16) {
-  assert(in);
-  assert(len >= 0);
-  assert(out16);
-
-  if (len == 0) {
-    *out16 = L"";
-    return true;
+bool String16ToNPVariant(const std::wstring &in, NPVariant *variant) {
+  // encodes straight into the characters of the variant.
+  int length = GetUTF8Length(in.data(), static_cast<int>(in.size()));
+  NPUTF8 *chars = NULL;
+  if (length >= 0)
+    chars = static_cast<NPUTF8 *>(NPN_MemAlloc(length));
+  if (!chars) {
+    VOID_TO_NPVARIANT(*variant);
+    return false;
   }
+  EncodeUTF8(in.data(), static_cast<int>(in.size()), chars);
+  STRINGN_TO_NPVARIANT(chars, length, *variant);
+  return true;
+}
 
-#ifdef OS_MACOSX
-  CFStringRef cfStr = CFStringCreateWithCString(kCFAllocatorDefault, in,
-                                                kCFStringEncodingUTF8);
-  if (!cfStr)
-    return false;
-  CFDataRef cfData = CFStringCreateExternalRepresentation(kCFAllocatorDefault,
-                                              cfStr, kCFStringEncodingUTF32, 0);
-  CFRelease(cfStr);
-  if (!cfData)
-    return false;
-  int out_byte_len = CFDataGetLength(cfData);
-  out_byte_len -= sizeof(wchar_t); // don't count the 32 bit BOM char at start
-  int out_len = out_byte_len / sizeof(wchar_t);
-  wchar_t *tmp = new wchar_t[out_len + 1];
-  // start after the BOM, hence sizeof(wchar_t)
-  CFDataGetBytes(cfData, CFRangeMake(sizeof(wchar_t), out_byte_len),
-                 (UInt8*)tmp);
-  CFRelease(cfData);
-  tmp[out_len] = 0;
-  out16->assign(tmp);
-  delete[] tmp;
-#endif
+bool StringToNPVariant(const std::string &in, NPVariant *variant) {
+  return StringViewToNPVariant(StringView(in), variant);
+}
 
-#ifdef OS_WINDOWS
-  int out_len = MultiByteToWideChar(CP_UTF8, 0, in, len, NULL, 0);
-  if (out_len <= 0)
-    return false;
-  wchar_t *tmp = new wchar_t[out_len + 1];
-  out_len = MultiByteToWideChar(CP_UTF8, 0, in, len, tmp, out_len);
-  if (out_len <= 0) {
-    delete[] tmp;
+bool StringViewToNPVariant(const StringView &in, NPVariant *variant) {
+  size_t length = in.size();
+  NPUTF8 *chars = static_cast<NPUTF8 *>(NPN_MemAlloc(length));
+  if (!chars) {
+    VOID_TO_NPVARIANT(*variant);
     return false;
   }
-  tmp[out_len] = 0;
-  out16->assign(tmp);
-  delete[] tmp;
-#endif
-
-#ifdef OS_LINUX
-  // TODO: this is incorrect. Fix it.
-  std::string string_in(in, len);
-  *out16 = std::wstring(string_in.begin(), string_in.end());
-#endif
+  memcpy(chars, in.data(), length);
+  STRINGN_TO_NPVARIANT(chars, length, *variant);
   return true;
 }
 
-//------------------------------------------------------------------------------
-// String16ToUTF8
-//------------------------------------------------------------------------------
-bool String16ToUTF8(const wchar_t *in, int len, std::string *out8) {
-  assert(in);
-  assert(len >= 0);
-  assert(out8);
-
-  if (len == 0) {
-    *out8 = "";
-    return true;
-  }
-
-#ifdef OS_MACOSX
-  CFDataRef cfWCharData = CFDataCreate(kCFAllocatorDefault, (const UInt8*)in,
-                                       len * sizeof(wchar_t));
-  CFStringRef cfStr = CFStringCreateFromExternalRepresentation(
-                                              kCFAllocatorDefault, cfWCharData,
-                                              kCFStringEncodingUTF32);
-  CFRelease(cfWCharData);
-  CFDataRef cfUTF8Data = CFStringCreateExternalRepresentation(
-                                               kCFAllocatorDefault,
-                                               cfStr, kCFStringEncodingUTF8, 0);
-  CFRelease(cfStr);
-  int out_len = CFDataGetLength(cfUTF8Data);
-  char *tmp = new char[out_len + 1];
-  CFDataGetBytes(cfUTF8Data, CFRangeMake(0, out_len), (UInt8*)tmp);
-  tmp[out_len] = '\0';
-  CFRelease(cfUTF8Data);
-  if (out_len <= 0) {
-    delete[] tmp;
-    return false;
-  }
-  tmp[out_len] = 0;
-  out8->assign(tmp);
-  delete[] tmp;
-#endif
+StringBuffer::StringBuffer(const StringBuffer &other)
+    : data_(other.data_), size_(other.size_) {
+  other.Release();
+}
 
-#ifdef OS_WINDOWS
-  int out_len = WideCharToMultiByte(CP_UTF8, 0, in, len, NULL, 0, NULL, NULL);
-  if (out_len <= 0)
-    return false;
-  char *tmp = new char[out_len + 1];
-  out_len = WideCharToMultiByte(CP_UTF8, 0, in, len, tmp, out_len,
-                                NULL, NULL);
-  if (out_len <= 0) {
-    delete[] tmp;
-    return false;
+StringBuffer::~StringBuffer() {
+  if (data_)
+    NPN_MemFree(data_);
+}
+
+StringBuffer &StringBuffer::operator=(const StringBuffer &other) {
+  if (&other != this) {
+    if (data_)
+      NPN_MemFree(data_);
+    size_ = other.size_;
+    data_ = other.Release();
   }
-  tmp[out_len] = 0;
-  out8->assign(tmp);
-  delete[] tmp;
-#endif
+  return *this;
+}
 
-#ifdef OS_LINUX
-  // TODO: this is incorrect. Fix it.
-  std::wstring string_in(in, len);
-  *out8 = std::string(string_in.begin(), string_in.end());
-#endif
+bool StringBuffer::Allocate(size_t size) {
+  if (data_)
+    NPN_MemFree(data_);
+  data_ = NULL;
+  size_ = 0;
+  if (size == 0) return true;
+  data_ = static_cast<NPUTF8 *>(NPN_MemAlloc(size));
+  if (!data_) return false;
+  size_ = size;
   return true;
 }
 
-bool String16ToNPVariant(const std::wstring &in, NPVariant *variant) {
-  std::string out8;
-  bool r = String16ToUTF8(in.c_str(), in.size(), &out8);
-  if (!r) {
-    VOID_TO_NPVARIANT(*variant);
-    return false;
-  }
-  return StringToNPVariant(out8, variant);
+NPUTF8 *StringBuffer::Release() const {
+  NPUTF8 *data = data_;
+  data_ = NULL;
+  size_ = 0;
+  return data;
 }
 
-bool StringToNPVariant(const std::string &in, NPVariant *variant) {
-  size_t length = in.size();
-  NPUTF8 *chars = static_cast<NPUTF8 *>(NPN_MemAlloc(length));
-  if (!chars) {
-    VOID_TO_NPVARIANT(*variant);
-    return false;
+bool StringBufferToNPVariant(const StringBuffer &in, NPVariant *variant) {
+  if (!in.data()) {
+    // nothing was allocated: this is an empty string.
+    return StringViewToNPVariant(StringView(), variant);
   }
-  memcpy(chars, in.c_str(), length);
-  STRINGN_TO_NPVARIANT(chars, length, *variant);
+  uint32_t length = static_cast<uint32_t>(in.size());
+  STRINGN_TO_NPVARIANT(in.Release(), length, *variant);
   return true;
 }
 
@@ -247,17 +185,57 @@ static void PrivateIntToDecimal(int int_in, char *string_out) {
 }
 
 
-bool GetNPArrayProperty(NPP npp, NPObject *object, int index,
-                        NPVariant *output) {
+// The cache of the array index identifiers is grown by at least that many
+// identifiers at a time.
+static const int kMinArrayIndexIdentifierCount = 64;
+
+// The identifiers of the array indices.
+static std::vector<NPIdentifier> array_index_identifiers;
+
+// The identifier of the length of the arrays.
+static NPIdentifier array_length_identifier = NULL;
+
+NPIdentifier GetArrayIndexIdentifier(NPP npp, int index) {
   // Some newer versions of Safari crash or fail when accessing array elements
   // with an int identifer rather than a string identifier,
   // ie Safari wants "2" not 2.
   // As all browsers accept the string version, just use that.
-  char num_str[32];
-  PrivateIntToDecimal(index, num_str);
-  GLUE_PROFILE_START(npp, "NPN_GetStringIdentifier");
-  NPIdentifier string_identifier = NPN_GetStringIdentifier(num_str);
-  GLUE_PROFILE_STOP(npp, "NPN_GetStringIdentifier");
+  if (index < 0) {
+    char num_str[32];
+    PrivateIntToDecimal(index, num_str);
+    GLUE_PROFILE_START(npp, "NPN_GetStringIdentifier");
+    NPIdentifier string_identifier = NPN_GetStringIdentifier(num_str);
+    GLUE_PROFILE_STOP(npp, "NPN_GetStringIdentifier");
+    return string_identifier;
+  }
+  int first = static_cast<int>(array_index_identifiers.size());
+  if (index >= first) {
+    // double the cache, so that filling an array takes a logarithmic number of
+    // NPN_GetStringIdentifiers calls.
+    int count = std::max(index + 1,
+                         first + std::max(first,
+                                          kMinArrayIndexIdentifierCount));
+    // an int has at most 10 digits, plus the terminal NUL.
+    std::vector<char> buffer((count - first) * 11);
+    std::vector<const NPUTF8 *> names(count - first);
+    char *name = &buffer[0];
+    for (int i = first; i < count; ++i) {
+      PrivateIntToDecimal(i, name);
+      names[i - first] = name;
+      name += strlen(name) + 1;
+    }
+    array_index_identifiers.resize(count);
+    GLUE_PROFILE_START(npp, "NPN_GetStringIdentifiers");
+    NPN_GetStringIdentifiers(&names[0], count - first,
+                             &array_index_identifiers[first]);
+    GLUE_PROFILE_STOP(npp, "NPN_GetStringIdentifiers");
+  }
+  return array_index_identifiers[index];
+}
+
+bool GetNPArrayProperty(NPP npp, NPObject *object, int index,
+                        NPVariant *output) {
+  NPIdentifier string_identifier = GetArrayIndexIdentifier(npp, index);
   // Old versions of Safari don't implement NPN_HasProperty, the work-around is
   // too slow for big arrays, so don't check for the existence of int properties
   // - the user may get unexpected error messages, but what can we do.
@@ -273,22 +251,173 @@ bool GetNPArrayProperty(NPP npp, NPObject *object, int index,
   return result;
 }
 
+bool GetNPArrayElement(NPP npp, NPObject *object, int index,
+                       NPVariant *output) {
+  NPIdentifier identifier = GetArrayIndexIdentifier(npp, index);
+  GLUE_PROFILE_START(npp, "NPN_GetProperty");
+  bool result = NPN_GetProperty(npp, object, identifier, output);
+  GLUE_PROFILE_STOP(npp, "NPN_GetProperty");
+  return result;
+}
+
+bool GetNPArrayLength(NPP npp, NPObject *object, int *length) {
+  if (!array_length_identifier) {
+    GLUE_PROFILE_START(npp, "NPN_GetStringIdentifier");
+    array_length_identifier = NPN_GetStringIdentifier("length");
+    GLUE_PROFILE_STOP(npp, "NPN_GetStringIdentifier");
+  }
+  NPVariant value;
+  GLUE_PROFILE_START(npp, "NPN_GetProperty");
+  bool result = NPN_GetProperty(npp, object, array_length_identifier, &value);
+  GLUE_PROFILE_STOP(npp, "NPN_GetProperty");
+  if (!result) return false;
+  if (!NPVARIANT_IS_NUMBER(value)) {
+    NPN_ReleaseVariantValue(&value);
+    return false;
+  }
+  double number = NPVARIANT_TO_NUMBER(value);
+  if (!(number >= 0 && number <= INT_MAX)) return false;
+  *length = static_cast<int>(number);
+  return true;
+}
+
+bool SetNPArrayProperty(NPP npp, NPObject *object, int index,
+                        const NPVariant *value) {
+  NPIdentifier identifier = GetArrayIndexIdentifier(npp, index);
+  GLUE_PROFILE_START(npp, "NPN_SetProperty");
+  bool result = NPN_SetProperty(npp, object, identifier, value);
+  GLUE_PROFILE_STOP(npp, "NPN_SetProperty");
+  return result;
+}
+
+static const char kBase64Alphabet[] =
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/";
+
+// Gets the value of a base64 digit, or -1 if it isn't one.
+static int Base64DigitValue(char digit) {
+  if (digit >= 'A' && digit <= 'Z') return digit - 'A';
+  if (digit >= 'a' && digit <= 'z') return digit - 'a' + 26;
+  if (digit >= '0' && digit <= '9') return digit - '0' + 52;
+  if (digit == '+') return 62;
+  if (digit == '/') return 63;
+  return -1;
+}
+
+static bool IsLittleEndian() {
+  const unsigned short one = 1;
+  return *reinterpret_cast<const unsigned char *>(&one) == 1;
+}
+
+// Swaps the bytes of count values of value_size bytes.
+static void SwapValueBytes(unsigned char *values, size_t count,
+                           size_t value_size) {
+  for (size_t i = 0; i < count; ++i, values += value_size)
+    std::reverse(values, values + value_size);
+}
+
+int GetBase64DecodedSize(const NPString &string) {
+  size_t length = string.UTF8Length;
+  if (length % 4 != 0) return -1;
+  if (length == 0) return 0;
+  const NPUTF8 *end = string.UTF8Characters + length;
+  int padding = end[-1] == '=' ? (end[-2] == '=' ? 2 : 1) : 0;
+  return static_cast<int>(length / 4 * 3 - padding);
+}
+
+bool DecodePackedValues(const NPString &string, size_t value_size,
+                        void *output) {
+  const NPUTF8 *input = string.UTF8Characters;
+  unsigned char *bytes = static_cast<unsigned char *>(output);
+  size_t size = GetBase64DecodedSize(string);
+  // decode the groups of 4 digits into 3 bytes, but the last group, which may
+  // be padded.
+  size_t full_groups = (size / 3);
+  for (size_t i = 0; i < full_groups; ++i, input += 4, bytes += 3) {
+    int a = Base64DigitValue(input[0]);
+    int b = Base64DigitValue(input[1]);
+    int c = Base64DigitValue(input[2]);
+    int d = Base64DigitValue(input[3]);
+    if ((a | b | c | d) < 0) return false;
+    int group = (a << 18) | (b << 12) | (c << 6) | d;
+    bytes[0] = static_cast<unsigned char>(group >> 16);
+    bytes[1] = static_cast<unsigned char>(group >> 8);
+    bytes[2] = static_cast<unsigned char>(group);
+  }
+  size_t remainder = size - full_groups * 3;
+  if (remainder) {
+    int a = Base64DigitValue(input[0]);
+    int b = Base64DigitValue(input[1]);
+    int c = remainder == 2 ? Base64DigitValue(input[2]) : 0;
+    if ((a | b | c) < 0) return false;
+    int group = (a << 18) | (b << 12) | (c << 6);
+    bytes[0] = static_cast<unsigned char>(group >> 16);
+    if (remainder == 2)
+      bytes[1] = static_cast<unsigned char>(group >> 8);
+  }
+  if (!IsLittleEndian())
+    SwapValueBytes(static_cast<unsigned char *>(output), size / value_size,
+                   value_size);
+  return true;
+}
+
+bool EncodePackedValues(const void *values, size_t count, size_t value_size,
+                        NPVariant *variant) {
+  size_t size = count * value_size;
+  const unsigned char *bytes = static_cast<const unsigned char *>(values);
+  std::vector<unsigned char> swapped;
+  if (size && !IsLittleEndian()) {
+    swapped.assign(bytes, bytes + size);
+    SwapValueBytes(&swapped[0], count, value_size);
+    bytes = &swapped[0];
+  }
+  size_t length = (size + 2) / 3 * 4;
+  NPUTF8 *chars = static_cast<NPUTF8 *>(NPN_MemAlloc(length));
+  if (!chars && length) {
+    VOID_TO_NPVARIANT(*variant);
+    return false;
+  }
+  NPUTF8 *output = chars;
+  size_t i = 0;
+  for (; i + 3 <= size; i += 3, output += 4) {
+    int group = (bytes[i] << 16) | (bytes[i + 1] << 8) | bytes[i + 2];
+    output[0] = kBase64Alphabet[group >> 18];
+    output[1] = kBase64Alphabet[(group >> 12) & 63];
+    output[2] = kBase64Alphabet[(group >> 6) & 63];
+    output[3] = kBase64Alphabet[group & 63];
+  }
+  if (i < size) {
+    int group = bytes[i] << 16;
+    if (i + 1 < size) group |= bytes[i + 1] << 8;
+    output[0] = kBase64Alphabet[group >> 18];
+    output[1] = kBase64Alphabet[(group >> 12) & 63];
+    output[2] = i + 1 < size ? kBase64Alphabet[(group >> 6) & 63] : '=';
+    output[3] = '=';
+  }
+  STRINGN_TO_NPVARIANT(chars, static_cast<uint32_t>(length), *variant);
+  return true;
+}
+
 NPObject *CreateArray(NPP npp) {
-  // Evaluate '[]' in JavaScript, which will create a new array.
+  return EvaluateArrayLiteral(npp, "[]");
+}
+
+NPObject *EvaluateArrayLiteral(NPP npp, const std::string &literal) {
+  // Evaluate the literal in JavaScript, which will create a new array.
   // We need to retrieve the 'global context' too execute into, that's what
   // global_object is.
   NPObject *global_object;
-  GLUE_PROFILE_START(npp, "CreateArray");
   GLUE_PROFILE_START(npp, "getvalue");
-  NPN_GetValue(npp, NPNVWindowNPObject, &global_object);
+  NPError error = NPN_GetValue(npp, NPNVWindowNPObject, &global_object);
   GLUE_PROFILE_STOP(npp, "getvalue");
+  if (error != NPERR_NO_ERROR) return NULL;
   NPString string;
-  string.UTF8Characters = "[]";
-  string.UTF8Length = strlen(string.UTF8Characters);
+  string.UTF8Characters = literal.c_str();
+  string.UTF8Length = literal.size();
   NPVariant result;
   GLUE_PROFILE_START(npp, "evaluate");
   bool temp = NPN_Evaluate(npp, global_object, &string, &result);
   GLUE_PROFILE_STOP(npp, "evaluate");
+  NPN_ReleaseObject(global_object);
   if (!temp) return NULL;
   if (NPVARIANT_IS_OBJECT(result)) {
     return NPVARIANT_TO_OBJECT(result);
@@ -298,7 +427,46 @@ NPObject *CreateArray(NPP npp) {
     GLUE_PROFILE_STOP(npp, "NPN_ReleaseVariantValue");
     return NULL;
   }
-  GLUE_PROFILE_STOP(npp, "CreateArray");
+}
+
+void AppendArrayLiteralValue(int32_t value, std::string *literal) {
+  // write the digits backwards from the end of the buffer.
+  char buffer[11];
+  char *end = buffer + sizeof(buffer);
+  char *digits = end;
+  uint32_t magnitude = value < 0 ? 0u - static_cast<uint32_t>(value) : value;
+  do {
+    *--digits = static_cast<char>('0' + magnitude % 10);
+    magnitude /= 10;
+  } while (magnitude);
+  if (value < 0) *--digits = '-';
+  literal->append(digits, end - digits);
+}
+
+void AppendArrayLiteralValue(double value, std::string *literal) {
+  // these can't be written as literals, and NaN or Infinity may be redefined
+  // by the page.
+  if (value != value) {
+    literal->append("0/0");
+  } else if (value > DBL_MAX) {
+    literal->append("1/0");
+  } else if (value < -DBL_MAX) {
+    literal->append("-1/0");
+  } else {
+    // 17 significant digits are enough to read back the same double.
+    char buffer[32];
+    snprintf(buffer, sizeof(buffer), "%.17g", value);
+    // the decimal point depends on the locale.
+    for (char *c = buffer; *c; ++c) {
+      if (!isdigit(*c) && *c != '-' && *c != '+' && *c != 'e')
+        *c = '.';
+    }
+    literal->append(buffer);
+  }
+}
+
+void AppendArrayLiteralValue(bool value, std::string *literal) {
+  literal->append(value ? "true" : "false");
 }
 
 ScopedId::ScopedId(NPIdentifier name) {
@@ -335,16 +503,7 @@ void NPCallback::Set(NPObject* function, const NPVariant* args, int num_args) {
   // type.
   std::vector<NPVariant> new_args(num_args);
   for (size_t i = 0; i < new_args.size(); ++i) {
-    new_args[i] = args[i];
-    if (NPVARIANT_IS_OBJECT(new_args[i])) {
-      NPN_RetainObject(NPVARIANT_TO_OBJECT(new_args[i]));
-    } else if (NPVARIANT_IS_STRING(new_args[i])) {
-      NPUTF8* dest = static_cast<NPUTF8*>(
-          NPN_MemAlloc(new_args[i].value.stringValue.UTF8Length));
-      memcpy(dest, new_args[i].value.stringValue.UTF8Characters,
-             new_args[i].value.stringValue.UTF8Length);
-      new_args[i].value.stringValue.UTF8Characters = dest;
-    }
+    glue::globals::CopyNPVariant(args[i], &new_args[i]);
   }
 
   // Release previous argument variants.
@@ -355,6 +514,245 @@ void NPCallback::Set(NPObject* function, const NPVariant* args, int num_args) {
   args_.swap(new_args);
 }
 
+namespace glue {
+namespace globals {
+
+const char GLUE_VARIANT[] = GLUE_VARIANT_NAME;
+
+// Tables up to that size are searched linearly by FindIdentifier.
+static const int kLinearIdentifierSearchCount = 8;
+
+static bool IdentifierEntryLess(const IdentifierEntry &a,
+                                const IdentifierEntry &b) {
+  return std::less<NPIdentifier>()(a.name, b.name);
+}
+
+void SortIdentifiers(const NPIdentifier *ids, int count,
+                     IdentifierEntry *entries) {
+  for (int i = 0; i < count; ++i) {
+    entries[i].name = ids[i];
+    entries[i].index = i;
+  }
+  std::sort(entries, entries + count, IdentifierEntryLess);
+}
+
+int FindIdentifier(const IdentifierEntry *entries, int count,
+                   NPIdentifier name) {
+  // a linear scan is faster on small tables.
+  if (count <= kLinearIdentifierSearchCount) {
+    for (int i = 0; i < count; ++i)
+      if (entries[i].name == name)
+        return entries[i].index;
+    return -1;
+  }
+  std::less<NPIdentifier> less;
+  int low = 0;
+  int high = count;
+  while (low < high) {
+    int middle = (low + high) / 2;
+    if (less(entries[middle].name, name)) {
+      low = middle + 1;
+    } else {
+      high = middle;
+    }
+  }
+  if (low < count && entries[low].name == name) return entries[low].index;
+  return -1;
+}
+
+void CopyNPVariant(const NPVariant &value, NPVariant *copy) {
+  *copy = value;
+  if (NPVARIANT_IS_OBJECT(value)) {
+    NPN_RetainObject(NPVARIANT_TO_OBJECT(value));
+  } else if (NPVARIANT_IS_STRING(value)) {
+    NPUTF8* dest = static_cast<NPUTF8*>(
+        NPN_MemAlloc(value.value.stringValue.UTF8Length));
+    memcpy(dest, value.value.stringValue.UTF8Characters,
+           value.value.stringValue.UTF8Length);
+    copy->value.stringValue.UTF8Characters = dest;
+  }
+}
+
+PropertyCache::~PropertyCache() {
+  if (!entries_)
+    return;
+  for (size_t i = 0; i < entries_->size(); ++i)
+    NPN_ReleaseVariantValue(&(*entries_)[i].value);
+  delete entries_;
+}
+
+bool PropertyCache::Get(NPIdentifier name, NPVariant *variant) const {
+  if (!entries_)
+    return false;
+  // there are only a few cached properties per object.
+  for (size_t i = 0; i < entries_->size(); ++i) {
+    if ((*entries_)[i].name == name) {
+      CopyNPVariant((*entries_)[i].value, variant);
+      return true;
+    }
+  }
+  return false;
+}
+
+void PropertyCache::Set(NPIdentifier name, const NPVariant &value) {
+  Invalidate(name);
+  if (!entries_)
+    entries_ = new std::vector<Entry>;
+  Entry entry;
+  entry.name = name;
+  CopyNPVariant(value, &entry.value);
+  entries_->push_back(entry);
+}
+
+void PropertyCache::Invalidate(NPIdentifier name) {
+  if (!entries_)
+    return;
+  for (size_t i = 0; i < entries_->size(); ++i) {
+    if ((*entries_)[i].name == name) {
+      NPN_ReleaseVariantValue(&(*entries_)[i].value);
+      (*entries_)[i] = entries_->back();
+      entries_->pop_back();
+      return;
+    }
+  }
+}
+
+NPObjectPool::NPObjectPool(size_t object_size, int capacity,
+                           const char *class_name)
+    : object_size_(std::max(object_size, sizeof(FreeBlock))),
+      capacity_(capacity),
+      free_list_(NULL),
+      free_count_(0),
+      hits_(0),
+      misses_(0) {
+#ifdef PROFILE_GLUE
+  hit_key_ = std::string("pool hit: ") + class_name;
+  miss_key_ = std::string("pool miss: ") + class_name;
+#endif
+}
+
+NPObjectPool::~NPObjectPool() {
+  while (free_list_) {
+    FreeBlock *block = free_list_;
+    free_list_ = block->next;
+    ::operator delete(block);
+  }
+}
+
+void *NPObjectPool::Allocate(NPP npp) {
+  void *memory;
+  if (free_list_) {
+    ++hits_;
+    GLUE_PROFILE_START(npp, hit_key_);
+    GLUE_PROFILE_STOP(npp, hit_key_);
+    memory = free_list_;
+    free_list_ = free_list_->next;
+    --free_count_;
+  } else {
+    ++misses_;
+    GLUE_PROFILE_START(npp, miss_key_);
+    memory = ::operator new(object_size_);
+    GLUE_PROFILE_STOP(npp, miss_key_);
+  }
+  return memory;
+}
+
+void NPObjectPool::Free(void *memory) {
+  if (free_count_ >= capacity_) {
+    ::operator delete(memory);
+    return;
+  }
+  FreeBlock *block = static_cast<FreeBlock *>(memory);
+  block->next = free_list_;
+  free_list_ = block;
+  ++free_count_;
+}
+
+NPObjectMap::NPObjectMap() : entries_(NULL), capacity_(0), size_(0) {
+}
+
+NPObjectMap::~NPObjectMap() {
+  delete [] entries_;
+}
+
+size_t NPObjectMap::GetHomeIndex(NPP npp, const void *pointer) const {
+  // mixes the bits of both pointers, whose low bits are mostly the same
+  // because of alignment.
+  size_t hash = reinterpret_cast<size_t>(pointer) ^
+                (reinterpret_cast<size_t>(npp) * 31);
+  hash ^= hash >> 4;
+  hash *= 0x9E3779B9U;
+  hash ^= hash >> 16;
+  return hash & (capacity_ - 1);
+}
+
+size_t NPObjectMap::FindEntry(NPP npp, const void *pointer) const {
+  size_t index = GetHomeIndex(npp, pointer);
+  while (entries_[index].object &&
+         (entries_[index].pointer != pointer || entries_[index].npp != npp))
+    index = (index + 1) & (capacity_ - 1);
+  return index;
+}
+
+NPObject *NPObjectMap::Find(NPP npp, const void *pointer) const {
+  if (!size_)
+    return NULL;
+  return entries_[FindEntry(npp, pointer)].object;
+}
+
+void NPObjectMap::Insert(NPP npp, const void *pointer, NPObject *object) {
+  assert(object);
+  if ((size_ + 1) * 2 > static_cast<int>(capacity_))
+    Grow();
+  Entry *entry = entries_ + FindEntry(npp, pointer);
+  assert(!entry->object);
+  entry->npp = npp;
+  entry->pointer = pointer;
+  entry->object = object;
+  ++size_;
+}
+
+void NPObjectMap::Remove(NPP npp, const void *pointer, NPObject *object) {
+  if (!size_)
+    return;
+  size_t index = FindEntry(npp, pointer);
+  if (entries_[index].object != object)
+    return;
+  // moves back into the hole the next entries of the probe sequence whose
+  // home is not between the hole and them, so that they can still be found,
+  // instead of leaving a marker.
+  size_t mask = capacity_ - 1;
+  size_t hole = index;
+  for (size_t next = (hole + 1) & mask; entries_[next].object;
+       next = (next + 1) & mask) {
+    size_t home = GetHomeIndex(entries_[next].npp, entries_[next].pointer);
+    if (((next - home) & mask) >= ((next - hole) & mask)) {
+      entries_[hole] = entries_[next];
+      hole = next;
+    }
+  }
+  entries_[hole].object = NULL;
+  --size_;
+}
+
+void NPObjectMap::Grow() {
+  Entry *old_entries = entries_;
+  size_t old_capacity = capacity_;
+  capacity_ = capacity_ ? capacity_ * 2 : 16;
+  entries_ = new Entry[capacity_];
+  for (size_t i = 0; i < capacity_; ++i)
+    entries_[i].object = NULL;
+  for (size_t i = 0; i < old_capacity; ++i) {
+    if (old_entries[i].object)
+      entries_[FindEntry(old_entries[i].npp, old_entries[i].pointer)] =
+          old_entries[i];
+  }
+  delete [] old_entries;
+}
+
+}  // namespace globals
+}  // namespace glue
+
 namespace {
 void DoAsyncCall(void* data) {
   NPCallback* call = static_cast<NPCallback*>(data);
@@ -17,8 +17,10 @@
 
 #include <npapi.h>
 #include <npruntime.h>
+#include <new>
 #include <string>
 #include <vector>
+#include "unicode.h"
 
 
 #define NPVARIANT_TO_NUMBER(_v)  (NPVARIANT_IS_INT32(_v) ? \
@@ -28,12 +30,6 @@
 #define NPVARIANT_IS_NUMBER(_v)  (NPVARIANT_IS_INT32(_v) || \
   NPVARIANT_IS_DOUBLE(_v))
 
-// Converts a UTF16 wide string to a UTF8 string
-bool String16ToUTF8(const wchar_t *in, int len, std::string *out8);
-
-// Converts a UTF8 string to a UTF16 wide string
-bool UTF8ToString16(const char *in, int len, std::wstring *out16);
-
 // Converts a UTF16 string to a NPVariant
 bool String16ToNPVariant(const std::wstring &in, NPVariant *variant);
 
@@ -43,10 +39,20 @@ bool StringToNPVariant(const std::string &in, NPVariant *variant);
 // Converts an unsigned int to a std::string representation
 std::string UIntToString(unsigned int value);
 
-// Gets the i-th element of a JavaScript array.
+// Gets the i-th element of a JavaScript array, if it exists.
 bool GetNPArrayProperty(NPP npp, NPObject *object, int index,
                         NPVariant *output);
 
+// Gets the i-th element of a JavaScript array, in a single browser call: unlike
+// GetNPArrayProperty, it doesn't check that the element exists, so a missing
+// element is undefined (a void NPVariant), as in JavaScript. This is meant for
+// the indices below the length of the array.
+bool GetNPArrayElement(NPP npp, NPObject *object, int index,
+                       NPVariant *output);
+
+// Gets the length of a JavaScript array, in a single browser call.
+bool GetNPArrayLength(NPP npp, NPObject *object, int *length);
+
 // Gets a property from a JavaScript object.
 bool GetNPObjectProperty(NPP npp, NPObject *object, const char *name,
                          NPVariant *output);
@@ -54,6 +60,82 @@ bool GetNPObjectProperty(NPP npp, NPObject *object, const char *name,
 // Creates an empty JavaScript array.
 NPObject *CreateArray(NPP npp);
 
+// Creates a JavaScript array by evaluating an array literal, such as "[1,2]".
+NPObject *EvaluateArrayLiteral(NPP npp, const std::string &literal);
+
+// Appends an element to a JavaScript array literal. Arrays of numbers and
+// booleans are returned to JavaScript as a literal, in a single browser call.
+void AppendArrayLiteralValue(int32_t value, std::string *literal);
+void AppendArrayLiteralValue(double value, std::string *literal);
+void AppendArrayLiteralValue(bool value, std::string *literal);
+
+// Gets the identifier of the i-th element of a JavaScript array. The
+// identifiers of the valid indices are cached for the process, and the cache is
+// grown on demand.
+NPIdentifier GetArrayIndexIdentifier(NPP npp, int index);
+
+// Sets the i-th element of a JavaScript array.
+bool SetNPArrayProperty(NPP npp, NPObject *object, int index,
+                        const NPVariant *value);
+
+// Arrays of numbers and booleans declared [packed] in the IDL are passed to and
+// from JavaScript as a single base64 string, holding the little-endian
+// representation of the values, rather than as a JavaScript array.
+
+// Gets the size of the data encoded by a base64 string, or -1 if the string
+// doesn't have the length of a base64 string.
+int GetBase64DecodedSize(const NPString &string);
+
+// Decodes a base64 string holding the little-endian representation of values
+// of value_size bytes into output, in the host byte order. Returns false if
+// the string isn't valid base64.
+bool DecodePackedValues(const NPString &string, size_t value_size,
+                        void *output);
+
+// Encodes count values of value_size bytes into a NPVariant holding the base64
+// string of their little-endian representation.
+bool EncodePackedValues(const void *values, size_t count, size_t value_size,
+                        NPVariant *variant);
+
+// Converts a NPVariant holding a packed array to a std::vector.
+template <typename T>
+bool NPVariantToPackedArray(const NPVariant &variant, std::vector<T> *values) {
+  if (!NPVARIANT_IS_STRING(variant)) return false;
+  const NPString &string = NPVARIANT_TO_STRING(variant);
+  int size = GetBase64DecodedSize(string);
+  if (size < 0 || size % sizeof(T) != 0) return false;
+  values->resize(size / sizeof(T));
+  if (size && !DecodePackedValues(string, sizeof(T), &(*values)[0])) {
+    values->clear();
+    return false;
+  }
+  return true;
+}
+
+// std::vector<bool> doesn't store bools, so booleans are packed as bytes.
+template <>
+inline bool NPVariantToPackedArray(const NPVariant &variant,
+                                   std::vector<bool> *values) {
+  std::vector<unsigned char> bytes;
+  if (!NPVariantToPackedArray(variant, &bytes)) return false;
+  values->assign(bytes.begin(), bytes.end());
+  return true;
+}
+
+// Converts a std::vector to a NPVariant holding a packed array.
+template <typename T>
+bool PackedArrayToNPVariant(const std::vector<T> &values, NPVariant *variant) {
+  return EncodePackedValues(values.empty() ? NULL : &values[0], values.size(),
+                            sizeof(T), variant);
+}
+
+template <>
+inline bool PackedArrayToNPVariant(const std::vector<bool> &values,
+                                   NPVariant *variant) {
+  std::vector<unsigned char> bytes(values.begin(), values.end());
+  return PackedArrayToNPVariant(bytes, variant);
+}
+
 // ScopeId used to retrieve the text representation of a NPIdentifier, with
 // automatic memory management.
 class ScopedId {
@@ -65,6 +147,19 @@ class ScopedId {
   NPUTF8 *text_;
 };
 
+// ScopedVariant releases a NPVariant when it goes out of scope. The callback
+// glue uses it to keep the result of the call alive until the return value,
+// which may point into it, has been built.
+class ScopedVariant {
+ public:
+  explicit ScopedVariant(NPVariant *variant) : variant_(variant) {}
+  ~ScopedVariant() { NPN_ReleaseVariantValue(variant_); }
+ private:
+  NPVariant *variant_;
+  ScopedVariant(const ScopedVariant&);
+  void operator=(const ScopedVariant&);
+};
+
 // DebugScopedId works like ScopedId, but does nothing in release mode. It
 // can be used to help debugging NPAPI dispatch functions, with no overhead in
 // release.
@@ -133,6 +228,57 @@ class Variant {
   }
 };
 
+// StringView is a read-only view over UTF-8 characters it does not own, for
+// use with functions with 'StringView' parameter(s) in IDL. The glue passes a
+// view over the characters of the NPVariant argument instead of a copy, so
+// the view is only valid for the duration of the call: copy it into a
+// std::string to keep it.
+class StringView {
+ public:
+  StringView() : data_(NULL), size_(0) {}
+  StringView(const char *data, size_t size) : data_(data), size_(size) {}
+  explicit StringView(const std::string &value)
+      : data_(value.data()), size_(value.size()) {}
+  const char *data() const { return data_; }
+  size_t size() const { return size_; }
+  bool empty() const { return size_ == 0; }
+  std::string ToString() const { return std::string(data_, size_); }
+ private:
+  const char *data_;
+  size_t size_;
+};
+
+// StringBuffer holds UTF-8 characters in memory allocated with NPN_MemAlloc,
+// for use with functions returning 'StringBuffer' in IDL: the glue hands the
+// memory over to the browser instead of copying it. Like std::auto_ptr,
+// copying a StringBuffer transfers the ownership of the memory, so that it can
+// be returned by value.
+class StringBuffer {
+ public:
+  StringBuffer() : data_(NULL), size_(0) {}
+  StringBuffer(const StringBuffer &other);
+  ~StringBuffer();
+  StringBuffer &operator=(const StringBuffer &other);
+  // Allocates room for size characters, releasing the previous ones. Returns
+  // false, leaving the buffer empty, if the allocation failed.
+  bool Allocate(size_t size);
+  NPUTF8 *data() const { return data_; }
+  size_t size() const { return size_; }
+  // Transfers the ownership of the characters to the caller, who has to free
+  // them with NPN_MemFree, and leaves the buffer empty.
+  NPUTF8 *Release() const;
+ private:
+  mutable NPUTF8 *data_;
+  mutable size_t size_;
+};
+
+// Converts a StringView to a NPVariant, copying the characters.
+bool StringViewToNPVariant(const StringView &in, NPVariant *variant);
+
+// Converts a StringBuffer to a NPVariant, handing the characters over to it.
+// The buffer is left empty.
+bool StringBufferToNPVariant(const StringBuffer &in, NPVariant *variant);
+
 // An object that holds a callable NPObject and some arguments and allows the
 // callable object to be called with those arguments either synchronously or
 // asynchronously.
@@ -233,6 +379,176 @@ class ScopedProfile {
 
 #endif  // PROFILE_GLUE
 
+// The static glue can be prebuilt as a library, in one variant per setting of
+// PROFILE_GLUE and _DEBUG. Each variant defines a different symbol, that the
+// generated glue refers to (see GetStaticGlueVariant), so that linking the
+// glue against a variant built with different settings fails.
+#if defined(PROFILE_GLUE) && defined(_DEBUG)
+#define GLUE_VARIANT static_glue_variant_profile_debug
+#define GLUE_VARIANT_NAME "profile-debug"
+#elif defined(PROFILE_GLUE)
+#define GLUE_VARIANT static_glue_variant_profile_release
+#define GLUE_VARIANT_NAME "profile-release"
+#elif defined(_DEBUG)
+#define GLUE_VARIANT static_glue_variant_debug
+#define GLUE_VARIANT_NAME "debug"
+#else
+#define GLUE_VARIANT static_glue_variant_release
+#define GLUE_VARIANT_NAME "release"
+#endif
+
+extern const char GLUE_VARIANT[];
+
+// An entry in the sorted index of an identifier table, mapping an identifier
+// to its position in the table.
+struct IdentifierEntry {
+  NPIdentifier name;
+  int index;
+};
+
+// Fills the index of an identifier table, sorted by identifier so that
+// FindIdentifier can do a binary search.
+void SortIdentifiers(const NPIdentifier *ids, int count,
+                     IdentifierEntry *entries);
+
+// Finds an identifier in the sorted index of an identifier table. Returns the
+// position of the identifier in the table, or -1 if it isn't in the table.
+int FindIdentifier(const IdentifierEntry *entries, int count,
+                   NPIdentifier name);
+
+// Copies value into copy, retaining its object or duplicating its string, so
+// that copy is released separately with NPN_ReleaseVariantValue.
+void CopyNPVariant(const NPVariant &value, NPVariant *copy);
+
+// The values of the properties with the 'cached' attribute in IDL, kept in
+// their NPObject after the first read so that the next reads don't call the
+// getter and convert the value again. The setter of a cached property
+// invalidates its value. Only the pointer to the entries is allocated until a
+// value is cached.
+class PropertyCache {
+ public:
+  PropertyCache() : entries_(NULL) {}
+  ~PropertyCache();
+
+  // Gets a copy of the cached value of a property into variant, to be released
+  // by the caller. Returns false if the value isn't cached.
+  bool Get(NPIdentifier name, NPVariant *variant) const;
+
+  // Caches a copy of the value of a property.
+  void Set(NPIdentifier name, const NPVariant &value);
+
+  // Releases the cached value of a property, if any.
+  void Invalidate(NPIdentifier name);
+
+ private:
+  struct Entry {
+    NPIdentifier name;
+    NPVariant value;
+  };
+
+  std::vector<Entry> *entries_;
+
+  PropertyCache(const PropertyCache&);
+  void operator=(const PropertyCache&);
+};
+
+// A bounded free list of the memory of the NPObjects of one class, used by the
+// Allocate and Deallocate functions of the classes with the 'pooled' attribute
+// in IDL: the memory of up to capacity released objects is kept to allocate
+// the next ones, instead of going back to the heap.
+//
+// With PROFILE_GLUE, each allocation is reported to the profiler under the
+// "pool hit: <class>" key if it reused memory from the free list, or the
+// "pool miss: <class>" key if it had to allocate.
+class NPObjectPool {
+ public:
+  NPObjectPool(size_t object_size, int capacity, const char *class_name);
+  ~NPObjectPool();
+
+  // Gets memory for an object, from the free list if possible.
+  void *Allocate(NPP npp);
+
+  // Destroys an object allocated with Allocate and frees its memory.
+  template <typename T> void Delete(T *object) {
+    object->~T();
+    Free(object);
+  }
+
+  int hits() const { return hits_; }
+  int misses() const { return misses_; }
+
+ private:
+  // Returns memory to the free list, or to the heap if the list is full.
+  void Free(void *memory);
+
+  // The free memory blocks are chained through their first bytes.
+  struct FreeBlock {
+    FreeBlock *next;
+  };
+
+  size_t object_size_;
+  int capacity_;
+  FreeBlock *free_list_;
+  int free_count_;
+  int hits_;
+  int misses_;
+#ifdef PROFILE_GLUE
+  std::string hit_key_;
+  std::string miss_key_;
+#endif
+
+  NPObjectPool(const NPObjectPool&);
+  void operator=(const NPObjectPool&);
+};
+
+// A map from the native objects of one class to their NPObject wrappers, per
+// NPP instance, used by the by_pointer glue to return the existing wrapper of
+// an object instead of creating a new one, so that JavaScript sees the same
+// object each time.
+//
+// The map does not hold references: the Deallocate function of the wrappers
+// removes them. It is an open-addressed hash table with linear probing, kept
+// at most half full.
+class NPObjectMap {
+ public:
+  NPObjectMap();
+  ~NPObjectMap();
+
+  // Returns the wrapper of pointer in npp, or NULL if there is none.
+  NPObject *Find(NPP npp, const void *pointer) const;
+
+  // Adds the wrapper of pointer in npp, which must not have one yet.
+  void Insert(NPP npp, const void *pointer, NPObject *object);
+
+  // Removes the wrapper of pointer in npp, if it is object.
+  void Remove(NPP npp, const void *pointer, NPObject *object);
+
+  int size() const { return size_; }
+
+ private:
+  // An empty entry has a NULL object.
+  struct Entry {
+    NPP npp;
+    const void *pointer;
+    NPObject *object;
+  };
+
+  // Returns the index where the search for the entry of pointer in npp starts.
+  size_t GetHomeIndex(NPP npp, const void *pointer) const;
+  // Returns the index of the entry of pointer in npp, or of the empty entry
+  // where it would be inserted.
+  size_t FindEntry(NPP npp, const void *pointer) const;
+  void Grow();
+
+  Entry *entries_;
+  // The number of entries, 0 or a power of 2.
+  size_t capacity_;
+  int size_;
+
+  NPObjectMap(const NPObjectMap&);
+  void operator=(const NPObjectMap&);
+};
+
 }  // namespace globals
 }  // namespace glue
 
@@ -0,0 +1,83 @@
+// Copyright 2009 Google Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Compares the per-call cost of the identifier lookups done by the generated
+// dispatch functions, for classes with 5, 50 and 500 members: a linear scan of
+// the identifier table (what the glue used to do, one comparison per member),
+// and a binary search in the sorted index (FindIdentifier).
+//
+// Identifiers are fake, they only need to be distinct pointers, so no browser
+// is needed.
+
+#include <stdio.h>
+#include <time.h>
+#include <vector>
+#include "common.h"
+
+namespace {
+
+const int kCallCount = 10000000;
+
+int LinearFind(const NPIdentifier *ids, int count, NPIdentifier name) {
+  for (int i = 0; i < count; ++i)
+    if (name == ids[i])
+      return i;
+  return -1;
+}
+
+double NanosecondsPerCall(clock_t start) {
+  return (clock() - start) * 1e9 / CLOCKS_PER_SEC / kCallCount;
+}
+
+void RunBenchmark(int member_count) {
+  // identifiers come from the browser in no particular order.
+  std::vector<char *> storage(member_count);
+  std::vector<NPIdentifier> ids(member_count);
+  for (int i = 0; i < member_count; ++i) {
+    storage[i] = new char[1 + (i * 7919) % 64];
+    ids[i] = storage[i];
+  }
+  std::vector<glue::globals::IdentifierEntry> index(member_count);
+  glue::globals::SortIdentifiers(&ids[0], member_count, &index[0]);
+
+  // look up every member in turn, plus the occasional miss (a member of a
+  // base class).
+  NPIdentifier miss = &storage;
+  int checksum = 0;
+  clock_t start = clock();
+  for (int i = 0; i < kCallCount; ++i) {
+    NPIdentifier name = i % 8 ? ids[i % member_count] : miss;
+    checksum += LinearFind(&ids[0], member_count, name);
+  }
+  double linear = NanosecondsPerCall(start);
+  start = clock();
+  for (int i = 0; i < kCallCount; ++i) {
+    NPIdentifier name = i % 8 ? ids[i % member_count] : miss;
+    checksum -= glue::globals::FindIdentifier(&index[0], member_count, name);
+  }
+  double indexed = NanosecondsPerCall(start);
+  printf("%4d members: linear %7.1f ns/call, indexed %7.1f ns/call%s\n",
+         member_count, linear, indexed, checksum ? " (MISMATCH)" : "");
+  for (int i = 0; i < member_count; ++i)
+    delete[] storage[i];
+}
+
+}  // anonymous namespace
+
+int main(int argc, char **argv) {
+  RunBenchmark(5);
+  RunBenchmark(50);
+  RunBenchmark(500);
+  return 0;
+}
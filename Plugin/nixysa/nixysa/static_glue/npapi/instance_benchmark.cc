@@ -0,0 +1,175 @@
+// Copyright 2009 Google Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Measures the latency of plugin instance creation (NPP_New followed by
+// NPP_Destroy), for the first instance, which initializes the identifier
+// tables, and for the following ones, as for a page with many <embed> tags.
+//
+// This is linked with a plugin's glue and main.cc instead of being loaded by
+// a browser: it provides the few browser functions used while creating the
+// instances, and counts the identifiers looked up.
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <time.h>
+#include <map>
+#include <string>
+#include <npapi.h>
+#include <npfunctions.h>
+
+extern "C" {
+#if defined(OS_WINDOWS) || defined(OS_MACOSX)
+NPError OSCALL NP_GetEntryPoints(NPPluginFuncs *pluginFuncs);
+NPError OSCALL NP_Initialize(NPNetscapeFuncs *browserFuncs);
+#else
+NPError OSCALL NP_Initialize(NPNetscapeFuncs *browserFuncs,
+                             NPPluginFuncs *pluginFuncs);
+#endif
+NPError OSCALL NP_Shutdown(void);
+}
+
+namespace {
+
+const int kInstanceCount = 10000;
+
+int g_identifier_count = 0;
+std::map<std::string, std::string *> g_identifiers;
+
+NPIdentifier GetStringIdentifier(const NPUTF8 *name) {
+  ++g_identifier_count;
+  std::string *&identifier = g_identifiers[name];
+  if (!identifier)
+    identifier = new std::string(name);
+  return identifier;
+}
+
+void GetStringIdentifiers(const NPUTF8 **names, int32_t count,
+                          NPIdentifier *identifiers) {
+  for (int32_t i = 0; i < count; ++i)
+    identifiers[i] = GetStringIdentifier(names[i]);
+}
+
+bool IdentifierIsString(NPIdentifier identifier) {
+  return true;
+}
+
+NPUTF8 *UTF8FromIdentifier(NPIdentifier identifier) {
+  const std::string *name = static_cast<std::string *>(identifier);
+  NPUTF8 *result = static_cast<NPUTF8 *>(malloc(name->size() + 1));
+  memcpy(result, name->c_str(), name->size() + 1);
+  return result;
+}
+
+void *MemAlloc(uint32_t size) {
+  return malloc(size);
+}
+
+void MemFree(void *pointer) {
+  free(pointer);
+}
+
+NPObject *CreateObject(NPP npp, NPClass *np_class) {
+  NPObject *object;
+  if (np_class->allocate)
+    object = np_class->allocate(npp, np_class);
+  else
+    object = static_cast<NPObject *>(malloc(sizeof(NPObject)));
+  object->_class = np_class;
+  object->referenceCount = 1;
+  return object;
+}
+
+NPObject *RetainObject(NPObject *object) {
+  ++object->referenceCount;
+  return object;
+}
+
+void ReleaseObject(NPObject *object) {
+  if (--object->referenceCount == 0) {
+    if (object->_class->deallocate)
+      object->_class->deallocate(object);
+    else
+      free(object);
+  }
+}
+
+void ReleaseVariantValue(NPVariant *variant) {
+  if (NPVARIANT_IS_OBJECT(*variant))
+    ReleaseObject(NPVARIANT_TO_OBJECT(*variant));
+  else if (NPVARIANT_IS_STRING(*variant))
+    free(const_cast<NPUTF8 *>(NPVARIANT_TO_STRING(*variant).UTF8Characters));
+  VOID_TO_NPVARIANT(*variant);
+}
+
+double MicrosecondsSince(clock_t start, int count) {
+  return (clock() - start) * 1e6 / CLOCKS_PER_SEC / count;
+}
+
+}  // anonymous namespace
+
+int main(int argc, char **argv) {
+  NPNetscapeFuncs browser_functions;
+  memset(&browser_functions, 0, sizeof(browser_functions));
+  browser_functions.size = sizeof(browser_functions);
+  browser_functions.version =
+      (NP_VERSION_MAJOR << 8) | NPVERS_HAS_NPRUNTIME_SCRIPTING;
+  browser_functions.memalloc = MemAlloc;
+  browser_functions.memfree = MemFree;
+  browser_functions.getstringidentifier = GetStringIdentifier;
+  browser_functions.getstringidentifiers = GetStringIdentifiers;
+  browser_functions.identifierisstring = IdentifierIsString;
+  browser_functions.utf8fromidentifier = UTF8FromIdentifier;
+  browser_functions.createobject = CreateObject;
+  browser_functions.retainobject = RetainObject;
+  browser_functions.releaseobject = ReleaseObject;
+  browser_functions.releasevariantvalue = ReleaseVariantValue;
+
+  NPPluginFuncs plugin_functions;
+  memset(&plugin_functions, 0, sizeof(plugin_functions));
+  plugin_functions.size = sizeof(plugin_functions);
+#if defined(OS_WINDOWS) || defined(OS_MACOSX)
+  NPError error = NP_Initialize(&browser_functions);
+  if (error == NPERR_NO_ERROR)
+    error = NP_GetEntryPoints(&plugin_functions);
+#else
+  NPError error = NP_Initialize(&browser_functions, &plugin_functions);
+#endif
+  if (error != NPERR_NO_ERROR) {
+    fprintf(stderr, "NP_Initialize failed: %d\n", error);
+    return 1;
+  }
+
+  char mime_type[] = "application/x-benchmark";
+  NPP_t instance;
+  clock_t start = clock();
+  plugin_functions.newp(mime_type, &instance, NP_EMBED, 0, NULL, NULL, NULL);
+  plugin_functions.destroy(&instance, NULL);
+  double first = MicrosecondsSince(start, 1);
+  int first_identifiers = g_identifier_count;
+
+  g_identifier_count = 0;
+  start = clock();
+  for (int i = 0; i < kInstanceCount; ++i) {
+    plugin_functions.newp(mime_type, &instance, NP_EMBED, 0, NULL, NULL, NULL);
+    plugin_functions.destroy(&instance, NULL);
+  }
+  double next = MicrosecondsSince(start, kInstanceCount);
+  printf("first instance: %8.2f us, %d identifiers looked up\n", first,
+         first_identifiers);
+  printf("next instances: %8.2f us, %.1f identifiers looked up per instance\n",
+         next, static_cast<double>(g_identifier_count) / kInstanceCount);
+  NP_Shutdown();
+  return 0;
+}
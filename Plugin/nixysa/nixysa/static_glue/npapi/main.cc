@@ -69,6 +69,9 @@ extern "C" {
   NPError NPP_New(NPMIMEType pluginType, NPP instance, uint16_t mode,
                   int16_t argc, char *argn[], char *argv[],
                   NPSavedData *saved) {
+    // Only initializes the identifier tables for the first instance:
+    // identifiers are global to the browser process, so the tables are shared
+    // by all the instances, and never torn down when one is destroyed.
     glue::InitializeGlue(instance);
     NPObject *object = glue::CreateStaticNPObject(instance);
     instance->pdata = object;
@@ -0,0 +1,161 @@
+// Copyright 2009 Google Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Tests for glue::globals::NPObjectMap, the map from native objects to their
+// wrappers used by the by_pointer glue. Prints the failed checks and exits
+// with a non-zero status if any.
+
+#include <stdio.h>
+#include <stdlib.h>
+#include <map>
+#include <utility>
+#include <vector>
+#include "common.h"
+
+namespace {
+
+using glue::globals::NPObjectMap;
+
+int g_failures = 0;
+
+#define EXPECT(condition) do { \
+    if (!(condition)) { \
+      ++g_failures; \
+      fprintf(stderr, "%s:%d: failed: %s\n", __FILE__, __LINE__, \
+              #condition); \
+    } \
+  } while (0)
+
+// Fake NPP instances, native objects and wrappers: the map only compares
+// their addresses.
+NPP_t g_instances[2];
+NPP const kFirstNPP = &g_instances[0];
+NPP const kSecondNPP = &g_instances[1];
+int g_natives[1000];
+NPObject g_wrappers[1000];
+
+void TestEmpty() {
+  NPObjectMap map;
+  EXPECT(map.size() == 0);
+  EXPECT(map.Find(kFirstNPP, &g_natives[0]) == NULL);
+  map.Remove(kFirstNPP, &g_natives[0], &g_wrappers[0]);
+  EXPECT(map.size() == 0);
+}
+
+void TestInsertFindRemove() {
+  NPObjectMap map;
+  map.Insert(kFirstNPP, &g_natives[0], &g_wrappers[0]);
+  EXPECT(map.size() == 1);
+  EXPECT(map.Find(kFirstNPP, &g_natives[0]) == &g_wrappers[0]);
+  EXPECT(map.Find(kFirstNPP, &g_natives[1]) == NULL);
+  // releasing the wrapper invalidates the entry.
+  map.Remove(kFirstNPP, &g_natives[0], &g_wrappers[0]);
+  EXPECT(map.size() == 0);
+  EXPECT(map.Find(kFirstNPP, &g_natives[0]) == NULL);
+  // a new wrapper can then be added for the same object.
+  map.Insert(kFirstNPP, &g_natives[0], &g_wrappers[1]);
+  EXPECT(map.Find(kFirstNPP, &g_natives[0]) == &g_wrappers[1]);
+}
+
+void TestInstancesAreSeparate() {
+  NPObjectMap map;
+  map.Insert(kFirstNPP, &g_natives[0], &g_wrappers[0]);
+  EXPECT(map.Find(kSecondNPP, &g_natives[0]) == NULL);
+  map.Insert(kSecondNPP, &g_natives[0], &g_wrappers[1]);
+  EXPECT(map.Find(kFirstNPP, &g_natives[0]) == &g_wrappers[0]);
+  EXPECT(map.Find(kSecondNPP, &g_natives[0]) == &g_wrappers[1]);
+  map.Remove(kFirstNPP, &g_natives[0], &g_wrappers[0]);
+  EXPECT(map.Find(kFirstNPP, &g_natives[0]) == NULL);
+  EXPECT(map.Find(kSecondNPP, &g_natives[0]) == &g_wrappers[1]);
+}
+
+void TestRemoveOtherWrapper() {
+  // a wrapper that is not the one in the map, for instance one whose value was
+  // changed, does not remove the entry.
+  NPObjectMap map;
+  map.Insert(kFirstNPP, &g_natives[0], &g_wrappers[0]);
+  map.Remove(kFirstNPP, &g_natives[0], &g_wrappers[1]);
+  EXPECT(map.size() == 1);
+  EXPECT(map.Find(kFirstNPP, &g_natives[0]) == &g_wrappers[0]);
+}
+
+void TestGrowth() {
+  NPObjectMap map;
+  for (int i = 0; i < 1000; ++i)
+    map.Insert(kFirstNPP, &g_natives[i], &g_wrappers[i]);
+  EXPECT(map.size() == 1000);
+  for (int i = 0; i < 1000; ++i)
+    EXPECT(map.Find(kFirstNPP, &g_natives[i]) == &g_wrappers[i]);
+  // removes every other entry, which moves the collided entries back.
+  for (int i = 0; i < 1000; i += 2)
+    map.Remove(kFirstNPP, &g_natives[i], &g_wrappers[i]);
+  EXPECT(map.size() == 500);
+  for (int i = 0; i < 1000; ++i) {
+    EXPECT(map.Find(kFirstNPP, &g_natives[i]) ==
+           (i % 2 ? &g_wrappers[i] : NULL));
+  }
+}
+
+void TestRandomOperations() {
+  // compares the map with a std::map over random insertions and removals.
+  typedef std::map<std::pair<NPP, const void *>, NPObject *> ReferenceMap;
+  ReferenceMap reference;
+  NPObjectMap map;
+  srand(1);
+  for (int i = 0; i < 100000; ++i) {
+    NPP npp = rand() % 2 ? kFirstNPP : kSecondNPP;
+    int native = rand() % 200;
+    ReferenceMap::key_type key(npp, &g_natives[native]);
+    ReferenceMap::iterator it = reference.find(key);
+    if (it == reference.end()) {
+      NPObject *wrapper = &g_wrappers[rand() % 1000];
+      map.Insert(npp, &g_natives[native], wrapper);
+      reference[key] = wrapper;
+    } else {
+      map.Remove(npp, &g_natives[native], it->second);
+      reference.erase(it);
+    }
+    if (map.size() != static_cast<int>(reference.size())) {
+      fprintf(stderr, "wrong size after %d operations\n", i + 1);
+      ++g_failures;
+      return;
+    }
+  }
+  for (int i = 0; i < 200; ++i) {
+    for (int j = 0; j < 2; ++j) {
+      NPP npp = j ? kSecondNPP : kFirstNPP;
+      ReferenceMap::iterator it =
+          reference.find(ReferenceMap::key_type(npp, &g_natives[i]));
+      EXPECT(map.Find(npp, &g_natives[i]) ==
+             (it == reference.end() ? NULL : it->second));
+    }
+  }
+}
+
+}  // anonymous namespace
+
+int main(int argc, char **argv) {
+  TestEmpty();
+  TestInsertFindRemove();
+  TestInstancesAreSeparate();
+  TestRemoveOtherWrapper();
+  TestGrowth();
+  TestRandomOperations();
+  if (g_failures) {
+    fprintf(stderr, "%d failure(s)\n", g_failures);
+    return 1;
+  }
+  printf("PASSED\n");
+  return 0;
+}
@@ -68,7 +68,7 @@ static bool HasMethod(NPObject *header, NPIdentifier name) {
 bool HasProperty(NPObject *header, NPIdentifier name) {
   DebugScopedId id(name);  // debug helper
   NPAPIObject *object = static_cast<NPAPIObject *>(header);
-  return object->GetNamespaceObject(name) != NULL;
+  return object->GetNamespaceIndex(name) >= 0;
 }
 
 static bool Invoke(NPObject *header, NPIdentifier name, const NPVariant *args,
@@ -81,13 +81,16 @@ bool GetProperty(NPObject *header, NPIdentifier name,
                        NPVariant *variant) {
   DebugScopedId id(name);  // debug helper
   NPAPIObject *object = static_cast<NPAPIObject *>(header);
-  NPAPIObject *namespace_object = object->GetNamespaceObject(name);
-  if (namespace_object) {
-    NPN_RetainObject(namespace_object);
-    OBJECT_TO_NPVARIANT(namespace_object, *variant);
-    return true;
-  }
-  return false;
+  return GetNamespaceProperty(object, object->GetNamespaceIndex(name),
+                              variant);
+}
+
+bool GetNamespaceProperty(NPAPIObject *object, int index, NPVariant *variant) {
+  if (index < 0) return false;
+  NPAPIObject *namespace_object = object->GetNamespaceObjectByIndex(index);
+  NPN_RetainObject(namespace_object);
+  OBJECT_TO_NPVARIANT(namespace_object, *variant);
+  return true;
 }
 
 bool SetProperty(NPObject *header, NPIdentifier name,
@@ -109,20 +112,36 @@ bool Enumerate(NPObject *header, NPIdentifier **names, uint32_t *count) {
 NPAPIObject::NPAPIObject(NPP npp)
     : npp_(npp),
       namespaces_(NULL),
+      creator_(NULL),
       names_(NULL),
+      index_(NULL),
       count_(0),
-      base_(NULL) {
+      base_(NULL),
+      root_(this) {
 }
 
 NPAPIObject::~NPAPIObject() {
   if (namespaces_) delete [] namespaces_;
 }
 
-void NPAPIObject::AllocateNamespaceObjects(int count) {
+void NPAPIObject::AllocateNamespaceObjects(int count,
+                                           NamespaceObjectCreator creator) {
   if (namespaces_) delete [] namespaces_;
   namespaces_ = new NPAPIObject *[count];
+  memset(namespaces_, 0, count * sizeof(*namespaces_));
+  creator_ = creator;
   count_ = count;
 }
 
+NPAPIObject *NPAPIObject::GetNamespaceObjectByIndex(int i) {
+  if (!namespaces_[i]) {
+    // the objects of the inner namespaces share the root object of this one.
+    NPAPIObject *object = creator_(root_, i);
+    object->root_ = root_;
+    namespaces_[i] = object;
+  }
+  return namespaces_[i];
+}
+
 }  // namespace globals
 }  // namespace glue
@@ -20,36 +20,50 @@
 namespace glue {
 namespace globals {
 
+class NPAPIObject;
+
+// Creates the static object of the index-th namespace or class in a scope.
+// root_object is the static object of the global namespace, through which the
+// static objects of the base classes are found.
+typedef NPAPIObject *(*NamespaceObjectCreator)(NPAPIObject *root_object,
+                                               int index);
+
 class NPAPIObject : public NPObject {
  public:
   explicit NPAPIObject(NPP npp);
   ~NPAPIObject();
   void set_base(NPAPIObject *base) { base_ = base; }
   NPAPIObject *base() { return base_; }
-  void set_names(NPIdentifier *names) { names_ = names; }
+  // index is the sorted index of names, as filled by SortIdentifiers.
+  void set_names(NPIdentifier *names, const IdentifierEntry *index) {
+    names_ = names;
+    index_ = index;
+  }
   NPIdentifier *names() { return names_; }
   int count() { return count_; }
   NPP npp() {return npp_;}
-  void AllocateNamespaceObjects(int count);
-  void SetNamespaceObject(int i, NPAPIObject *object) {
-    namespaces_[i] = object;
-  }
-  NPAPIObject *GetNamespaceObjectByIndex(int i) {
-    return namespaces_[i];
+  // The namespace objects are only created when first accessed, by creator.
+  void AllocateNamespaceObjects(int count, NamespaceObjectCreator creator);
+  NPAPIObject *GetNamespaceObjectByIndex(int i);
+  int GetNamespaceIndex(NPIdentifier name) {
+    DebugScopedId id(name);  // debug helper
+    return FindIdentifier(index_, count_, name);
   }
   NPAPIObject *GetNamespaceObject(NPIdentifier name) {
-    DebugScopedId id(name);  // debug helper
-    for (int i = 0; i < count_; ++i)
-      if (name == names_[i])
-        return namespaces_[i];
-    return NULL;
+    int i = GetNamespaceIndex(name);
+    return i >= 0 ? GetNamespaceObjectByIndex(i) : NULL;
   }
+  PropertyCache *property_cache() { return &property_cache_; }
  private:
   NPP npp_;
   NPAPIObject **namespaces_;
+  NamespaceObjectCreator creator_;
   NPIdentifier *names_;
+  const IdentifierEntry *index_;
   int count_;
   NPAPIObject *base_;
+  NPAPIObject *root_;
+  PropertyCache property_cache_;
 };
 
 NPObject *Allocate(NPP npp, NPClass *theClass);
@@ -57,6 +71,9 @@ void Deallocate(NPObject *header);
 bool HasProperty(NPObject *header, NPIdentifier name);
 bool GetProperty(NPObject *header, NPIdentifier name,
                  NPVariant *variant);
+// Gets the index-th namespace object of object into variant, for the glue
+// that already looked the name up. Returns false if index is negative.
+bool GetNamespaceProperty(NPAPIObject *object, int index, NPVariant *variant);
 bool SetProperty(NPObject *header, NPIdentifier name,
                  const NPVariant *variant);
 
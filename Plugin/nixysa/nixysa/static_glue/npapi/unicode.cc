@@ -0,0 +1,319 @@
+// Copyright 2009 Google Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+#include <assert.h>
+#include <limits.h>
+#include <string.h>
+#include <string>
+#include "unicode.h"
+
+namespace {
+
+// Runs of ASCII characters are checked a machine word at a time: a word of
+// UTF-8 holds only ASCII characters if none of its bytes has the high bit set.
+typedef size_t Word;
+const Word kNonASCIIBits = static_cast<Word>(-1) / 0xFF * 0x80;
+
+// Whether wide strings are UTF-16, that is whether code points above U+FFFF
+// take two wchar_t (a surrogate pair).
+const bool kWideIsUTF16 = sizeof(wchar_t) == 2;
+
+// The character that replaces invalid input.
+const unsigned int kReplacementCharacter = 0xFFFD;
+
+inline bool IsContinuation(unsigned char c) {
+  return (c & 0xC0) == 0x80;
+}
+
+// UTF-8 is decoded through a buffer of this many wchar_t on the stack.
+const int kDecodeBufferSize = 1024;
+
+// Returns the length of the first chunk of the len bytes of UTF-8 at in that
+// is at most max_len bytes long, and does not split a sequence, nor the
+// invalid bytes replaced by a single U+FFFD.
+int GetChunkLength(const unsigned char *in, int len, int max_len) {
+  if (len <= max_len) return len;
+  // a sequence has at most 3 continuation bytes, so a chunk ending before 4
+  // of them does not split one.
+  for (int length = max_len; length > max_len - 4; --length) {
+    if (!IsContinuation(in[length])) return length;
+  }
+  return max_len;
+}
+
+// Returns the payload of a byte if it is a continuation byte, or a value
+// above 0x3F otherwise.
+inline unsigned int ContinuationPayload(unsigned char c) {
+  return c ^ 0x80;
+}
+
+// Decodes the 3-byte UTF-8 sequence at in. Returns its code point, or 0 if it
+// is not valid.
+inline unsigned int DecodeThreeBytes(const unsigned char *in) {
+  unsigned int second = ContinuationPayload(in[1]);
+  unsigned int third = ContinuationPayload(in[2]);
+  unsigned int c = ((in[0] & 0x0F) << 12) | (second << 6) | third;
+  // overlong forms and surrogates.
+  if ((second | third) >= 0x40 || c < 0x800 || (c >= 0xD800 && c < 0xE000))
+    return 0;
+  return c;
+}
+
+// Decodes the multi-byte UTF-8 sequence at in, out of len bytes left. Returns
+// its length and stores its code point, or returns 0 if it is not valid.
+inline int DecodeSequence(const unsigned char *in, int len,
+                          unsigned int *code_point) {
+  unsigned int lead = in[0];
+  if (lead < 0xE0) {
+    // below 0xC2, a continuation byte or the lead of an overlong form.
+    if (lead < 0xC2 || len < 2) return 0;
+    unsigned int second = ContinuationPayload(in[1]);
+    if (second >= 0x40) return 0;
+    *code_point = ((lead & 0x1F) << 6) | second;
+    return 2;
+  }
+  if (lead < 0xF0) {
+    if (len < 3) return 0;
+    *code_point = DecodeThreeBytes(in);
+    return *code_point ? 3 : 0;
+  }
+  if (lead > 0xF4 || len < 4) return 0;
+  unsigned int second = ContinuationPayload(in[1]);
+  unsigned int third = ContinuationPayload(in[2]);
+  unsigned int fourth = ContinuationPayload(in[3]);
+  unsigned int c = ((lead & 0x07) << 18) | (second << 12) | (third << 6) |
+                   fourth;
+  // overlong forms and code points above U+10FFFF.
+  if ((second | third | fourth) >= 0x40 || c < 0x10000 || c > 0x10FFFF)
+    return 0;
+  *code_point = c;
+  return 4;
+}
+
+// Returns the number of bytes of the invalid UTF-8 sequence at in, out of len
+// bytes left, that are replaced by a single U+FFFD: the lead byte and the
+// continuation bytes that could still have made a valid sequence (the
+// "maximal subpart" of the Unicode standard, also used by Windows).
+int GetInvalidSequenceLength(const unsigned char *in, int len) {
+  unsigned int lead = in[0];
+  if (lead < 0xC2 || lead > 0xF4 || len < 2) return 1;
+  // the second byte of some sequences has a narrower range, to reject overlong
+  // forms, surrogates and code points above U+10FFFF.
+  unsigned int low = 0x80;
+  unsigned int high = 0xBF;
+  if (lead == 0xE0) {
+    low = 0xA0;
+  } else if (lead == 0xED) {
+    high = 0x9F;
+  } else if (lead == 0xF0) {
+    low = 0x90;
+  } else if (lead == 0xF4) {
+    high = 0x8F;
+  }
+  if (in[1] < low || in[1] > high) return 1;
+  int length = lead < 0xF0 ? 3 : 4;
+  int i = 2;
+  while (i < length && i < len && IsContinuation(in[i]))
+    ++i;
+  return i;
+}
+
+// Returns the code unit of a wchar_t, which may be a signed type.
+inline unsigned int CodeUnit(wchar_t c) {
+  return kWideIsUTF16 ? static_cast<unsigned short>(c) :
+                        static_cast<unsigned int>(c);
+}
+
+// Returns the number of ASCII characters at the start of the len wchar_t at
+// in.
+int CountWideASCII(const wchar_t *in, int len) {
+  int count = 0;
+  while (count <= len - 4 &&
+         (CodeUnit(in[count]) | CodeUnit(in[count + 1]) |
+          CodeUnit(in[count + 2]) | CodeUnit(in[count + 3])) < 0x80)
+    count += 4;
+  while (count < len && CodeUnit(in[count]) < 0x80)
+    ++count;
+  return count;
+}
+
+// Decodes the non-ASCII character at in, out of len wchar_t left. Returns the
+// number of wchar_t it takes and stores its code point, which is U+FFFD for
+// an unpaired surrogate or a value above U+10FFFF.
+int DecodeWideCharacter(const wchar_t *in, int len, unsigned int *code_point) {
+  unsigned int c = CodeUnit(in[0]);
+  if (c >= 0xD800 && c < 0xE000) {
+    // a surrogate, only valid as the first of a UTF-16 pair.
+    unsigned int low = kWideIsUTF16 && len >= 2 ? CodeUnit(in[1]) : 0;
+    if (c >= 0xDC00 || low < 0xDC00 || low >= 0xE000) {
+      *code_point = kReplacementCharacter;
+      return 1;
+    }
+    *code_point = 0x10000 + ((c - 0xD800) << 10) + (low - 0xDC00);
+    return 2;
+  }
+  *code_point = c > 0x10FFFF ? kReplacementCharacter : c;
+  return 1;
+}
+
+// Returns the number of bytes of the UTF-8 encoding of a code point.
+inline int UTF8SequenceLength(unsigned int code_point) {
+  if (code_point < 0x80) return 1;
+  if (code_point < 0x800) return 2;
+  if (code_point < 0x10000) return 3;
+  return 4;
+}
+
+}  // anonymous namespace
+
+int DecodeUTF8(const char *utf8, int len, wchar_t *out) {
+  const unsigned char *in = reinterpret_cast<const unsigned char *>(utf8);
+  wchar_t *start = out;
+  const unsigned char *end = in + len;
+  while (in < end) {
+    unsigned int code_point = *in;
+    if (code_point < 0x80) {
+      // runs of ASCII characters are copied a word at a time, then a byte at
+      // a time.
+      Word word;
+      while (end - in >= static_cast<int>(sizeof(word))) {
+        memcpy(&word, in, sizeof(word));
+        if (word & kNonASCIIBits) break;
+        for (size_t i = 0; i < sizeof(word); ++i)
+          out[i] = in[i];
+        in += sizeof(word);
+        out += sizeof(word);
+      }
+      while (in < end && *in < 0x80)
+        *out++ = *in++;
+      continue;
+    }
+    if (code_point < 0xE0) {
+      // 2-byte sequences, the accented letters of latin text, are decoded
+      // right away.
+      unsigned int second;
+      if (code_point >= 0xC2 && end - in >= 2 &&
+          (second = ContinuationPayload(in[1])) < 0x40) {
+        *out++ = static_cast<wchar_t>(((code_point & 0x1F) << 6) | second);
+        in += 2;
+        continue;
+      }
+    } else if ((code_point & 0xF0) == 0xE0) {
+      // runs of 3-byte sequences, the common case of CJK text, are decoded
+      // in a tight loop.
+      const unsigned char *run = in;
+      unsigned int c;
+      while (end - in >= 3 && (*in & 0xF0) == 0xE0 &&
+             (c = DecodeThreeBytes(in)) != 0) {
+        *out++ = static_cast<wchar_t>(c);
+        in += 3;
+      }
+      if (in != run) continue;
+    }
+    int length = DecodeSequence(in, end - in, &code_point);
+    if (length) {
+      in += length;
+    } else {
+      in += GetInvalidSequenceLength(in, end - in);
+      code_point = kReplacementCharacter;
+    }
+    if (kWideIsUTF16 && code_point > 0xFFFF) {
+      code_point -= 0x10000;
+      *out++ = static_cast<wchar_t>(0xD800 + (code_point >> 10));
+      *out++ = static_cast<wchar_t>(0xDC00 + (code_point & 0x3FF));
+    } else {
+      *out++ = static_cast<wchar_t>(code_point);
+    }
+  }
+  return static_cast<int>(out - start);
+}
+
+int GetUTF8Length(const wchar_t *in, int len) {
+  int count = 0;
+  int i = 0;
+  while (i < len) {
+    if (CodeUnit(in[i]) < 0x80) {
+      int ascii = CountWideASCII(in + i, len - i);
+      i += ascii;
+      count += ascii;
+      continue;
+    }
+    unsigned int code_point;
+    i += DecodeWideCharacter(in + i, len - i, &code_point);
+    if (count > INT_MAX - 4) return -1;
+    count += UTF8SequenceLength(code_point);
+  }
+  return count;
+}
+
+void EncodeUTF8(const wchar_t *in, int len, char *out) {
+  int i = 0;
+  while (i < len) {
+    if (CodeUnit(in[i]) < 0x80) {
+      int end = i + CountWideASCII(in + i, len - i);
+      for (; i < end; ++i)
+        *out++ = static_cast<char>(in[i]);
+      continue;
+    }
+    unsigned int code_point;
+    i += DecodeWideCharacter(in + i, len - i, &code_point);
+    int sequence_length = UTF8SequenceLength(code_point);
+    static const unsigned char kLeads[] = { 0, 0, 0xC0, 0xE0, 0xF0 };
+    for (int j = sequence_length - 1; j > 0; --j) {
+      out[j] = static_cast<char>(0x80 | (code_point & 0x3F));
+      code_point >>= 6;
+    }
+    out[0] = static_cast<char>(kLeads[sequence_length] | code_point);
+    out += sequence_length;
+  }
+}
+
+//------------------------------------------------------------------------------
+// UTF8ToString16
+//------------------------------------------------------------------------------
+bool UTF8ToString16(const char *in, int len, std::wstring *out16) {
+  assert(in);
+  assert(len >= 0);
+  assert(out16);
+
+  // decodes a chunk at a time on the stack, so that the string is neither
+  // measured first nor sized for the worst case.
+  const unsigned char *bytes = reinterpret_cast<const unsigned char *>(in);
+  wchar_t buffer[kDecodeBufferSize];
+  out16->clear();
+  int i = 0;
+  while (i < len) {
+    int length = GetChunkLength(bytes + i, len - i, kDecodeBufferSize);
+    out16->append(buffer, DecodeUTF8(in + i, length, buffer));
+    i += length;
+  }
+  return true;
+}
+
+//------------------------------------------------------------------------------
+// String16ToUTF8
+//------------------------------------------------------------------------------
+bool String16ToUTF8(const wchar_t *in, int len, std::string *out8) {
+  assert(in);
+  assert(len >= 0);
+  assert(out8);
+
+  int out_len = GetUTF8Length(in, len);
+  if (out_len < 0)
+    return false;
+  out8->resize(out_len);
+  if (out_len)
+    EncodeUTF8(in, len, &(*out8)[0]);
+  return true;
+}
@@ -0,0 +1,54 @@
+// Copyright 2009 Google Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Conversions between UTF-8, used by NPAPI strings, and the wide strings used
+// by 'wstring' in IDL. Wide strings are UTF-16 where wchar_t has 16 bits
+// (Windows) and UTF-32 where it has 32 bits (Linux and Mac OS X).
+//
+// UTF-8 is validated and decoded in a single pass, a chunk at a time through a
+// buffer on the stack. Wide strings are first measured, then encoded with a
+// single allocation. Runs of ASCII characters, the common case, are checked a
+// machine word at a time.
+//
+// Invalid input is replaced by U+FFFD, as MultiByteToWideChar does on
+// Windows: each maximal subpart of a truncated, overlong or surrogate UTF-8
+// sequence, or of a code point above U+10FFFF, and each unpaired surrogate or
+// value above U+10FFFF in a wide string.
+
+#ifndef TOOLS_IDLGLUE_NG_STATIC_GLUE_NPAPI_UNICODE_H__
+#define TOOLS_IDLGLUE_NG_STATIC_GLUE_NPAPI_UNICODE_H__
+
+#include <stddef.h>
+#include <string>
+
+// Decodes len bytes of UTF-8 into out, which must have room for len wchar_t.
+// Returns the number of wchar_t written.
+int DecodeUTF8(const char *in, int len, wchar_t *out);
+
+// Returns the number of bytes needed to hold the len wchar_t at in as UTF-8,
+// or -1 if that does not fit in an int.
+int GetUTF8Length(const wchar_t *in, int len);
+
+// Encodes len wchar_t into out, which must have room for GetUTF8Length(in,
+// len) bytes.
+void EncodeUTF8(const wchar_t *in, int len, char *out);
+
+// Converts a UTF16 wide string to a UTF8 string. Returns false if the result
+// is too long for an int.
+bool String16ToUTF8(const wchar_t *in, int len, std::string *out8);
+
+// Converts a UTF8 string to a UTF16 wide string. Always returns true.
+bool UTF8ToString16(const char *in, int len, std::wstring *out16);
+
+#endif  // TOOLS_IDLGLUE_NG_STATIC_GLUE_NPAPI_UNICODE_H__
@@ -0,0 +1,116 @@
+// Copyright 2009 Google Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Measures the throughput of the UTF-8 conversions of unicode.cc, on ASCII
+// text (URLs), mostly ASCII text with accented letters, and CJK text, against
+// a conversion that decodes and appends one character at a time.
+
+#include <stdio.h>
+#include <time.h>
+#include <limits>
+#include <string>
+#include "unicode.h"
+
+namespace {
+
+const int kTextSize = 1 << 20;
+const int kRunCount = 200;
+
+// Decodes one character at a time, appending it to the output, without
+// validation.
+void AppendCharacters(const char *in, int len, std::wstring *out) {
+  out->clear();
+  const unsigned char *bytes = reinterpret_cast<const unsigned char *>(in);
+  for (int i = 0; i < len;) {
+    unsigned int code_point = bytes[i];
+    int length = 1;
+    if (code_point >= 0xF0) {
+      code_point &= 0x07;
+      length = 4;
+    } else if (code_point >= 0xE0) {
+      code_point &= 0x0F;
+      length = 3;
+    } else if (code_point >= 0xC0) {
+      code_point &= 0x1F;
+      length = 2;
+    }
+    for (int j = 1; j < length && i + j < len; ++j)
+      code_point = (code_point << 6) | (bytes[i + j] & 0x3F);
+    i += length;
+    out->push_back(static_cast<wchar_t>(code_point));
+  }
+}
+
+// Builds about kTextSize bytes of UTF-8 by repeating a sample.
+std::string MakeText(const char *sample) {
+  std::string text;
+  while (text.size() < static_cast<size_t>(kTextSize))
+    text += sample;
+  return text;
+}
+
+// Keeps the fastest of the runs, the one least disturbed by the rest of the
+// machine.
+void KeepFastest(clock_t start, clock_t *fastest) {
+  clock_t ticks = clock() - start;
+  if (ticks < *fastest) *fastest = ticks;
+}
+
+double MegabytesPerSecond(clock_t ticks, size_t size) {
+  double seconds = static_cast<double>(ticks) / CLOCKS_PER_SEC;
+  return size / static_cast<double>(1 << 20) / seconds;
+}
+
+void RunBenchmark(const char *name, const std::string &text) {
+  int size = static_cast<int>(text.size());
+  clock_t append = std::numeric_limits<clock_t>::max();
+  clock_t decode = std::numeric_limits<clock_t>::max();
+  clock_t encode = std::numeric_limits<clock_t>::max();
+  std::wstring wide;
+  std::string utf8;
+  // the conversions take turns, so that they see the same load.
+  for (int i = 0; i < kRunCount; ++i) {
+    clock_t start = clock();
+    AppendCharacters(text.data(), size, &wide);
+    KeepFastest(start, &append);
+
+    start = clock();
+    UTF8ToString16(text.data(), size, &wide);
+    KeepFastest(start, &decode);
+
+    start = clock();
+    String16ToUTF8(wide.data(), static_cast<int>(wide.size()), &utf8);
+    KeepFastest(start, &encode);
+  }
+  if (utf8 != text)
+    fprintf(stderr, "%s: the conversions do not round trip\n", name);
+
+  printf("%-8s one at a time %8.1f MB/s, UTF8ToString16 %8.1f MB/s, "
+         "String16ToUTF8 %8.1f MB/s\n", name,
+         MegabytesPerSecond(append, text.size()),
+         MegabytesPerSecond(decode, text.size()),
+         MegabytesPerSecond(encode, text.size()));
+}
+
+}  // anonymous namespace
+
+int main(int argc, char **argv) {
+  RunBenchmark("ascii",
+               MakeText("http://www.example.com/downloads/file-0001.zip\n"));
+  RunBenchmark("latin", MakeText("T\xC3\xA9l\xC3\xA9" "chargements r\xC3\xA9"
+                                 "cents de l'\xC3\xA9t\xC3\xA9, "));
+  RunBenchmark("cjk", MakeText("\xE4\xB8\x8B\xE8\xBD\xBD\xE6\x96\x87"
+                               "\xE4\xBB\xB6"));
+  return 0;
+}
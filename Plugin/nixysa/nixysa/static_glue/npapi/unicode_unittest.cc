@@ -0,0 +1,262 @@
+// Copyright 2009 Google Inc.
+//
+// Licensed under the Apache License, Version 2.0 (the "License");
+// you may not use this file except in compliance with the License.
+// You may obtain a copy of the License at
+//
+//      http://www.apache.org/licenses/LICENSE-2.0
+//
+// Unless required by applicable law or agreed to in writing, software
+// distributed under the License is distributed on an "AS IS" BASIS,
+// WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+// See the License for the specific language governing permissions and
+// limitations under the License.
+
+// Tests for the UTF-8 conversions in unicode.cc. Prints the failed checks and
+// exits with a non-zero status if any.
+
+#include <stdio.h>
+#include <string.h>
+#include <string>
+#include "unicode.h"
+
+namespace {
+
+int g_failures = 0;
+
+#define EXPECT(condition) do { \
+    if (!(condition)) { \
+      ++g_failures; \
+      fprintf(stderr, "%s:%d: failed: %s\n", __FILE__, __LINE__, \
+              #condition); \
+    } \
+  } while (0)
+
+const bool kWideIsUTF16 = sizeof(wchar_t) == 2;
+
+// Encodes a code point as UTF-8, the straightforward way.
+std::string ReferenceUTF8(unsigned int code_point) {
+  std::string result;
+  if (code_point < 0x80) {
+    result += static_cast<char>(code_point);
+  } else if (code_point < 0x800) {
+    result += static_cast<char>(0xC0 | (code_point >> 6));
+    result += static_cast<char>(0x80 | (code_point & 0x3F));
+  } else if (code_point < 0x10000) {
+    result += static_cast<char>(0xE0 | (code_point >> 12));
+    result += static_cast<char>(0x80 | ((code_point >> 6) & 0x3F));
+    result += static_cast<char>(0x80 | (code_point & 0x3F));
+  } else {
+    result += static_cast<char>(0xF0 | (code_point >> 18));
+    result += static_cast<char>(0x80 | ((code_point >> 12) & 0x3F));
+    result += static_cast<char>(0x80 | ((code_point >> 6) & 0x3F));
+    result += static_cast<char>(0x80 | (code_point & 0x3F));
+  }
+  return result;
+}
+
+// Encodes a code point as a wide string, the straightforward way.
+std::wstring ReferenceWide(unsigned int code_point) {
+  std::wstring result;
+  if (kWideIsUTF16 && code_point > 0xFFFF) {
+    result += static_cast<wchar_t>(0xD800 + ((code_point - 0x10000) >> 10));
+    result += static_cast<wchar_t>(0xDC00 + ((code_point - 0x10000) & 0x3FF));
+  } else {
+    result += static_cast<wchar_t>(code_point);
+  }
+  return result;
+}
+
+bool ToWide(const std::string &in, std::wstring *out) {
+  return UTF8ToString16(in.data(), static_cast<int>(in.size()), out);
+}
+
+bool ToUTF8(const std::wstring &in, std::string *out) {
+  return String16ToUTF8(in.data(), static_cast<int>(in.size()), out);
+}
+
+void TestEmpty() {
+  std::wstring wide(L"previous");
+  EXPECT(UTF8ToString16("", 0, &wide) && wide.empty());
+  std::string utf8("previous");
+  EXPECT(String16ToUTF8(L"", 0, &utf8) && utf8.empty());
+}
+
+void TestASCII() {
+  // long enough for several words, converted from every alignment.
+  std::string ascii;
+  for (int i = 0; i < 100; ++i)
+    ascii += static_cast<char>(i);
+  std::wstring expected(ascii.begin(), ascii.end());
+  for (size_t start = 0; start < 16; ++start) {
+    std::wstring wide;
+    EXPECT(ToWide(ascii.substr(start), &wide));
+    EXPECT(wide == expected.substr(start));
+    std::string utf8;
+    EXPECT(ToUTF8(expected.substr(start), &utf8));
+    EXPECT(utf8 == ascii.substr(start));
+  }
+  // the embedded NUL characters are kept.
+  wchar_t decoded[3];
+  EXPECT(DecodeUTF8("a\0b", 3, decoded) == 3 && decoded[1] == 0);
+  EXPECT(GetUTF8Length(L"a\0b", 3) == 3);
+}
+
+void TestMultiByte() {
+  // U+00E9, U+20AC and U+1F600.
+  const char utf8[] = "\xC3\xA9\xE2\x82\xAC\xF0\x9F\x98\x80";
+  std::wstring expected = ReferenceWide(0xE9) + ReferenceWide(0x20AC) +
+                          ReferenceWide(0x1F600);
+  wchar_t decoded[9];
+  EXPECT(DecodeUTF8(utf8, 9, decoded) == (kWideIsUTF16 ? 4 : 3));
+  std::wstring wide;
+  EXPECT(UTF8ToString16(utf8, 9, &wide) && wide == expected);
+  EXPECT(GetUTF8Length(expected.data(), static_cast<int>(expected.size())) ==
+         9);
+  std::string result;
+  EXPECT(ToUTF8(expected, &result) && result == utf8);
+}
+
+void TestNonASCIIAtEveryPosition() {
+  // moves a non-ASCII character across the words of ASCII characters.
+  for (int position = 0; position < 40; ++position) {
+    std::string utf8 = std::string(position, 'x') + "\xE2\x82\xAC" +
+                       std::string(40 - position, 'y');
+    std::wstring expected = std::wstring(position, L'x') +
+                            ReferenceWide(0x20AC) +
+                            std::wstring(40 - position, L'y');
+    std::wstring wide;
+    EXPECT(ToWide(utf8, &wide) && wide == expected);
+    std::string result;
+    EXPECT(ToUTF8(expected, &result) && result == utf8);
+  }
+}
+
+void TestAllCodePoints() {
+  for (unsigned int code_point = 0; code_point <= 0x10FFFF; ++code_point) {
+    if (code_point >= 0xD800 && code_point < 0xE000) continue;
+    std::string utf8 = ReferenceUTF8(code_point);
+    std::wstring wide = ReferenceWide(code_point);
+    std::wstring wide_result;
+    std::string utf8_result;
+    if (!ToWide(utf8, &wide_result) || wide_result != wide ||
+        !ToUTF8(wide, &utf8_result) || utf8_result != utf8) {
+      fprintf(stderr, "U+%04X does not round trip\n", code_point);
+      ++g_failures;
+      return;
+    }
+  }
+}
+
+void TestInvalidUTF8() {
+  // each maximal subpart of an invalid sequence is replaced by one U+FFFD.
+  struct {
+    const char *utf8;
+    const wchar_t *expected;
+  } invalid[] = {
+    { "\x80", L"\xFFFD" },                  // continuation byte
+    { "\xBF", L"\xFFFD" },                  // continuation byte
+    { "\x80\x80\x80", L"\xFFFD\xFFFD\xFFFD" },  // continuation bytes
+    { "\xC0\x80", L"\xFFFD\xFFFD" },        // overlong NUL
+    { "\xC1\xBF", L"\xFFFD\xFFFD" },        // overlong 2-byte form
+    { "\xE0\x80\x80", L"\xFFFD\xFFFD\xFFFD" },  // overlong 3-byte form
+    { "\xE0\x9F\xBF", L"\xFFFD\xFFFD\xFFFD" },  // overlong 3-byte form
+    { "\xED\xA0\x80", L"\xFFFD\xFFFD\xFFFD" },  // surrogate
+    { "\xED\xBF\xBF", L"\xFFFD\xFFFD\xFFFD" },  // surrogate
+    // overlong 4-byte forms
+    { "\xF0\x80\x80\x80", L"\xFFFD\xFFFD\xFFFD\xFFFD" },
+    { "\xF0\x8F\xBF\xBF", L"\xFFFD\xFFFD\xFFFD\xFFFD" },
+    // above U+10FFFF
+    { "\xF4\x90\x80\x80", L"\xFFFD\xFFFD\xFFFD\xFFFD" },
+    { "\xF5\x80\x80\x80", L"\xFFFD\xFFFD\xFFFD\xFFFD" },
+    { "\xFF", L"\xFFFD" },                  // not UTF-8
+    { "\xE2\x28\xA1", L"\xFFFD(\xFFFD" },    // bad continuation byte
+    { "\xE2\x82\x28", L"\xFFFD(" },          // bad continuation byte
+    { "\xE2\x82", L"\xFFFD" },              // truncated
+    { "\xF0\x9F\x98", L"\xFFFD" },          // truncated
+    { "\xF0\x9F\x98\xE2\x82\xAC", L"\xFFFD\x20AC" },  // truncated
+    { "abcdefghijklmn\xC3", L"abcdefghijklmn\xFFFD" },  // truncated
+    // more characters than lead bytes.
+    { "\xC3\x80\x80", L"\xC0\xFFFD" },
+  };
+  for (size_t i = 0; i < sizeof(invalid) / sizeof(invalid[0]); ++i) {
+    std::wstring wide;
+    EXPECT(ToWide(invalid[i].utf8, &wide) && wide == invalid[i].expected);
+  }
+  // the length stops the conversion, not a NUL character.
+  std::wstring wide;
+  EXPECT(UTF8ToString16("\xE2\x82\xAC", 2, &wide) && wide == L"\xFFFD");
+}
+
+void TestLongText() {
+  // long text is decoded in chunks, which must not split the sequences, nor
+  // the invalid bytes replaced by one U+FFFD: moves them across the first
+  // few thousand bytes.
+  const char *sequences[] = {
+    "\xC3\xA9",
+    "\xE2\x82\xAC",
+    "\xF0\x9F\x98\x80",
+    "\xF0\x9F\x98",
+    "\x80\x80\x80\x80\x80",
+    "\xF0\x9F\x98\x80\x80\x80\x80\x80",
+  };
+  for (size_t i = 0; i < sizeof(sequences) / sizeof(sequences[0]); ++i) {
+    for (int position = 0; position < 4200; ++position) {
+      std::string utf8 = std::string(position, 'x') + sequences[i] + "y";
+      int len = static_cast<int>(utf8.size());
+      std::wstring expected(len, 0);
+      expected.resize(DecodeUTF8(utf8.data(), len, &expected[0]));
+      std::wstring wide;
+      if (!ToWide(utf8, &wide) || wide != expected) {
+        fprintf(stderr, "sequence %d at %d is not decoded as a whole\n",
+                static_cast<int>(i), position);
+        ++g_failures;
+        break;
+      }
+    }
+  }
+}
+
+void TestInvalidWide() {
+  // unpaired surrogates and values above U+10FFFF are replaced by U+FFFD.
+  const std::string replacement("\xEF\xBF\xBD");
+  std::string utf8;
+  if (kWideIsUTF16) {
+    wchar_t high[] = { L'a', static_cast<wchar_t>(0xD83D) };
+    EXPECT(String16ToUTF8(high, 2, &utf8) && utf8 == "a" + replacement);
+    wchar_t low[] = { static_cast<wchar_t>(0xDE00), L'a' };
+    EXPECT(String16ToUTF8(low, 2, &utf8) && utf8 == replacement + "a");
+    wchar_t swapped[] = { static_cast<wchar_t>(0xDE00),
+                          static_cast<wchar_t>(0xD83D) };
+    EXPECT(String16ToUTF8(swapped, 2, &utf8) &&
+           utf8 == replacement + replacement);
+    wchar_t unpaired[] = { static_cast<wchar_t>(0xD83D), L'a' };
+    EXPECT(String16ToUTF8(unpaired, 2, &utf8) && utf8 == replacement + "a");
+  } else {
+    wchar_t surrogate[] = { static_cast<wchar_t>(0xD800) };
+    EXPECT(String16ToUTF8(surrogate, 1, &utf8) && utf8 == replacement);
+    wchar_t too_big[] = { static_cast<wchar_t>(0x110000) };
+    EXPECT(String16ToUTF8(too_big, 1, &utf8) && utf8 == replacement);
+    wchar_t negative[] = { static_cast<wchar_t>(-1), L'a' };
+    EXPECT(String16ToUTF8(negative, 2, &utf8) && utf8 == replacement + "a");
+  }
+}
+
+}  // anonymous namespace
+
+int main(int argc, char **argv) {
+  TestEmpty();
+  TestASCII();
+  TestMultiByte();
+  TestNonASCIIAtEveryPosition();
+  TestAllCodePoints();
+  TestInvalidUTF8();
+  TestLongText();
+  TestInvalidWide();
+  if (g_failures) {
+    fprintf(stderr, "%d failure(s)\n", g_failures);
+    return 1;
+  }
+  printf("PASSED\n");
+  return 0;
+}
@@ -28,10 +28,22 @@ returned by copy. For example:
   void SetValue(const std::vector<Class> &value);
   std::vector<Class> GetValue();
 
-For JS bindings, the array is represented by a JavaScript array.
+For JS bindings, the array is represented by a JavaScript array. Arrays of
+numbers and booleans are returned to JavaScript by evaluating an array literal,
+in a single browser call, other arrays are filled element by element.
+
+Arrays of numbers and booleans can also be passed as a single string rather
+than as a JavaScript array, through a typedef with the 'packed' attribute:
+
+  [packed] typedef float[] PackedFloats;
+
+The string is the base64 encoding of the little-endian representation of the
+values (as int32, uint32, float32, float64 or uint8 for booleans), so that
+large arrays don't cost a browser call per element.
 """
 
 import string
+import pod_binding
 
 
 class InvalidArrayUsage(Exception):
@@ -39,6 +51,67 @@ class InvalidArrayUsage(Exception):
   pass
 
 
+class InvalidPackedArrayType(Exception):
+  """Raised when a packed array has elements that can't be packed."""
+
+  def __init__(self, type_defn):
+    Exception.__init__(self)
+    self.type_defn = type_defn
+
+
+# The representation of the elements of packed arrays, by C++ type.
+_packed_formats = {'int': 'int32',
+                   'unsigned int': 'uint32',
+                   'float': 'float32',
+                   'double': 'float64',
+                   'bool': 'uint8'}
+
+
+def _GetPackedTypedef(type_defn):
+  """Gets the typedef declaring an array as packed.
+
+  Args:
+    type_defn: a Definition for the array type.
+
+  Returns:
+    the Typedef with the 'packed' attribute in the typedef chain of type_defn,
+    or None if the array isn't packed.
+  """
+  while type_defn.defn_type == 'Typedef':
+    if 'packed' in type_defn.attributes:
+      return type_defn
+    type_defn = type_defn.GetTypeSafe()
+  return None
+
+
+def GetPackedFormat(type_defn):
+  """Gets the representation of the elements of a packed array.
+
+  Args:
+    type_defn: a Definition for the array type.
+
+  Returns:
+    a string, the representation of the elements, as the name of the matching
+    JavaScript typed array without the 'Array' suffix (e.g. 'float32'), or None
+    if the array isn't packed.
+
+  Raises:
+    InvalidPackedArrayType: the packed type isn't an unsized array of numbers or
+      booleans of a fixed size.
+  """
+  typedef = _GetPackedTypedef(type_defn)
+  if not typedef:
+    return None
+  array_type = type_defn.GetFinalType()
+  if array_type.defn_type != 'Array' or array_type.size:
+    raise InvalidPackedArrayType(typedef)
+  data_type = array_type.data_type.GetFinalType()
+  if (data_type.binding_model is not pod_binding or
+      data_type.name not in _packed_formats):
+    raise InvalidPackedArrayType(typedef)
+  return _packed_formats[data_type.name]
+
+
 def _CppTypeString(scope, type_defn):
   """Gets the C++ type of the array.
 
@@ -327,6 +400,11 @@ def JSDocTypeString(type_defn):
   Returns:
     a string that is the JSDoc notation of type_defn.
   """
+  if GetPackedFormat(type_defn):
+    # the packed typedef is documented in the JS header.
+    typedef = _GetPackedTypedef(type_defn)
+    type_stack = typedef.GetParentScopeStack()
+    return '.'.join([s.name for s in type_stack[1:]] + [typedef.name])
   type_defn = type_defn.GetFinalType()
   element_type_defn = type_defn.data_type.GetFinalType()
   return ('!Array.<%s>' %
@@ -403,23 +481,19 @@ do {
     break;
   }
   NPObject *npobject = NPVARIANT_TO_OBJECT(${input});
-  NPVariant value;
-  if (!GetNPObjectProperty(${npp}, npobject, "length", &value)) {
-    ${success} = false;
-    *error_handle = "Error in " ${context}
-        ": input had no valid length property.";
-  }
-  if (!NPVARIANT_IS_NUMBER(value)) {
-    NPN_ReleaseVariantValue(&value);
+  int size;
+  if (!GetNPArrayLength(${npp}, npobject, &size)) {
     ${success} = false;
     *error_handle = "Error in " ${context}
         ": input had no valid numeric length property.";
     break;
   }
-  int size = static_cast<int>(NPVARIANT_TO_NUMBER(value));
   ${variable}.resize(size);
+  NPVariant value;
   for (int i = 0; i < size; i++) {
-    if (!GetNPArrayProperty(${npp}, npobject, i, &value)) {
+    // a missing element is read as undefined, which the conversion rejects
+    // unless the elements are variants.
+    if (!GetNPArrayElement(${npp}, npobject, i, &value)) {
       ${success} = false;
       *error_handle = "Exception while validating " ${context}
           ": array had no value at an index less than "
@@ -427,6 +501,11 @@ do {
       break;
     }
     ${GetValue}
+    // the element is copied before the value is released, since the
+    // conversion may point into it.
+    if (${success}) {
+      ${variable}[i] = ${expr};
+    }
     NPN_ReleaseVariantValue(&value);
     if (!${success}) {
       *error_handle = "Exception while validating " ${context}
@@ -434,11 +513,19 @@ do {
           "index requested was missing or of invalid type.";
       break;
     }
-    ${variable}[i] = ${expr};
   }
 } while (false);
 """)
 
+_packed_from_npvariant_template = string.Template("""
+${Type} ${variable};
+if (!NPVariantToPackedArray(${input}, &${variable})) {
+  ${success} = false;
+  *error_handle = "Error in " ${context}
+      ": was expecting a base64 string of ${Format} values.";
+}
+""")
+
 
 def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
     exception_context, npp):
@@ -465,12 +552,21 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
     a (string, string) pair, the first string being the code snippet and the
     second one being the expression to access that value.
   """
+  type_name, unused_need_defn = _CppTypeString(scope, type_defn)
+  packed_format = GetPackedFormat(type_defn)
+  if packed_format:
+    text = _packed_from_npvariant_template.substitute(Type=type_name,
+                                                      variable=variable,
+                                                      input=input_expr,
+                                                      Format=packed_format,
+                                                      success=success,
+                                                      context=exception_context)
+    return (text, variable)
   data_type = type_defn.GetFinalType().data_type
   data_type_bm = data_type.binding_model
   text, expr = data_type_bm.NpapiFromNPVariant(scope, data_type, 'value',
                                                '%s_i' % variable, success,
                                                exception_context, npp)
-  type_name, unused_need_defn = _CppTypeString(scope, type_defn)
   text = _from_npvariant_template.substitute(Type=type_name,
                                              variable=variable,
                                              input=input_expr,
@@ -482,23 +578,83 @@ def NpapiFromNPVariant(scope, type_defn, input_expr, variable, success,
   return (text, variable)
 
 
+def NpapiVariantTypes(scope, type_defn):
+  """Gets the NPVariant types an array is converted from.
+
+  This function is used to resolve overloads on the types of the arguments,
+  without trying each conversion in turn.
+
+  Args:
+    scope: a Definition for the scope in which the glue will be written.
+    type_defn: a Definition, representing the type of the value.
+
+  Returns:
+    a (list, bool) pair, the list containing the NPVariant types (among 'void',
+    'null', 'bool', 'int32', 'double', 'string' and 'object') NpapiFromNPVariant
+    accepts, and the bool being True if the conversion of a NPVariant of one of
+    these types never fails.
+  """
+  scope = scope  # silence gpylint.
+  if GetPackedFormat(type_defn):
+    # the string may not be valid base64, or have the wrong length.
+    return ['string'], False
+  # the object may not be an array, or have elements of the wrong type.
+  return ['object'], False
+
+
 _expr_to_npvariant_template = string.Template("""
 ${Type} ${variable} = ${expr};
 NPObject *${variable}_npobject = CreateArray(${npp});
-static const char *array_push_identifier = "push";
-NPIdentifier identifier = NPN_GetStringIdentifier(array_push_identifier);
-for (${Type}::size_type i = 0; i < ${variable}.size(); ++i) {
+if (!${variable}_npobject) ${success} = false;
+for (${Type}::size_type i = 0; ${success} && i < ${variable}.size(); ++i) {
   NPVariant value;
   ${SetValuePre}
   if (!${success}) break;
   ${SetValuePost}
-  NPVariant result;
-  NPN_Invoke(${npp}, ${variable}_npobject, identifier, &value, 1, &result);
+  ${success} = SetNPArrayProperty(${npp}, ${variable}_npobject, static_cast<int>(i), &value);
   NPN_ReleaseVariantValue(&value);
-  NPN_ReleaseVariantValue(&result);
 }
+if (!${success} && ${variable}_npobject) {
+  // the array is only returned when all its elements were set.
+  NPN_ReleaseObject(${variable}_npobject);
+  ${variable}_npobject = NULL;
+}
+""")
+
+_expr_to_npvariant_literal_template = string.Template("""
+${Type} ${variable} = ${expr};
+std::string ${variable}_literal("[");
+for (${Type}::size_type i = 0; i < ${variable}.size(); ++i) {
+  if (i) ${variable}_literal += ',';
+  AppendArrayLiteralValue(static_cast<${LiteralType}>(${variable}[i]),
+                          &${variable}_literal);
+}
+${variable}_literal += ']';
+NPObject *${variable}_npobject = EvaluateArrayLiteral(${npp},
+                                                      ${variable}_literal);
+if (!${variable}_npobject) ${success} = false;
 """)
 
+# The types of the POD values written in an array literal, by podtype. These
+# are the types of the NPVariant values the pod binding model converts them to.
+_array_literal_types = {'int': 'int32_t', 'float': 'double', 'bool': 'bool'}
+
+
+def _ArrayLiteralType(data_type):
+  """Gets the C++ type of the elements of an array written as a literal.
+
+  Args:
+    data_type: a Definition for the type of the elements of the array.
+
+  Returns:
+    a string, the C++ type the elements are converted to, or None if the array
+    can't be written as a literal.
+  """
+  final_type = data_type.GetFinalType()
+  if final_type.binding_model is not pod_binding:
+    return None
+  return _array_literal_types.get(final_type.podtype)
+
 
 def NpapiExprToNPVariant(scope, type_defn, variable, expression, output,
                          success, npp):
@@ -529,18 +685,32 @@ def NpapiExprToNPVariant(scope, type_defn, variable, expression, output,
   """
   data_type = type_defn.GetFinalType().data_type
   data_type_bm = data_type.binding_model
-  pre, post = data_type_bm.NpapiExprToNPVariant(scope, data_type,
-                                                '%s_value' % variable,
-                                                '%s[i]' % variable, '&value',
-                                                success, npp)
   type_name, unused_need_defn = _CppTypeString(scope, type_defn)
-  text = _expr_to_npvariant_template.substitute(Type=type_name,
-                                                variable=variable,
-                                                expr=expression,
-                                                npp=npp,
-                                                SetValuePre=pre,
-                                                SetValuePost=post,
-                                                success=success)
+  literal_type = _ArrayLiteralType(data_type)
+  if GetPackedFormat(type_defn):
+    return ('%s = PackedArrayToNPVariant(%s, %s);' % (success, expression,
+                                                      output),
+            '')
+  elif literal_type:
+    text = _expr_to_npvariant_literal_template.substitute(
+        Type=type_name,
+        variable=variable,
+        expr=expression,
+        npp=npp,
+        LiteralType=literal_type,
+        success=success)
+  else:
+    pre, post = data_type_bm.NpapiExprToNPVariant(scope, data_type,
+                                                  '%s_value' % variable,
+                                                  '%s[i]' % variable,
+                                                  '&value', success, npp)
+    text = _expr_to_npvariant_template.substitute(Type=type_name,
+                                                  variable=variable,
+                                                  expr=expression,
+                                                  npp=npp,
+                                                  SetValuePre=pre,
+                                                  SetValuePost=post,
+                                                  success=success)
   return (text, 'OBJECT_TO_NPVARIANT(%s_npobject, *%s);' % (variable, output))
 
 
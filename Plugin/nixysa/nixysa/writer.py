@@ -20,25 +20,100 @@ This module contain function to write files only if their contents would
 change.
 """
 
+import os
 import os.path
+import sys
+import tempfile
+# Use hashlib if present (Python 2.5 and up), otherwise fall back to md5.
+try:
+  import hashlib
+except ImportError:
+  import md5
 import log
 
+# size of the buffer used when streaming content to and from files.
+_BUFFER_SIZE = 64 * 1024
 
-def WriteIfContentDifferent(filename, content):
-  """Write file only if content is different or if filename does not exist.
+
+def _NewDigest():
+  """Creates a digest object for comparing file contents."""
+  if globals().has_key('hashlib'):
+    return hashlib.md5()
+  else:
+    return md5.new()
+
+
+def GetFileDigest(filename):
+  """Computes the digest of a file, reading it by chunks.
 
   Args:
     filename: filename of file.
-    content: string containing contents of file.
+
+  Returns:
+    the digest of the file contents.
   """
-  if os.path.exists(filename):
-    f = open(filename, 'r');
-    old_content = f.read()
+  digest = _NewDigest()
+  f = open(filename, 'r')
+  try:
+    chunk = f.read(_BUFFER_SIZE)
+    while chunk:
+      digest.update(chunk)
+      chunk = f.read(_BUFFER_SIZE)
+  finally:
     f.close()
-    if old_content == content:
+  return digest.digest()
+
+
+def StreamIfContentDifferent(filename, chunks):
+  """Stream content to a file, only replacing it if the content is different.
+
+  The chunks are written to a temporary file next to filename while their
+  digest is computed, so the full content is never held in memory. The
+  temporary file then replaces filename only if its digest differs from the
+  existing file's, or if filename does not exist.
+
+  Args:
+    filename: filename of file.
+    chunks: an iterable of strings, whose concatenation is the contents of the
+      file.
+  """
+  fd, temp_filename = tempfile.mkstemp(dir=os.path.dirname(filename) or '.',
+                                       prefix='.nixysa-')
+  try:
+    f = os.fdopen(fd, 'w', _BUFFER_SIZE)
+    try:
+      digest = _NewDigest()
+      for chunk in chunks:
+        digest.update(chunk)
+        f.write(chunk)
+    finally:
+      f.close()
+    if (os.path.exists(filename) and
+        os.path.getsize(filename) == os.path.getsize(temp_filename) and
+        GetFileDigest(filename) == digest.digest()):
+      os.remove(temp_filename)
       return
-  f = open(filename, 'w')
-  f.write(content)
-  f.close()
+    # mkstemp creates files only readable by the owner, give the output the
+    # permissions a regular open() would have.
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(temp_filename, 0666 & ~umask)
+    # rename doesn't replace an existing file on Windows.
+    if sys.platform == 'win32' and os.path.exists(filename):
+      os.remove(filename)
+    os.rename(temp_filename, filename)
+  except:
+    if os.path.exists(temp_filename):
+      os.remove(temp_filename)
+    raise
   log.Info('Writing %s' % filename)
 
+
+def WriteIfContentDifferent(filename, content):
+  """Write file only if content is different or if filename does not exist.
+
+  Args:
+    filename: filename of file.
+    content: string containing contents of file.
+  """
+  StreamIfContentDifferent(filename, [content])